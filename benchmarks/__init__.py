@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+性能测试套件
+包含本地模拟服务器与吞吐量测试脚本，需在项目根目录下以 python -m benchmarks.xxx 运行。
+"""
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+Web 服务请求延迟测试
+分别以 Flask 开发服务器和 waitress 运行 web_server.app，
+用多个并发客户端轮询接口，统计请求延迟分位数与吞吐量；
+同时对比 jsonify 与 orjson 响应序列化的耗时。
+
+用法:
+    python -m benchmarks.bench_http --clients 16 --requests 500
+    python -m benchmarks.bench_http --servers waitress --threads 16 --path /api/status
+"""
+
+import argparse
+import http.client
+import logging
+import statistics
+import threading
+import time
+
+from flask import jsonify
+
+import downloader
+import web_server
+from benchmarks.bench_micro import make_tree
+from benchmarks.harness import measure, print_results, save_results
+
+
+def start_server(kind, threads):
+    """在后台线程启动指定类型的 WSGI 服务器，返回 (端口, 关闭函数)"""
+    if kind == "waitress":
+        from waitress import create_server
+        server = create_server(web_server.app, host="127.0.0.1", port=0, threads=threads)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        return server.effective_port, server.close
+
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, web_server.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server.server_port, server.shutdown
+
+
+def run_clients(port, path, clients, requests):
+    """并发客户端各自通过长连接发送 requests 个请求，返回延迟列表与总耗时"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        try:
+            for _ in range(requests):
+                began = time.perf_counter()
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                local.append(time.perf_counter() - began)
+                if response.status != 200:
+                    errors.append(response.status)
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            conn.close()
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=client) for _ in range(clients)]
+    began = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return latencies, time.perf_counter() - began, errors
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def bench_serialization(track_count, rounds):
+    """对比 jsonify 与 orjson 序列化大型文件列表的耗时"""
+    payload = {"files": downloader.flatten_tracks(make_tree(track_count))}
+    with web_server.app.app_context():
+        return {
+            f"jsonify[{track_count}]": measure(lambda: jsonify(payload), rounds),
+            f"json_response[{track_count}]": measure(lambda: web_server.json_response(payload), rounds),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASMRip Web 服务请求延迟测试")
+    parser.add_argument("--servers", nargs="+", default=["flask", "waitress"], help="要测试的服务器类型")
+    parser.add_argument("--path", default="/api/progress", help="轮询的接口路径")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--requests", type=int, default=300, help="每个客户端的请求数")
+    parser.add_argument("--threads", type=int, default=8, help="waitress 工作线程数")
+    parser.add_argument("--tracks", type=int, default=5000, help="序列化测试的文件数")
+    parser.add_argument("--rounds", type=int, default=5, help="序列化测试轮数")
+    parser.add_argument("--output", default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    results = {}
+    for kind in args.servers:
+        port, shutdown = start_server(kind, args.threads)
+        try:
+            latencies, elapsed, errors = run_clients(port, args.path, args.clients, args.requests)
+        finally:
+            shutdown()
+        if not latencies:
+            print(f"{kind:<10} 全部请求失败: {errors[:3]}")
+            continue
+        stats = {
+            "requests": len(latencies),
+            "errors": len(errors),
+            "req_per_s": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        }
+        results[kind] = stats
+        print(f"{kind:<10} {stats['req_per_s']:>8} req/s  p50 {stats['p50_ms']} ms  "
+              f"p95 {stats['p95_ms']} ms  p99 {stats['p99_ms']} ms  错误 {stats['errors']}")
+
+    serialization = bench_serialization(args.tracks, args.rounds)
+    print_results(serialization)
+
+    if args.output:
+        save_results(args.output, "http", {"servers": results, "serialization": serialization}, vars(args))
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
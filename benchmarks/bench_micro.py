@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+热点函数微基准测试
+覆盖随作品规模增长的逐项处理路径：文件树展开、文件名清洗、任务规划、大小格式化、
+进度更新和日志写入。使用合成的大型文件树与百万行日志。
+
+用法:
+    python -m benchmarks.bench_micro --output micro.json
+    python -m benchmarks.bench_micro --compare micro.json
+    python -m benchmarks.bench_micro --tracks 10000 --log-lines 100000 --rounds 3
+"""
+
+import argparse
+import pathlib
+
+import downloader
+import progress
+import shared
+import utils
+from benchmarks.harness import measure, print_results, save_results, load_results
+
+
+def make_tree(track_count, folder_width=20, depth=3):
+    """生成 /api/tracks?v=2 结构的合成文件树
+
+    文件按 folder_width 分组放入 depth 层嵌套文件夹，标题含中文与全角字符。
+    """
+    def build(start, count, level):
+        if level == depth or count <= folder_width:
+            return [{
+                "type": "audio",
+                "title": f"{index:06d}_トラック（本編）・SE無し.wav",
+                "hash": f"100000/{index}",
+                "size": 1024 * 1024 + index,
+                "mediaDownloadUrl": f"https://example.invalid/media/download/{index}",
+                "mediaStreamUrl": f"https://example.invalid/media/stream/{index}",
+            } for index in range(start, start + count)]
+        step = -(-count // folder_width)  # 向上取整
+        return [{
+            "type": "folder",
+            "title": f"第{level + 1}層フォルダ【{offset // step:02d}】",
+            "children": build(start + offset, min(step, count - offset), level + 1),
+        } for offset in range(0, count, step)]
+
+    return build(0, track_count, 0)
+
+
+def bench_flatten(tree):
+    return lambda: downloader.flatten_tracks(tree)
+
+
+def bench_safe_path(paths):
+    def run():
+        for path in paths:
+            [utils.safe_path_part(p) for p in path.split('/')]
+    return run
+
+
+def bench_build_plan(files):
+    target_dir = pathlib.Path("Download") / "RJ100000"
+    return lambda: downloader.build_job_plan(files, target_dir)
+
+
+def bench_format_size(sizes):
+    def run():
+        for size in sizes:
+            utils.format_size(size)
+    return run
+
+
+def bench_progress(count):
+    """4 个并行传输各采样 count 次，每 100 次采样生成一次快照（模拟界面轮询）"""
+    def run():
+        progress.clear()
+        progress.start_job(1, count * 4096 * 4)
+        transfers = [progress.begin_transfer(1, f"bench{n}.wav", count * 4096) for n in range(4)]
+        for i in range(count):
+            for transfer in transfers:
+                transfer.update(i * 4096)
+            if i % 100 == 0:
+                progress.snapshot()
+        for transfer in transfers:
+            progress.end_transfer(transfer, True)
+    return run
+
+
+def bench_log_message(lines):
+    def run():
+        for i in range(lines):
+            shared.log_message("TASK", f"完成: RJ100000/第1層フォルダ/{i:07d}.wav")
+    return run
+
+
+def clear_logs():
+    shared.LOG_MESSAGES.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASMRip 热点函数微基准测试")
+    parser.add_argument("--tracks", type=int, nargs="+", default=[10000, 100000], help="合成文件树的文件数")
+    parser.add_argument("--log-lines", type=int, default=1000000, help="日志写入条数")
+    parser.add_argument("--rounds", type=int, default=5, help="计时轮数")
+    parser.add_argument("--output", default=None, help="结果 JSON 输出路径")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果 JSON 对比")
+    args = parser.parse_args()
+
+    # 基准测试时不输出到控制台窗口
+    shared.set_console_window(None)
+
+    results = {}
+    for count in args.tracks:
+        tree = make_tree(count)
+        files = downloader.flatten_tracks(tree)
+        paths = [f['path'] for f in files]
+        sizes = [f['size'] * (i % 4096 + 1) for i, f in enumerate(files)]
+
+        results[f"flatten_tracks[{count}]"] = measure(bench_flatten(tree), args.rounds)
+        results[f"safe_path_part[{count}]"] = measure(bench_safe_path(paths), args.rounds)
+        results[f"build_job_plan[{count}]"] = measure(bench_build_plan(files), args.rounds)
+        results[f"format_size[{count}]"] = measure(bench_format_size(sizes), args.rounds)
+        results[f"progress_update[{count}]"] = measure(bench_progress(count), args.rounds)
+
+    results[f"log_message[{args.log_lines}]"] = measure(
+        bench_log_message(args.log_lines), args.rounds, setup=clear_logs)
+    clear_logs()
+
+    print_results(results, load_results(args.compare) if args.compare else None)
+
+    if args.output:
+        save_results(args.output, "micro", results, vars(args))
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+端到端吞吐量测试
+启动本地模拟服务器，驱动 downloader.download_worker 完成一次完整下载任务，
+统计 MB/s、文件/s、CPU 时间和峰值内存。
+
+用法:
+    python -m benchmarks.bench_throughput --files 50 --size 4M --runs 3 --curl curl
+    python -m benchmarks.bench_throughput --throttle 2M --fail-rate 0.1 --output result.json
+"""
+
+import argparse
+import os
+import pathlib
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import config
+import downloader
+import utils
+from benchmarks.harness import save_results
+from benchmarks.mock_server import MockAsmrServer, parse_size
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块
+    resource = None
+
+BENCH_RJ_ID = "RJ100000"
+
+
+def isolate_paths(work_dir):
+    """将数据库、日志、追踪与下载目录指向临时目录，测试不会写入真实的作品库和队列"""
+    work_dir = pathlib.Path(work_dir)
+    config.LIBRARY_DB = work_dir / "library.db"
+    config.QUEUE_DB = work_dir / "queue.db"
+    config.LOG_DIR = work_dir / "log"
+    config.TRACE_DIR = config.LOG_DIR / "trace"
+    config.PROFILE_DIR = config.LOG_DIR / "profile"
+    config.DEFAULT_DOWNLOAD_DIR = work_dir / "downloads"
+    config.STORAGE_ROOTS = []
+
+
+def curl_runs(path):
+    """检查 curl 能否在本机运行（随附的 curl.exe 只能在 Windows 上执行）"""
+    try:
+        return subprocess.run([path, "--version"], capture_output=True, timeout=10).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def select_curl(path=None):
+    """指定路径优先，否则使用程序默认查找到的 curl，无法运行时改用系统 PATH 中的 curl"""
+    if path:
+        return path
+    found = utils.get_curl_path()
+    if curl_runs(found):
+        return found
+    system_curl = shutil.which("curl")
+    if system_curl is None:
+        raise SystemExit(f"无法运行 {found}，且系统中没有 curl，请通过 --curl 指定")
+    print(f"{found} 无法运行，改用系统 curl: {system_curl}")
+    return system_curl
+
+
+def peak_rss_kb():
+    """返回 (本进程, 子进程) 的峰值常驻内存（KB），不支持的平台返回 None"""
+    if resource is None:
+        return None, None
+    # macOS 上 ru_maxrss 单位为字节，Linux 上为 KB
+    scale = 1024 if platform.system() == "Darwin" else 1
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale)
+
+
+def run_once(server, save_dir):
+    """执行一次完整下载任务并返回测量结果"""
+    files = downloader.get_file_list(BENCH_RJ_ID)
+    total_size = sum(f['size'] for f in files)
+
+    downloader.task_queue.put({"rj_id": BENCH_RJ_ID, "files": files, "save_path": str(save_dir)})
+    downloader.task_queue.put(None)  # 任务完成后退出工作线程
+
+    times_before = os.times()
+    began = time.perf_counter()
+    worker = threading.Thread(target=downloader.download_worker, daemon=True)
+    worker.start()
+    worker.join()
+    elapsed = time.perf_counter() - began
+    times_after = os.times()
+
+    with downloader.stats_lock:
+        success = downloader.download_stats["success_files"]
+        failed = downloader.download_stats["failed_files"]
+
+    rss_self, rss_children = peak_rss_kb()
+    return {
+        "files": len(files),
+        "bytes": total_size,
+        "success": success,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "mb_per_s": round(total_size / 1024 / 1024 / elapsed, 2) if elapsed else 0.0,
+        "files_per_s": round(len(files) / elapsed, 2) if elapsed else 0.0,
+        "cpu_self_s": round((times_after.user - times_before.user) + (times_after.system - times_before.system), 3),
+        "cpu_children_s": round((times_after.children_user - times_before.children_user)
+                                + (times_after.children_system - times_before.children_system), 3),
+        "peak_rss_kb": rss_self,
+        "peak_rss_children_kb": rss_children,
+        "server": dict(server.state.stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASMRip 端到端吞吐量测试")
+    parser.add_argument("--files", type=int, default=20, help="作品文件数")
+    parser.add_argument("--size", default="4M", help="每个文件大小，如 512K、8M")
+    parser.add_argument("--throttle", default="0", help="单连接限速（字节/秒，支持 K/M 单位）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="媒体请求返回 503 的概率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="传输中途断开的概率")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="传输中途停止发送数据（不断开连接）的概率")
+    parser.add_argument("--runs", type=int, default=1, help="重复次数")
+    parser.add_argument("--curl", default=None, help="curl 可执行文件路径（默认自动查找）")
+    parser.add_argument("--output", default=None, help="结果 JSON 输出路径")
+    args = parser.parse_args()
+
+    config.CURL_PATH = select_curl(args.curl)
+    work_dir = tempfile.mkdtemp(prefix="asmrip_bench_")
+    isolate_paths(work_dir)
+
+    results = []
+    try:
+        for run in range(args.runs):
+            results.append(bench_run(args, run))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        save_results(args.output, "throughput", results, vars(args))
+        print(f"结果已保存: {args.output}")
+
+
+def bench_run(args, run):
+    """执行第 run 轮测试，每轮使用新的下载目录与模拟服务器"""
+    save_dir = tempfile.mkdtemp(prefix="run_", dir=config.DEFAULT_DOWNLOAD_DIR.parent)
+    server = MockAsmrServer(
+        file_count=args.files, file_size=parse_size(args.size), throttle=parse_size(args.throttle),
+        latency=args.latency, fail_rate=args.fail_rate, drop_rate=args.drop_rate,
+        stall_rate=args.stall_rate, seed=run,
+    )
+    try:
+        with server:
+            config.API_ENDPOINT = server.url
+            downloader.reset_progress()
+            result = run_once(server, save_dir)
+    finally:
+        shutil.rmtree(save_dir, ignore_errors=True)
+    print(f"[{run + 1}/{args.runs}] {result['mb_per_s']:.2f} MB/s  {result['files_per_s']:.2f} 文件/s  "
+          f"耗时 {result['seconds']:.2f}s  成功 {result['success']}/{result['files']}  "
+          f"CPU {result['cpu_self_s']:.2f}s (+curl {result['cpu_children_s']:.2f}s)  "
+          f"峰值内存 {result['peak_rss_kb']} KB")
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+性能测试公共工具
+提供计时、结果保存和与历史结果对比的功能。
+"""
+
+import platform
+import statistics
+import time
+from datetime import datetime
+
+import orjson
+
+
+def measure(func, rounds=5, warmup=1, setup=None):
+    """多次执行 func 并统计耗时
+
+    Args:
+        func: 被测函数（无参数）
+        rounds: 计时轮数
+        warmup: 预热轮数（不计入结果）
+        setup: 每轮执行前调用的准备函数（不计入耗时）
+
+    Returns:
+        包含 min/median/mean/max（秒）和轮数的字典
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+
+    timings = []
+    for _ in range(rounds):
+        if setup:
+            setup()
+        began = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - began)
+
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+        "rounds": rounds,
+    }
+
+
+def format_seconds(seconds):
+    """将秒数格式化为合适的单位"""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
+
+
+def print_results(results, baseline=None):
+    """以表格形式输出结果，提供 baseline 时显示中位数变化"""
+    width = max((len(name) for name in results), default=10)
+    for name, stats in results.items():
+        line = f"{name:<{width}}  median {format_seconds(stats['median']):>10}  min {format_seconds(stats['min']):>10}"
+        old = (baseline or {}).get(name)
+        if old and old.get("median"):
+            change = (stats["median"] - old["median"]) / old["median"] * 100
+            line += f"  ({change:+.1f}%)"
+        print(line)
+
+
+def save_results(path, benchmark, results, params=None):
+    """保存结果为 JSON 文件"""
+    report = {
+        "benchmark": benchmark,
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params or {},
+        "results": results,
+    }
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+
+def load_results(path):
+    """读取之前保存的结果，返回 results 部分"""
+    with open(path, "rb") as f:
+        return orjson.loads(f.read()).get("results", {})
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+本地模拟 ASMR API 与媒体服务器
+提供 /api/workInfo、/api/tracks?v=2 文件树和指定大小的媒体文件，
+支持 Range 请求、限速、延迟和故障注入，用于离线性能测试。
+
+用法:
+    python -m benchmarks.mock_server --port 8765 --files 20 --size 8M
+"""
+
+import argparse
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+import orjson
+
+# 媒体内容按固定块循环生成，避免占用与文件大小成正比的内存
+CHUNK_SIZE = 64 * 1024
+_PATTERN = bytes(range(256)) * (CHUNK_SIZE // 256)
+
+
+def parse_size(text):
+    """解析带单位的大小字符串，如 "512K"、"8M"、"1G" """
+    text = str(text).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def build_tracks(work_id, file_count, file_size, base_url, folders=("MP3", "WAV")):
+    """生成与 /api/tracks?v=2 结构一致的文件树
+
+    文件均匀分布到各个文件夹中，标题包含中文和全角字符以覆盖文件名清洗逻辑。
+
+    Returns:
+        文件树列表
+    """
+    tree = []
+    for folder_index, folder in enumerate(folders):
+        children = []
+        for index in range(folder_index, file_count, len(folders)):
+            children.append({
+                "type": "audio",
+                "title": f"{index + 1:03d}_トラック（本編）.{folder.lower()}",
+                "hash": f"{work_id}/{index}",
+                "size": file_size,
+                "mediaDownloadUrl": f"{base_url}/media/{work_id}/{index}",
+                "mediaStreamUrl": f"{base_url}/media/{work_id}/{index}",
+            })
+        if children:
+            tree.append({"type": "folder", "title": folder, "children": children})
+    return tree
+
+
+class MockState:
+    """模拟服务器的运行参数与统计信息"""
+
+    def __init__(self, file_count=10, file_size=1024 * 1024, throttle=0, latency=0.0,
+                 fail_rate=0.0, drop_rate=0.0, max_rps=0, retry_after=1, stall_rate=0.0, stall_seconds=600,
+                 seed=0):
+        self.file_count = file_count  # 每个作品的文件数
+        self.file_size = file_size  # 每个文件的字节数
+        self.throttle = throttle  # 单连接限速（字节/秒，0 表示不限速）
+        self.latency = latency  # 每个请求的首字节延迟（秒）
+        self.fail_rate = fail_rate  # 媒体请求直接返回 503 的概率
+        self.drop_rate = drop_rate  # 媒体传输中途断开连接的概率
+        self.stall_rate = stall_rate  # 媒体传输中途停止发送数据（保持连接）的概率
+        self.stall_seconds = stall_seconds  # 停止发送后保持连接的时间（秒），之后断开
+        self.max_rps = max_rps  # 每秒允许的请求数，超出时返回 429（0 表示不限制）
+        self.retry_after = retry_after  # 429 响应的 Retry-After（秒）
+        self.window = (0, 0)  # (当前秒, 该秒内的请求数)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes_sent": 0, "failures": 0, "drops": 0, "throttled": 0, "stalls": 0}
+
+    def roll(self, rate):
+        """按概率决定是否注入故障（线程安全）"""
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def over_limit(self):
+        """按固定一秒窗口统计请求数，判断是否超过 max_rps（线程安全）"""
+        if self.max_rps <= 0:
+            return False
+        second = int(time.monotonic())
+        with self.lock:
+            current, count = self.window
+            count = count + 1 if current == second else 1
+            self.window = (second, count)
+            return count > self.max_rps
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟 API 请求处理器"""
+
+    protocol_version = "HTTP/1.1"
+    state = None  # MockState 实例，由 MockAsmrServer 绑定
+
+    def log_message(self, format, *args):
+        """屏蔽默认的访问日志"""
+        pass
+
+    def do_GET(self):
+        self.state.count("requests")
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        if self.state.over_limit():
+            self.state.count("throttled")
+            self.send_response(429)
+            self.send_header("Retry-After", str(self.state.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        path = urlsplit(self.path).path
+        match = re.fullmatch(r"/api/workInfo/(\d+)", path)
+        if match:
+            return self._send_json(self._work_info(match.group(1)))
+        match = re.fullmatch(r"/api/tracks/(\d+)", path)
+        if match:
+            tree = build_tracks(match.group(1), self.state.file_count, self.state.file_size, self._base_url())
+            return self._send_json(tree)
+        match = re.fullmatch(r"/media/(\d+)/(\d+)", path)
+        if match and int(match.group(2)) < self.state.file_count:
+            return self._send_media(self.state.file_size)
+        self.send_error(404)
+
+    def _base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _work_info(self, work_id):
+        return {
+            "id": int(work_id),
+            "title": f"模拟作品 {work_id}",
+            "name": "Mock Circle",
+            "mainCoverUrl": None,
+        }
+
+    def _send_json(self, data):
+        body = orjson.dumps(data)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_media(self, size):
+        if self.state.roll(self.state.fail_rate):
+            self.state.count("failures")
+            self.send_error(503)
+            return
+
+        # 解析 Range 请求头（仅支持单段 bytes=start-end）
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header or "")
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)
+            end = min(end, size - 1)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        length = end - start + 1
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+        # 需要中途断开或停滞时，在传输一半时触发
+        drop_at = stall_at = None
+        if self.state.roll(self.state.drop_rate):
+            drop_at = length // 2
+        elif self.state.roll(self.state.stall_rate):
+            stall_at = length // 2
+
+        # 块长度等于图案长度，因此每次写出的块都从同一偏移开始
+        offset = start % len(_PATTERN)
+        block = memoryview(_PATTERN[offset:] + _PATTERN[:offset])
+        sent = 0
+        began = time.monotonic()
+        try:
+            while sent < length:
+                if drop_at is not None and sent >= drop_at:
+                    self.state.count("drops")
+                    self.close_connection = True
+                    return
+                if stall_at is not None and sent >= stall_at:
+                    self.state.count("stalls")
+                    time.sleep(self.state.stall_seconds)
+                    self.close_connection = True
+                    return
+                chunk = block[:min(CHUNK_SIZE, length - sent)]
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if self.state.throttle:
+                    # 按目标速率计算应耗时间，超前则休眠
+                    ahead = sent / self.state.throttle - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            self.state.count("bytes_sent", sent)
+
+
+class MockAsmrServer:
+    """在后台线程中运行的模拟服务器"""
+
+    def __init__(self, host="127.0.0.1", port=0, **options):
+        self.state = MockState(**options)
+        handler = type("BoundMockHandler", (MockHandler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASMRip 本地模拟 API 与媒体服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--files", type=int, default=10, help="每个作品的文件数")
+    parser.add_argument("--size", default="1M", help="每个文件大小，如 512K、8M")
+    parser.add_argument("--throttle", default="0", help="单连接限速（字节/秒，支持 K/M 单位）")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="媒体请求返回 503 的概率")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="传输中途断开的概率")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="传输中途停止发送数据（不断开连接）的概率")
+    parser.add_argument("--max-rps", type=int, default=0, help="每秒允许的请求数，超出时返回 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockAsmrServer(
+        args.host, args.port,
+        file_count=args.files, file_size=parse_size(args.size), throttle=parse_size(args.throttle),
+        latency=args.latency, fail_rate=args.fail_rate, drop_rate=args.drop_rate, stall_rate=args.stall_rate,
+        max_rps=args.max_rps, retry_after=args.retry_after, seed=args.seed,
+    )
+    print(f"模拟服务器已启动: {server.url}  (设置 config.API_ENDPOINT 指向此地址)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,50 @@ APP_NAME = "ASMRip"  # 应用名称
 HOST = "127.0.0.1"  # Web 服务监听地址
 PORT = 4565  # Web 服务端口号
 API_ENDPOINT = "https://api.asmr-200.com"  # ASMR API 地址
+CURL_PATH = None  # 自定义 curl 路径（None 时自动查找）
+
+# ============================================================
+# 上游请求速率配置（同一主机的所有请求共享预算）
+# ============================================================
+API_RATE_LIMIT = (4, 8)  # API_ENDPOINT 所在主机的 (每秒请求数, 允许的突发请求数)
+RATE_LIMIT_DEFAULT = None  # 其他主机（媒体、封面）的默认预算，None 表示不限速（仍会遵守 429 限流暂停）
+RATE_LIMITS = {}  # 按主机单独设置，优先于以上两项，如 {"api.asmr-200.com": (2, 4), "media.example.com": (10, 20)}
+RATE_LIMIT_BACKOFF = 5  # 限流响应没有 Retry-After 时的初始等待（秒），连续限流时加倍
+RATE_LIMIT_MAX_BACKOFF = 300  # 单次限流等待的上限（秒）
+RATE_LIMIT_RETRIES = 5  # 每个请求因限流重试的最多次数（不计入普通失败重试次数）
+
+# ============================================================
+# Web 服务配置
+# ============================================================
+WSGI_SERVER = "waitress"  # WSGI 服务器：waitress（生产环境）/ flask（开发服务器）
+WSGI_THREADS = 8  # waitress 工作线程数
+WSGI_CONNECTION_LIMIT = 100  # waitress 最大并发连接数
+USE_X_SENDFILE = False  # 部署在 nginx/Apache 之后时，由前端服务器以 sendfile 零拷贝发送本地文件
+LIBRARY_FILE_MAX_AGE = 3600  # 本地文件响应的缓存时间（秒）
+STREAM_CHUNK_SIZE = 256 * 1024  # 边下边播每次发送的最大字节数
+STREAM_POLL_INTERVAL = 0.25  # 边下边播等待数据写入的轮询间隔（秒）
+STREAM_WAIT_TIMEOUT = 120  # 边下边播超过该时间（秒）没有新数据时结束响应
+
+# ============================================================
+# 下载进度配置
+# ============================================================
+PROGRESS_SAMPLE_INTERVAL = 0.5  # 进度采样间隔（秒）
+SPEED_EWMA_ALPHA = 0.3  # 网速指数加权平均系数（越大越灵敏）
+DISK_SPACE_RESERVE = 100 * 1024 * 1024  # 预检时保留的磁盘空余空间（字节）
+
+# ============================================================
+# 超时与停滞检测配置
+# ============================================================
+CONNECT_TIMEOUT = 15  # 建立连接的超时（秒）
+STALL_TIMEOUT = 60  # 传输超过该时间（秒）没有收到新数据视为停滞，中断后断点续传
+LOW_SPEED_LIMIT = 1024  # 低速阈值（字节/秒）
+LOW_SPEED_TIME = 180  # 平均速度持续低于 LOW_SPEED_LIMIT 超过该时间（秒）时中断后断点续传
+STALL_MAX_RESTARTS = 20  # 单个文件因停滞重新连接的最大次数（有进展的重连不计入失败重试次数）
+TRANSFER_TIMEOUT_BASE = 300  # 单次文件传输的基础超时（秒）
+TRANSFER_MIN_RATE = 20 * 1024  # 传输超时 = 基础超时 + 剩余字节 / 该速度（字节/秒）
+API_TIMEOUT_BASE = 10  # 元数据请求的基础超时（秒）
+API_MIN_RATE = 50 * 1024  # 元数据请求超时按该接口以往的响应大小增加：响应字节 / 该速度（字节/秒）
+API_TIMEOUT_RETRIES = 2  # 元数据请求超时后加倍超时时间重试的次数
 
 # ============================================================
 # 文件路径配置
@@ -38,12 +82,65 @@ else:
 
 DEFAULT_DOWNLOAD_DIR = BASE_DIR / "Download"  # 默认下载目录
 
+# 存储池：多个下载根目录（如 ["D:/ASMR", "E:/ASMR"]），为空时只使用 DEFAULT_DOWNLOAD_DIR。
+# 保存路径为默认下载目录的任务按剩余空间与写入速度自动选择根目录，作品库覆盖所有根目录
+STORAGE_ROOTS = []
+STORAGE_PROBE_BYTES = 16 * 1024 * 1024  # 测量写入速度时写入的字节数
+STORAGE_PROBE_INTERVAL = 3600  # 写入速度测量结果的缓存时间（秒）
+
+# ============================================================
+# 文件选择规则
+# ============================================================
+# 提交任务时可通过 filter 字段指定预设名称或规则字典（见 file_filters.py）
+FORMAT_PRESETS = {
+    "prefer_flac": {"prefer": ["flac", "mp3", "wav"]},  # 同一音轨优先 FLAC，其次 MP3，有有损版本时跳过 WAV
+    "prefer_mp3": {"prefer": ["mp3", "m4a", "flac", "wav"]},  # 同一音轨只保留有损版本（节省空间）
+    "prefer_lossless": {"prefer": ["flac", "wav", "mp3"]},  # 同一音轨优先无损版本
+    "audio_subtitles": {"types": ["audio", "subtitle"]},  # 只下载音频和字幕
+    "flac_subtitles": {"prefer": ["flac", "mp3", "wav"], "types": ["audio", "subtitle"]},
+}
+DEFAULT_FORMAT_PRESET = None  # 提交任务未指定 filter 时使用的预设（None 表示不筛选）
+
+# ============================================================
+# 任务队列配置
+# ============================================================
+WORKER_MODE = "local"  # local：程序内置单个下载线程 / pool：SQLite 共享队列 + 多个工作进程
+QUEUE_DB = BASE_DIR / "queue.db"  # 共享队列数据库（多主机时放在共享存储卷上）
+POOL_LOCAL_WORKERS = 2  # pool 模式下主程序在本机启动的工作进程数
+LEASE_SECONDS = 60  # 文件租约时长（秒），超时未续约的文件会被其他工作进程重新领取
+HEARTBEAT_INTERVAL = 5  # 工作进程心跳间隔（秒）
+MAX_FILE_ATTEMPTS = 2  # 每个文件最多被领取的次数
+JOBS_PAGE_SIZE = 100  # 任务 API v2 列表默认每页条数
+JOBS_PAGE_MAX = 500  # 任务 API v2 列表每页最大条数
+JOBS_LOCAL_HISTORY = 200  # 本地模式在内存中保留的已结束任务数（任务 API v2，重启后清空）
+
+# ============================================================
+# 作品库索引配置
+# ============================================================
+LIBRARY_DB = BASE_DIR / "library.db"  # 作品库索引数据库（作品信息、文件路径与全文索引）
+LIBRARY_SEARCH_LIMIT = 50  # 搜索接口默认返回的最大条数
+LIBRARY_INFO_BATCH = 100  # 每次扫描后最多为多少个作品补全标题与社团（请求作品信息接口）
+LIBRARY_INFO_RETRY = 24 * 3600  # 作品信息获取失败后再次尝试的间隔（秒）
+DEDUPE_MODE = "hardlink"  # 作品库中已有内容摘要相同的文件时：hardlink 硬链接（跨分区时退回复制）/ copy 本地复制 / off 不去重
+VERIFY_WORKERS = min(32, (os.cpu_count() or 4) * 2)  # 完整性校验的哈希线程数
+VERIFY_IO_CONCURRENCY = 4  # 完整性校验同时读取的文件数上限（机械硬盘建议 1~2，SSD/阵列可调大）
+VERIFY_CHUNK_SIZE = 8 * 1024 * 1024  # 完整性校验每次送入哈希的字节数
+
 # ============================================================
 # 日志配置
 # ============================================================
 LOG_LEVEL = "INFO"  # 日志级别
 LOG_DIR = BASE_DIR / "log"  # 日志文件目录
 
+# ============================================================
+# 性能诊断配置
+# ============================================================
+TRACE_ENABLED = False  # 记录各阶段耗时（可通过 POST /api/trace 在运行时开关），导出为 Chrome trace JSON
+TRACE_MAX_EVENTS = 200000  # 内存中最多保留的时间段数量（超出时丢弃最早的记录）
+TRACE_DIR = LOG_DIR / "trace"  # pool 工作进程在任务结束时导出追踪数据的目录
+PROFILE_JOBS = False  # 以 cProfile 运行每个下载任务，任务结束时保存统计结果
+PROFILE_DIR = LOG_DIR / "profile"  # cProfile 统计结果目录
+
 # 启动计数器文件路径
 STARTUP_COUNT_FILE = LOG_DIR / "startup_count.txt"
 
@@ -8,15 +8,22 @@
 """
 
 import sys
+import os
+import shutil
 import pathlib
 import subprocess
 import threading
+import itertools
+import contextlib
 import queue
+import urllib.parse
+from collections import deque
 import orjson
 import logging
 import time
-import re
 from datetime import datetime
+from types import MappingProxyType
+from typing import NamedTuple, Optional
 
 # Windows 平台静默启动配置
 if sys.platform == 'win32':
@@ -24,6 +31,12 @@ if sys.platform == 'win32':
     SW_HIDE = 0
 
 import config
+import library_index
+import library_verify
+import progress
+import rate_limit
+import storage_pool
+import tracing
 import utils
 from shared import log_message
 
@@ -32,25 +45,33 @@ from shared import log_message
 # ============================================================
 
 task_queue = queue.Queue()  # 待下载任务队列
+_tasks = {}  # 排队中和执行中的任务：任务 ID -> 任务字典（重复提交时合并到已有任务）
+_tasks_lock = threading.Lock()
+_plans = {}  # 执行中的任务：任务 ID -> 下载计划（供边下边播查找文件，由 _tasks_lock 保护）
+_wanted = {}  # 任务 ID -> 请求优先下载的文件路径列表（边下边播）
+_records = {}  # 任务 ID -> 本地任务记录（任务 API v2，由 _tasks_lock 保护）
+_cancelled = set()  # 排队中被取消的任务 ID（下载线程取出时跳过，由 _tasks_lock 保护）
 download_stop_signal = False  # 下载停止信号
 delete_partial_signal = False  # 是否删除未完成的文件
 
+# 暂停控制：整个队列暂停时 queue_running 被清除；单个任务暂停时其 ID 加入 paused_jobs
+queue_running = threading.Event()
+queue_running.set()
+paused_jobs = set()
+current_job_id = None  # 本地下载线程正在执行的任务 ID
+
+# 运行中的 curl 子进程（停止或暂停时直接终止，无需等待当前文件下载完成）
+_processes = {}  # Popen -> 任务 ID
+_processes_lock = threading.Lock()
+CURL_RANGE_ERROR = 33  # curl 返回码：服务器不支持断点续传
+CURL_TIMEOUT_ERROR = 28  # curl 返回码：超时（--max-time / --speed-limit）
+
 # ============================================================
 # 下载进度相关
 # ============================================================
 
 is_downloading = False  # 是否正在下载
-
-# 当前下载进度信息
-current_progress = {
-    "total_percent": 0.0,  # 总进度百分比
-    "current_file_percent": 0.0,  # 当前文件进度
-    "current_filename": "",  # 当前下载的文件名
-    "speed": 0.0,  # 下载速度 (KB/s)
-    "downloaded_size": 0,  # 已下载字节数
-    "total_size": 0,  # 总字节数
-}
-progress_lock = threading.Lock()  # 进度数据锁
+_job_ids = itertools.count(1)  # 本地下载任务 ID
 
 # 下载统计信息
 download_stats = {
@@ -60,13 +81,11 @@ download_stats = {
     "failed_list": [],  # 失败文件列表
     "stopped_by_user": False,  # 是否用户手动停止
     "pending_finish": False,  # 是否有待显示的完成结果
+    "dedupe_files": 0,  # 复用作品库已有文件的数量
+    "dedupe_bytes": 0,  # 复用节省的下载流量（字节）
 }
 stats_lock = threading.Lock()  # 统计信息锁
 
-# 网速计算相关
-last_speed_time = time.time()
-last_downloaded_size = 0
-speed_lock = threading.Lock()
 
 # Windows 静默启动配置
 if sys.platform == 'win32':
@@ -88,60 +107,23 @@ def get_status():
 
 
 def get_progress():
-    """获取当前下载进度（线程安全）"""
-    global current_progress, last_speed_time, last_downloaded_size
-
-    with speed_lock:
-        now = time.time()
-        # 每秒计算一次下载速度
-        if now - last_speed_time >= 1.0:
-            delta_size = current_progress["downloaded_size"] - last_downloaded_size
-            delta_time = now - last_speed_time
-            if delta_time > 0 and last_downloaded_size > 0:
-                current_progress["speed"] = round(delta_size / 1024 / delta_time, 2)
-            last_downloaded_size = current_progress["downloaded_size"]
-            last_speed_time = now
-
-    with progress_lock:
-        return current_progress.copy()
-
-
-def set_progress(total_percent, current_file_percent, current_filename, downloaded_size=0, total_size=0):
-    """设置当前下载进度"""
-    global current_progress
-    with progress_lock:
-        current_progress = {
-            "total_percent": round(total_percent, 2),
-            "current_file_percent": str(current_file_percent) if isinstance(current_file_percent, str) else round(
-                current_file_percent, 2),
-            "current_filename": current_filename,
-            "speed": current_progress["speed"],
-            "downloaded_size": downloaded_size,
-            "total_size": total_size
-        }
+    """获取当前下载进度（所有进行中的传输汇总）"""
+    return progress.legacy_progress()
 
 
 def reset_progress():
-    """重置所有进度和统计数据"""
-    global current_progress, last_downloaded_size, last_speed_time, download_stats
-    with progress_lock, speed_lock, stats_lock:
-        current_progress = {
-            "total_percent": 0.0,
-            "current_file_percent": 0.0,
-            "current_filename": "",
-            "speed": 0.0,
-            "downloaded_size": 0,
-            "total_size": 0
-        }
-        last_downloaded_size = 0
-        last_speed_time = time.time()
+    """重置统计数据"""
+    global download_stats
+    with stats_lock:
         download_stats = {
             "total_files": 0,
             "success_files": 0,
             "failed_files": 0,
             "failed_list": [],
             "stopped_by_user": False,
-            "pending_finish": False
+            "pending_finish": False,
+            "dedupe_files": 0,
+            "dedupe_bytes": 0
         }
 
 
@@ -149,12 +131,51 @@ def reset_progress():
 # API 请求函数
 # ============================================================
 
-def request_by_curl(url: str, timeout: int = 10):
-    """使用 curl 发送 GET 请求，返回 JSON 数据"""
+_api_sizes = {}  # 接口路径（去掉作品号）-> 以往最大的响应字节数，用于按预期大小计算超时
+
+
+def _api_kind(url):
+    return urllib.parse.urlsplit(url).path.rstrip("0123456789")
+
+
+def api_timeout(url):
+    """按该接口以往的响应大小计算请求超时（秒）"""
+    return config.API_TIMEOUT_BASE + _api_sizes.get(_api_kind(url), 0) / config.API_MIN_RATE
+
+
+def request_by_curl(url: str, timeout=None):
+    """使用 curl 发送 GET 请求，返回 JSON 数据
+
+    请求前等待主机的速率预算；被限流（429/503）时按 Retry-After 等待后重试。
+    未指定 timeout 时按以往的响应大小计算超时，超时后加倍超时时间重试 API_TIMEOUT_RETRIES 次。
+    """
+    timeout = timeout or api_timeout(url)
     try:
-        cmd = [utils.get_curl_path(), "-s", "--max-time", str(timeout), "--connect-timeout", "5", url]
-        result = subprocess.check_output(cmd, stderr=subprocess.PIPE, startupinfo=STARTUPINFO)
-        return orjson.loads(result)
+        throttled = timeouts = 0
+        while True:
+            cmd = [utils.get_curl_path(), "-s", "-D", "-", "--max-time", f"{timeout:.0f}",
+                   "--connect-timeout", str(config.CONNECT_TIMEOUT), url]
+            with tracing.span("rate_limit.wait", "http", url=url):
+                rate_limit.acquire(url)
+            with tracing.span("http.metadata", "http", url=url):
+                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=STARTUPINFO)
+            if result.returncode == CURL_TIMEOUT_ERROR and timeouts < config.API_TIMEOUT_RETRIES:
+                timeouts += 1
+                timeout *= 2
+                log_message("WARNING", f"请求超时，以 {timeout:.0f} 秒超时重试: {url}")
+                continue
+            if result.returncode != 0:
+                raise Exception(f"Curl 返回码: {result.returncode}")
+            status, headers, body = rate_limit.parse_headers(result.stdout)
+            if rate_limit.report(url, status, headers.get("retry-after")) and throttled < config.RATE_LIMIT_RETRIES:
+                throttled += 1
+                continue
+            break
+        if status and status >= 400:
+            raise Exception(f"HTTP {status}")
+        kind = _api_kind(url)
+        _api_sizes[kind] = max(_api_sizes.get(kind, 0), len(body))
+        return orjson.loads(body)
     except Exception as e:
         log_message("ERROR", f"Curl 请求失败: {e}")
         return None
@@ -167,17 +188,11 @@ def get_work_info(rj_id: str):
     return request_by_curl(url)
 
 
-def get_file_list(rj_id: str):
-    """获取作品文件列表"""
-    rj_num = rj_id.replace("RJ", "").replace("rj", "")
-    url = f"{config.API_ENDPOINT}/api/tracks/{rj_num}?v=2"
-    data = request_by_curl(url)
-    if not data:
-        return []
-
+def flatten_tracks(items, current_path=""):
+    """将 /api/tracks 返回的文件树展开为文件列表"""
     files = []
 
-    def traverse(items, current_path=""):
+    def traverse(items, current_path):
         """递归遍历文件树"""
         for item in items:
             path = f"{current_path}/{item['title']}" if current_path else item['title']
@@ -192,24 +207,242 @@ def get_file_list(rj_id: str):
                     "mediaStreamUrl": item.get("mediaStreamUrl")
                 })
 
-    traverse(data if isinstance(data, list) else data.get("children", []))
+    traverse(items, current_path)
     return files
 
 
+def build_file_tree(files):
+    """根据展开后的文件列表构建目录树（供界面按需展开）
+
+    文件夹节点为 {"name", "size", "count", "children"}，children 中的整数为文件在 files 中的下标，
+    保持原有顺序，界面只需保存选中下标即可。
+
+    Returns:
+        根节点
+    """
+    root = {"name": "", "size": 0, "count": 0, "children": []}
+    folders = {"": root}
+    for index, f in enumerate(files):
+        parts = f["path"].split("/")
+        node = root
+        node["size"] += f["size"]
+        node["count"] += 1
+        prefix = ""
+        for part in parts[:-1]:
+            prefix = f"{prefix}/{part}"
+            child = folders.get(prefix)
+            if child is None:
+                child = {"name": part, "size": 0, "count": 0, "children": []}
+                folders[prefix] = child
+                node["children"].append(child)
+            child["size"] += f["size"]
+            child["count"] += 1
+            node = child
+        node["children"].append(index)
+    return root
+
+
+def get_file_list(rj_id: str):
+    """获取作品文件列表"""
+    rj_num = rj_id.replace("RJ", "").replace("rj", "")
+    url = f"{config.API_ENDPOINT}/api/tracks/{rj_num}?v=2"
+    data = request_by_curl(url)
+    if not data:
+        return []
+
+    return flatten_tracks(data if isinstance(data, list) else data.get("children", []))
+
+
 # ============================================================
 # 下载控制函数
 # ============================================================
 
 def stop_download(immediately=False):
-    """停止下载任务"""
+    """停止下载任务
+
+    Args:
+        immediately: 为 True 时立即终止正在进行的传输并删除未完成的文件，否则等待当前文件下载完成
+    """
     global download_stop_signal, delete_partial_signal
     download_stop_signal = True
     delete_partial_signal = immediately
     with stats_lock:
         download_stats["stopped_by_user"] = True
+    if immediately:
+        terminate_transfers()
     log_message("TASK", f"用户请求{'立即' if immediately else ''}停止下载")
 
 
+def submit_task(task):
+    """将任务加入本地下载队列
+
+    同一作品保存到同一目录的任务已在排队或执行时不再新建任务，
+    而是把尚未包含的文件合并到已有任务中（执行中的任务会在当前文件列表下载完后继续下载合并进来的文件）。
+
+    Returns:
+        (任务 ID, 新增文件数, 是否合并到已有任务)
+    """
+    key = utils.job_key(task['rj_id'], task['save_path'])
+    with _tasks_lock:
+        for job_id, existing in _tasks.items():
+            if utils.job_key(existing['rj_id'], existing['save_path']) == key:
+                known = {f['path'] for f in existing['files']}
+                added = [f for f in task['files'] if f['path'] not in known]
+                existing['files'].extend(added)
+                if added and job_id in _records:
+                    _records[job_id]["updated"] = time.time()
+                return job_id, len(added), True
+        job_id = next(_job_ids)
+        task = dict(task, job_id=job_id, files=list(task['files']))
+        _tasks[job_id] = task
+        _records[job_id] = _new_record(task, "queued")
+    task_queue.put(task)
+    return job_id, len(task['files']), False
+
+
+def _extend_plan(task, plan):
+    """取出任务执行期间合并进来的文件并重建下载计划
+
+    没有新文件（或已停止）时注销任务，之后提交的同一作品会作为新任务排队。
+
+    Returns:
+        包含全部文件的新计划（已有文件的保存路径不变），没有新文件时返回 None
+    """
+    with _tasks_lock:
+        if download_stop_signal or len(task['files']) == len(plan.files):
+            _tasks.pop(task.get('job_id'), None)
+            return None
+        files = list(task['files'])
+    return build_job_plan(files, plan.target_dir)
+
+
+def find_planned_file(work_name, relative_path):
+    """在执行中的本地任务计划里查找文件
+
+    Args:
+        work_name: 作品文件夹名（如 RJ01234567）
+        relative_path: 作品文件夹内清洗后的相对路径（/ 分隔）
+
+    Returns:
+        (任务 ID, 计划项)，不在任何计划中时返回 None
+    """
+    with _tasks_lock:
+        plans = list(_plans.items())
+    for job_id, plan in plans:
+        if plan.target_dir.name != work_name:
+            continue
+        index = plan.by_relative.get(relative_path)
+        if index is not None:
+            return job_id, plan.files[index]
+    return None
+
+
+def is_job_planned(job_id):
+    """任务是否仍在执行（计划中的文件可能还会写入）"""
+    with _tasks_lock:
+        return job_id in _plans
+
+
+def prioritize_file(job_id, path):
+    """请求优先下载任务中的文件：当前文件完成后立即下载该文件（已开始或已完成时忽略）"""
+    with _tasks_lock:
+        if job_id not in _plans:
+            return
+        wanted = _wanted.setdefault(job_id, [])
+        if path not in wanted:
+            wanted.append(path)
+
+
+def _take_wanted(job_id, plan, taken):
+    """取出下一个请求优先下载且尚未处理的文件序号，没有时返回 None"""
+    with _tasks_lock:
+        wanted = _wanted.get(job_id)
+        while wanted:
+            item = plan.by_path.get(wanted.pop(0))
+            if item is None:
+                continue
+            index = plan.files.index(item)
+            if index not in taken:
+                return index
+    return None
+
+
+def pause_download(job_id=None):
+    """暂停指定任务，未指定时暂停整个队列；正在进行的传输立即中断，已下载部分保留用于续传"""
+    if job_id is None:
+        queue_running.clear()
+    else:
+        paused_jobs.add(job_id)
+    _touch_records(job_id)
+    count = terminate_transfers(job_id)
+    log_message("TASK", f"已暂停{'下载队列' if job_id is None else f'任务 #{job_id}'}，中断 {count} 个传输")
+
+
+def resume_download(job_id=None):
+    """继续指定任务，未指定时继续整个队列（同时清除所有单独暂停的任务）"""
+    if job_id is None:
+        paused_jobs.clear()
+        queue_running.set()
+    else:
+        paused_jobs.discard(job_id)
+    _touch_records(job_id)
+    log_message("TASK", f"已继续{'下载队列' if job_id is None else f'任务 #{job_id}'}")
+
+
+def is_paused(job_id=None):
+    """任务（或整个队列）是否处于暂停状态"""
+    return not queue_running.is_set() or job_id in paused_jobs
+
+
+def wait_while_paused(job_id=None):
+    """暂停期间阻塞等待
+
+    Returns:
+        False 表示等待期间收到停止信号
+    """
+    while is_paused(job_id) and not download_stop_signal:
+        queue_running.wait(0.2)
+    return not download_stop_signal
+
+
+def interruptible_sleep(seconds):
+    """等待指定秒数，收到停止信号时提前返回"""
+    deadline = time.monotonic() + seconds
+    while not download_stop_signal and time.monotonic() < deadline:
+        time.sleep(min(0.1, max(deadline - time.monotonic(), 0)))
+
+
+def _register_process(proc, job_id):
+    with _processes_lock:
+        _processes[proc] = job_id
+
+
+def _unregister_process(proc):
+    with _processes_lock:
+        _processes.pop(proc, None)
+
+
+def terminate_transfers(job_id=None):
+    """终止指定任务（未指定时为全部任务）正在运行的 curl 进程，返回终止的进程数"""
+    with _processes_lock:
+        targets = [proc for proc, owner in _processes.items() if job_id is None or owner == job_id]
+    for proc in targets:
+        try:
+            proc.terminate()
+        except OSError:
+            pass
+    return len(targets)
+
+
+def index_job(rj_id, plan, done_paths):
+    """将任务结果写入作品库索引（失败不影响下载流程）"""
+    try:
+        with tracing.span("library.index", "job", rj_id=rj_id):
+            library_index.record_job(plan, done_paths, get_work_info(rj_id))
+    except Exception as e:
+        log_message("WARNING", f"更新作品库索引失败: {e}")
+
+
 def generate_rename_log(target_dir, rj_id, rename_list):
     """生成文件名修改记录文件"""
     if not rename_list:
@@ -233,93 +466,635 @@ def generate_rename_log(target_dir, rj_id, rename_list):
         log_message("ERROR", f"生成重命名日志失败: {e}")
 
 
+# ============================================================
+# 本地任务记录（任务 API v2 的本地模式，只保存在内存中）
+# ============================================================
+
+def _new_record(task, status):
+    """新建任务记录（文件列表与任务共用，合并进来的文件自动计入）"""
+    now = time.time()
+    return {"id": task['job_id'], "rj_id": task['rj_id'], "save_path": task['save_path'], "status": status,
+            "created": now, "updated": now, "finished": None, "files": task['files'], "results": {}}
+
+
+def _touch_records(job_id=None):
+    """刷新未结束任务的更新时间（暂停状态变化时，轮询方可通过 updated_since 看到），未指定时为全部任务"""
+    now = time.time()
+    with _tasks_lock:
+        for record in _records.values():
+            if record["finished"] is None and job_id in (None, record["id"]):
+                record["updated"] = now
+
+
+def _record_file(job_id, path, status, error=None):
+    """记录文件状态（running / done / failed）"""
+    with _tasks_lock:
+        record = _records.get(job_id)
+        if record is not None:
+            record["results"][path] = (status, error)
+            record["updated"] = time.time()
+
+
+def _finish_record(job_id, failed=()):
+    """结束任务记录：停止或已取消的任务为 cancelled，否则为 done；只保留最近 JOBS_LOCAL_HISTORY 个已结束的任务"""
+    now = time.time()
+    with _tasks_lock:
+        record = _records.get(job_id)
+        if record is None or record["finished"] is not None:
+            return
+        for path, reason in failed:
+            record["results"][path] = ("failed", reason)
+        for path, (state, _) in list(record["results"].items()):
+            if state == "running":
+                record["results"][path] = ("failed", "未完成")
+        stopped = download_stop_signal or record["status"] == "cancelled"
+        record.update(status="cancelled" if stopped else "done", updated=now, finished=now)
+        _prune_records()
+
+
+def _prune_records():
+    """删除最早结束的多余记录（调用方持有 _tasks_lock）"""
+    finished = sorted(job_id for job_id, record in _records.items() if record["finished"] is not None)
+    for job_id in finished[:max(len(finished) - config.JOBS_LOCAL_HISTORY, 0)]:
+        del _records[job_id]
+
+
+def _record_summary(record):
+    """任务摘要，格式与 job_queue.list_jobs 相同（调用方持有 _tasks_lock）"""
+    results = record["results"]
+    status = record["status"]
+    if status in ("queued", "running") and is_paused(record["id"]):
+        status = "paused"
+    done = {path for path, (state, _) in results.items() if state == "done"}
+    return {
+        "id": record["id"],
+        "rj_id": record["rj_id"],
+        "status": status,
+        "priority": 0,
+        "files": len(record["files"]),
+        "done": len(done),
+        "failed": sum(1 for state, _ in results.values() if state == "failed"),
+        "size": sum(f['size'] for f in record["files"]),
+        "done_size": sum(f['size'] for f in record["files"] if f['path'] in done),
+        "created": round(record["created"], 3),
+        "updated": round(record["updated"], 3),
+        "finished": round(record["finished"], 3) if record["finished"] else None,
+    }
+
+
+def list_jobs(statuses=None, rj_id=None, updated_since=None, cursor=None, limit=100):
+    """按任务 ID 倒序分页列出本地任务（参数与返回值同 job_queue.list_jobs）"""
+    number = rj_id.upper().replace("RJ", "") if rj_id else None
+    jobs = []
+    with _tasks_lock:
+        for job_id in sorted(_records, reverse=True):
+            record = _records[job_id]
+            if cursor is not None and job_id >= cursor:
+                continue
+            if number and record["rj_id"].upper().replace("RJ", "") != number:
+                continue
+            if updated_since is not None and record["updated"] <= updated_since:
+                continue
+            summary = _record_summary(record)
+            if statuses and summary["status"] not in statuses:
+                continue
+            jobs.append(summary)
+            if len(jobs) > limit:
+                break
+    more = len(jobs) > limit
+    jobs = jobs[:limit]
+    return jobs, (jobs[-1]["id"] if more else None)
+
+
+def get_job(job_id, file_status=None):
+    """返回本地任务详情与每个文件的状态（格式同 job_queue.get_job，没有领取次数），任务不存在时返回 None"""
+    with _tasks_lock:
+        record = _records.get(job_id)
+        if record is None:
+            return None
+        job = _record_summary(record)
+        job["save_path"] = record["save_path"]
+        file_list = []
+        for idx, file in enumerate(record["files"]):
+            status, error = record["results"].get(file['path'], ("pending", None))
+            if file_status and status != file_status:
+                continue
+            file_list.append({"idx": idx, "path": file['path'], "size": file['size'],
+                              "status": status, "error": error})
+    job["file_list"] = file_list
+    return job
+
+
+def get_job_status(job_id):
+    """返回本地任务的状态，任务不存在时返回 None"""
+    with _tasks_lock:
+        record = _records.get(job_id)
+        return _record_summary(record)["status"] if record is not None else None
+
+
+def cancel_jobs(job_ids):
+    """批量取消本地任务，返回实际取消的任务 ID 列表（已结束的任务不变）
+
+    排队中的任务立即结束（下载线程取出时跳过）；执行中的任务中断正在进行的传输并停止，已下载部分保留。
+    """
+    global download_stop_signal
+    now = time.time()
+    updated, running = [], []
+    with _tasks_lock:
+        for job_id in job_ids:
+            record = _records.get(job_id)
+            if record is None or record["finished"] is not None or record["status"] == "cancelled":
+                continue
+            updated.append(job_id)
+            # 之后提交的同一作品作为新任务排队，不再合并到已取消的任务
+            _tasks.pop(job_id, None)
+            if record["status"] == "running":
+                record.update(status="cancelled", updated=now)
+                running.append(job_id)
+            else:
+                _cancelled.add(job_id)
+                record.update(status="cancelled", updated=now, finished=now)
+        _prune_records()
+    for job_id in running:
+        download_stop_signal = True
+        terminate_transfers(job_id)
+    if updated:
+        log_message("TASK", f"已取消任务: {', '.join(f'#{job_id}' for job_id in updated)}")
+    return updated
+
+
+# ============================================================
+# 任务规划
+# ============================================================
+
+class PlannedFile(NamedTuple):
+    """任务中单个文件的下载计划（不可变）"""
+    path: str  # 原始相对路径
+    hash: str  # 远程文件哈希
+    size: int  # 文件大小（字节）
+    url: Optional[str]  # 下载地址
+    save_file: pathlib.Path  # 清洗后的本地保存路径
+    rename_info: Optional[tuple]  # (原名, 新名)，未改名时为 None
+
+
+class JobPlan(NamedTuple):
+    """一次下载任务的完整计划（不可变），任务开始时构建一次"""
+    target_dir: pathlib.Path  # 作品保存目录
+    files: tuple  # PlannedFile 列表，保持提交顺序
+    by_path: MappingProxyType  # 原始路径 -> PlannedFile
+    by_hash: MappingProxyType  # 远程哈希 -> PlannedFile
+    by_relative: MappingProxyType  # 清洗后的相对路径（/ 分隔）-> 文件序号
+    directories: tuple  # 需要创建的全部目录（父目录在前）
+    total_size: int  # 总字节数
+
+
+def _unique_relative_path(safe_parts, used):
+    """为清洗后的路径生成不冲突的名称（不区分大小写，兼容 Windows）
+
+    多个原名清洗后相同时，在扩展名前追加 " (2)"、" (3)" 等序号。
+    """
+    relative = "/".join(safe_parts)
+    if relative.lower() not in used:
+        used.add(relative.lower())
+        return safe_parts
+
+    stem, dot, suffix = safe_parts[-1].rpartition(".")
+    if not dot or not stem:
+        stem, dot, suffix = safe_parts[-1], "", ""
+    counter = 2
+    while True:
+        name = f"{stem} ({counter}){dot}{suffix}"
+        candidate = safe_parts[:-1] + [name]
+        relative = "/".join(candidate)
+        if relative.lower() not in used:
+            used.add(relative.lower())
+            return candidate
+        counter += 1
+
+
+@tracing.traced("plan.build", "job")
+def build_job_plan(files, target_dir):
+    """根据提交的文件列表构建下载计划
+
+    一次性完成：路径片段清洗（相同片段只清洗一次）、重名处理、
+    目录去重以及按路径/哈希建立索引。
+
+    Args:
+        files: 文件信息列表（get_file_list 的返回格式）
+        target_dir: 作品保存目录
+
+    Returns:
+        JobPlan 实例
+    """
+    safe_cache = {}
+    used = set()
+    directories = {}  # 清洗后的目录片段 -> 目录路径
+    planned = []
+    by_path = {}
+    by_hash = {}
+    by_relative = {}
+
+    for file_info in files:
+        original_path = file_info['path']
+        parts = original_path.split('/')
+        safe_parts = []
+        for part in parts:
+            safe = safe_cache.get(part)
+            if safe is None:
+                safe = safe_cache[part] = utils.safe_path_part(part)
+            safe_parts.append(safe)
+        safe_parts = _unique_relative_path(safe_parts, used)
+
+        safe_relative = "/".join(safe_parts)
+        dir_key = tuple(safe_parts[:-1])
+        directory = directories.get(dir_key)
+        if directory is None:
+            directory = directories[dir_key] = target_dir.joinpath(*dir_key)
+        save_file = directory / safe_parts[-1]
+
+        item = PlannedFile(
+            path=original_path,
+            hash=file_info.get('hash'),
+            size=file_info['size'],
+            url=file_info.get('mediaDownloadUrl') or file_info.get('mediaStreamUrl'),
+            save_file=save_file,
+            rename_info=(original_path, safe_relative) if safe_relative != original_path else None,
+        )
+        by_relative[safe_relative] = len(planned)
+        planned.append(item)
+        by_path.setdefault(original_path, item)
+        if item.hash:
+            by_hash.setdefault(item.hash, item)
+
+    return JobPlan(
+        target_dir=target_dir,
+        files=tuple(planned),
+        by_path=MappingProxyType(by_path),
+        by_hash=MappingProxyType(by_hash),
+        by_relative=MappingProxyType(by_relative),
+        directories=tuple(directories[key] for key in sorted(directories, key=len)),
+        total_size=sum(item.size for item in planned),
+    )
+
+
+def _scan_directory(directory):
+    """用 os.scandir 读取目录下的文件大小，目录不存在时返回空字典"""
+    sizes = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        sizes[entry.name] = entry.stat().st_size
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return sizes
+
+
+@tracing.traced("plan.preflight", "job")
+def preflight_plan(plan):
+    """下载前的文件系统预检
+
+    每个目标目录只扫描一次，将计划中的文件分为 complete（已完整）、
+    partial（不完整）、missing（不存在）三类，并检查目标磁盘的空余空间
+    是否足够容纳剩余需要下载的字节数（不完整的文件断点续传，只计算缺少的部分）。
+
+    Returns:
+        预检结果字典
+    """
+    listings = {}
+    states = {}
+    counts = {"complete": 0, "partial": 0, "missing": 0}
+    remaining_bytes = 0
+    reclaimable_bytes = 0  # 比预期更大的文件会被删除后重新下载，其占用空间可回收
+
+    for item in plan.files:
+        directory = item.save_file.parent
+        key = str(directory)
+        listing = listings.get(key)
+        if listing is None:
+            listing = listings[key] = _scan_directory(directory)
+
+        size = listing.get(item.save_file.name)
+        if size is None:
+            state = "missing"
+            remaining_bytes += item.size
+        elif size == item.size:
+            state = "complete"
+        else:
+            state = "partial"
+            if size < item.size:
+                # 使用 -C - 从已下载的位置续传
+                remaining_bytes += item.size - size
+            else:
+                remaining_bytes += item.size
+                reclaimable_bytes += size
+        states[item.path] = state
+        counts[state] += 1
+
+    # 目标目录可能尚未创建，向上找到存在的目录来查询磁盘空间
+    probe = plan.target_dir
+    while not probe.exists() and probe.parent != probe:
+        probe = probe.parent
+    try:
+        free_bytes = shutil.disk_usage(probe).free
+    except OSError:
+        free_bytes = None
+
+    required_bytes = max(remaining_bytes - reclaimable_bytes, 0) + config.DISK_SPACE_RESERVE
+    return {
+        "states": states,
+        **counts,
+        "remaining_bytes": remaining_bytes,
+        "required_bytes": required_bytes,
+        "free_bytes": free_bytes,
+        "enough_space": free_bytes is None or remaining_bytes == 0 or free_bytes >= required_bytes,
+    }
+
+
+def create_plan_directories(plan):
+    """一次性创建计划中的所有目录"""
+    plan.target_dir.mkdir(parents=True, exist_ok=True)
+    for directory in plan.directories:
+        directory.mkdir(parents=True, exist_ok=True)
+
+
 # ============================================================
 # 核心下载函数
 # ============================================================
 
-def download_single_file(file_info, target_dir, downloaded_size, total_selected_size, max_retries=5, retry_delay=5):
-    """下载单个文件，支持重试"""
-    original_path = file_info['path']
+def get_file_size(path):
+    """返回文件当前大小，不存在时返回 0"""
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
 
-    # 清洗文件名（处理特殊字符）
-    safe_parts = [utils.safe_path_part(p) for p in original_path.split('/')]
-    safe_relative_path = pathlib.Path(*safe_parts)
-    save_file = target_dir / safe_relative_path
 
-    save_file.parent.mkdir(parents=True, exist_ok=True)
+def _has_digest(path, algorithm, expected, recorded_sha256):
+    """确认已有文件的内容摘要与期望值一致（SHA-256 已在校验时记录则直接比对）"""
+    if algorithm == "sha256" and recorded_sha256 == expected:
+        return True
+    try:
+        with tracing.span("dedupe.hash", "file", path=path):
+            digest = library_verify.hash_file(path, {algorithm}, contextlib.nullcontext())[algorithm]
+    except OSError:
+        return False
+    return digest == expected
+
+
+def link_existing_copy(plan, item):
+    """在作品库中查找内容相同的已下载文件，以硬链接（或本地复制）代替下载
+
+    只有远程哈希本身是十六进制内容摘要时才去重（asmr.one 的 hash 通常只是文件标识，不代表内容），
+    候选文件在链接前按该摘要计算确认，避免将内容不同的文件链接在一起。
+
+    Returns:
+        是否已复用
+    """
+    algorithm = library_verify.digest_algorithm(item.hash)
+    if config.DEDUPE_MODE == "off" or algorithm is None:
+        return False
+    expected = item.hash.strip().lower()
+    try:
+        candidates = library_index.find_copies(expected, item.size)
+    except Exception as e:
+        log_message("WARNING", f"查询作品库索引失败: {e}")
+        return False
+
+    for source, recorded_sha256 in candidates:
+        if source == str(item.save_file) or get_file_size(source) != item.size:
+            continue
+        if not _has_digest(source, algorithm, expected, recorded_sha256):
+            log_message("WARNING", f"已有文件内容与远程摘要不符，不复用: {source}")
+            continue
+        hardlink = False
+        try:
+            item.save_file.unlink(missing_ok=True)  # 删除续传残留的部分数据
+            if config.DEDUPE_MODE == "hardlink":
+                try:
+                    os.link(source, item.save_file)
+                    hardlink = True
+                except OSError:
+                    # 跨分区或文件系统不支持硬链接，退回本地复制（仍可节省下载流量）
+                    shutil.copyfile(source, item.save_file)
+            else:
+                shutil.copyfile(source, item.save_file)
+        except OSError as e:
+            log_message("WARNING", f"复用已有文件失败: {source} - {e}")
+            item.save_file.unlink(missing_ok=True)
+            continue
+
+        log_message("TASK", f"复用已有文件（{'硬链接' if hardlink else '复制'}）: {item.path} <- {source}")
+        with stats_lock:
+            download_stats["dedupe_files"] += 1
+            download_stats["dedupe_bytes"] += item.size
+        try:
+            library_index.record_link(plan, item, source, hardlink)
+            library_index.record_file(plan, item)
+        except Exception as e:
+            log_message("WARNING", f"更新作品库索引失败: {e}")
+        return True
+    return False
+
+
+class StallWatchdog:
+    """传输停滞检测：超过 STALL_TIMEOUT 秒没有新数据，或 LOW_SPEED_TIME 秒内平均速度低于 LOW_SPEED_LIMIT"""
+
+    __slots__ = ("last_bytes", "last_progress", "window_bytes", "window_start")
+
+    def __init__(self, start_bytes, now=None):
+        now = time.monotonic() if now is None else now
+        self.last_bytes = start_bytes
+        self.last_progress = now
+        self.window_bytes = start_bytes
+        self.window_start = now
+
+    def check(self, total_bytes, now=None):
+        """记录一次字节数采样，返回停滞原因，正常时返回 None"""
+        now = time.monotonic() if now is None else now
+        if total_bytes > self.last_bytes:
+            self.last_bytes = total_bytes
+            self.last_progress = now
+        elif now - self.last_progress >= config.STALL_TIMEOUT:
+            return f"{config.STALL_TIMEOUT} 秒没有收到数据"
+        elapsed = now - self.window_start
+        if elapsed >= config.LOW_SPEED_TIME:
+            rate = (total_bytes - self.window_bytes) / elapsed
+            if rate < config.LOW_SPEED_LIMIT:
+                return f"{config.LOW_SPEED_TIME} 秒平均速度 {rate / 1024:.2f} KB/s"
+            self.window_bytes = total_bytes
+            self.window_start = now
+        return None
+
 
-    # 记录文件名修改
-    rename_info = None
-    if str(safe_relative_path) != original_path:
-        rename_info = (original_path, str(safe_relative_path))
+def download_single_file(item, job_id=None, max_retries=5, retry_delay=5, state=None, plan=None):
+    """按计划下载单个文件，支持重试
 
-    url = file_info.get('mediaDownloadUrl') or file_info.get('mediaStreamUrl')
+    Args:
+        job_id: 进度登记使用的任务 ID
+        state: 预检得到的文件状态（complete/partial/missing），为 None 时重新检查磁盘
+        plan: 文件所属的下载计划，提供时先尝试复用作品库中的相同文件，下载完成后立即写入索引
+
+    Returns:
+        (是否成功, 失败原因)
+    """
+    original_path = item.path
+    save_file = item.save_file
+    url = item.url
     if not url:
         log_message("WARNING", f"跳过: 无有效下载链接 - {original_path}")
-        return False, "无有效下载链接", rename_info
+        return False, "无有效下载链接"
+
+    # 未经预检时检查磁盘上的文件状态
+    if state is None:
+        size = get_file_size(save_file) if save_file.exists() else None
+        state = "missing" if size is None else ("complete" if size == item.size else "partial")
 
     # 检查文件是否已完整下载
-    if save_file.exists() and save_file.stat().st_size == file_info['size']:
+    if state == "complete":
         log_message("TASK", f"跳过: 文件已存在且完整 - {original_path}")
-        return True, None, rename_info
+        progress.add_completed(job_id, item.size)
+        return True, None
 
-    # 删除不完整的文件
-    if save_file.exists():
-        save_file.unlink()
+    # 不完整的文件保留已下载部分用于续传；比预期更大的文件说明远程文件已变化，删除后重新下载
+    if state == "partial" and get_file_size(save_file) > item.size:
+        save_file.unlink(missing_ok=True)
 
-    curl_path = utils.get_curl_path()
-    cmd = [curl_path, "-L", "-o", str(save_file), url]
-
-    # 重试下载
-    for attempt in range(max_retries):
-        if download_stop_signal:
-            if delete_partial_signal and save_file.exists():
-                save_file.unlink()
-            return False, "用户停止", rename_info
+    # 跨作品去重：作品库中已有相同文件时直接复用
+    if plan is not None:
+        with tracing.span("dedupe.link", "file", job_id=job_id, path=original_path):
+            linked = link_existing_copy(plan, item)
+        if linked:
+            progress.add_completed(job_id, item.size)
+            return True, None
 
+    curl_path = utils.get_curl_path()
+    error_msg = ""
+
+    # 重试下载（暂停导致的中断不计入重试次数，上游限流与有进展的停滞重连单独计数）
+    attempt = 0
+    throttled = 0
+    restarts = 0
+    while attempt < max_retries:
+        if not wait_while_paused(job_id):
+            return _stopped(save_file)
+        # 等待主机的请求预算（被限流时等待到 Retry-After 之后）
+        with tracing.span("rate_limit.wait", "http", job_id=job_id):
+            acquired = rate_limit.acquire(url, lambda: download_stop_signal or is_paused(job_id))
+        if not acquired:
+            continue
+
+        # 已有部分数据时使用 -C - 断点续传；-D - 将响应头输出到 stdout 以获取状态码，
+        # -f 使错误响应的内容不会写入文件；总超时按剩余字节数计算
+        start_bytes = get_file_size(save_file)
+        max_time = config.TRANSFER_TIMEOUT_BASE + max(item.size - start_bytes, 0) / config.TRANSFER_MIN_RATE
+        cmd = ([curl_path, "-sS", "-L", "-f", "-D", "-", "--connect-timeout", str(config.CONNECT_TIMEOUT),
+                "--max-time", f"{max_time:.0f}"] + (["-C", "-"] if start_bytes else [])
+               + ["-o", str(save_file), url])
+        trace = config.TRACE_ENABLED
+        if trace:
+            cmd[1:1] = ["-w", tracing.CURL_TIMING_FORMAT]
+
+        transfer = progress.begin_transfer(job_id, original_path, item.size, start_bytes)
+        completed = False
         try:
+            spawn_start = time.perf_counter()
             proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=STARTUPINFO)
+            spawned = time.perf_counter()
+            _register_process(proc, job_id)
+            try:
+                # 定时采样磁盘上的真实字节数，直到 curl 退出（退出时再采样一次）；
+                # 停滞时终止 curl，之后断点续传
+                watchdog = StallWatchdog(start_bytes)
+                stalled = None
+                finished = False
+                while not finished:
+                    try:
+                        proc.wait(timeout=config.PROGRESS_SAMPLE_INTERVAL)
+                        finished = True
+                    except subprocess.TimeoutExpired:
+                        pass
+                    size = get_file_size(save_file)
+                    transfer.update(size)
+                    if not finished and stalled is None:
+                        stalled = watchdog.check(size)
+                        if stalled is not None:
+                            proc.terminate()
+            finally:
+                _unregister_process(proc)
+
+            curl_error = proc.stderr.read().decode('utf-8', errors='ignore').strip()
+            status, headers, rest = rate_limit.parse_headers(proc.stdout.read())
+            if trace:
+                tracing.add_span("curl.spawn", "curl", spawn_start, spawned, job_id=job_id, path=original_path)
+                tracing.add_curl_phases(rest, spawned, job_id=job_id, path=original_path, status=status,
+                                        bytes=get_file_size(save_file) - start_bytes)
 
-            # 读取进度输出
-            while True:
-                line = proc.stderr.readline()
-                if not line:
-                    break
-                line_text = line.decode('utf-8', errors='ignore')
-                # 解析 curl 输出的进度百分比
-                percent_match = re.search(r'(\d+\.\d+%)', line_text)
-                if percent_match:
-                    current_percent = float(percent_match.group(1).replace('%', ''))
-                    estimated_downloaded = file_info['size'] * (current_percent / 100)
-                    get_progress()
-                    with progress_lock:
-                        current_progress["current_file_percent"] = f"{current_percent:.2f}%"
-                        current_progress["current_filename"] = original_path
-                    set_progress(
-                        (downloaded_size + estimated_downloaded) / total_selected_size * 100,
-                        f"{current_percent:.2f}%",
-                        original_path,
-                        downloaded_size + estimated_downloaded,
-                        total_selected_size
-                    )
-
-            proc.wait()
             # 验证下载结果
-            if proc.returncode == 0 and save_file.exists() and save_file.stat().st_size == file_info['size']:
+            completed = proc.returncode == 0 and save_file.exists() and save_file.stat().st_size == item.size
+            progress.end_transfer(transfer, completed)
+            if completed:
                 log_message("TASK", f"完成: {original_path}")
-                return True, None, rename_info
-            raise Exception(f"Curl 返回码: {proc.returncode}")
+                if plan is not None:
+                    try:
+                        library_index.record_file(plan, item)
+                    except Exception as e:
+                        log_message("WARNING", f"更新作品库索引失败: {e}")
+                return True, None
+
+            # 被停止或暂停时 curl 已被终止，不视为失败
+            if download_stop_signal:
+                return _stopped(save_file)
+            if is_paused(job_id):
+                log_message("TASK", f"已暂停: {original_path}（保留 {utils.format_size(get_file_size(save_file))}）")
+                continue
+
+            # 上游限流：等待时间由速率控制统一安排，不计入普通重试次数
+            if rate_limit.report(url, status, headers.get("retry-after")) and throttled < config.RATE_LIMIT_RETRIES:
+                throttled += 1
+                continue
+
+            # 传输停滞或超时：有进展时立即重新连接续传（不计入重试次数），没有进展时按失败重试
+            if stalled is None and proc.returncode == CURL_TIMEOUT_ERROR:
+                stalled = "传输超时"
+            if stalled is not None:
+                gained = get_file_size(save_file) - start_bytes
+                if gained > 0 and restarts < config.STALL_MAX_RESTARTS:
+                    restarts += 1
+                    log_message("WARNING", f"传输停滞（{stalled}），重新连接续传 ({restarts}/{config.STALL_MAX_RESTARTS}): "
+                                           f"{original_path}")
+                    continue
+                raise Exception(f"传输停滞: {stalled}")
+
+            # 服务器不支持断点续传时删除已有部分，下次重试从头下载
+            if proc.returncode == CURL_RANGE_ERROR or status == 416:
+                save_file.unlink(missing_ok=True)
+            raise Exception(f"Curl 返回码: {proc.returncode}" + (f" (HTTP {status})" if status and status >= 400 else "")
+                            + (f" ({curl_error})" if curl_error else ""))
 
         except Exception as e:
+            if not completed:
+                progress.end_transfer(transfer, False)
             error_msg = str(e)
-            log_message("WARNING", f"下载失败 (尝试 {attempt + 1}/{max_retries}): {original_path} - {error_msg}")
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
+            attempt += 1
+            log_message("WARNING", f"下载失败 (尝试 {attempt}/{max_retries}): {original_path} - {error_msg}")
+            if attempt < max_retries:
+                interruptible_sleep(retry_delay)
 
     # 清理失败的文件
     if delete_partial_signal and save_file.exists():
         save_file.unlink()
-    return False, f"下载失败: {error_msg}", rename_info
+    return False, f"下载失败: {error_msg}"
+
+
+def _stopped(save_file):
+    """用户停止时的处理：立即停止会删除未完成的文件"""
+    if delete_partial_signal and save_file.exists():
+        save_file.unlink()
+    return False, "用户停止"
 
 
 # ============================================================
@@ -331,15 +1106,25 @@ def download_worker():
     log_message("SYSTEM", f"下载线程已启动，监听端口 {config.PORT}...")
 
     while True:
+        job_id = None
+        profile = None
+        placed_root = None
         try:
             task = task_queue.get()
             if task is None:
                 break
 
-            # 初始化本次任务状态
-            global download_stop_signal, delete_partial_signal, is_downloading
+            # 初始化本次任务状态（先清除停止信号再标记为执行中，之后的取消会停止本任务）
+            global download_stop_signal, delete_partial_signal, is_downloading, current_job_id
             download_stop_signal = False
             delete_partial_signal = False
+            with _tasks_lock:
+                if task.get('job_id') in _cancelled:
+                    _cancelled.discard(task['job_id'])
+                    continue
+                record = _records.get(task.get('job_id'))
+                if record is not None:
+                    record.update(status="running", updated=time.time())
             is_downloading = True
             reset_progress()
 
@@ -348,14 +1133,29 @@ def download_worker():
                 download_stats["pending_finish"] = True
 
             rj_id = task['rj_id']
-            files = task['files']
-            base_path = pathlib.Path(task['save_path'])
-            target_dir = base_path / f"RJ{rj_id.replace('RJ', '')}"
-            target_dir.mkdir(parents=True, exist_ok=True)
-
-            selected_files = files
-            total_selected_size = sum(f['size'] for f in selected_files)
-            total_files_count = len(selected_files)
+            work_name = f"RJ{rj_id.replace('RJ', '')}"
+            # 保存路径为默认下载目录时由存储池选择根目录
+            base_path = storage_pool.resolve_base(task['save_path'], work_name,
+                                                  sum(f['size'] for f in task['files']))
+            target_dir = base_path / work_name
+            placed_root = base_path
+            storage_pool.begin_write(placed_root)
+
+            # 构建下载计划（直接放入队列的任务在此登记，之后的重复提交可合并进来）
+            job_id = current_job_id = task.setdefault('job_id', next(_job_ids))
+            job_started = time.perf_counter()
+            profile = tracing.new_profile()
+            if profile is not None:
+                profile.enable()
+            with _tasks_lock:
+                _tasks.setdefault(job_id, task)
+                record = _records.setdefault(job_id, _new_record(task, "running"))
+                record["save_path"] = str(base_path)
+                plan = _plans[job_id] = build_job_plan(task['files'], target_dir)
+
+            total_selected_size = plan.total_size
+            total_files_count = len(plan.files)
+            progress.start_job(job_id, total_selected_size)
 
             log_message("TASK", f"开始任务: {rj_id}")
             log_message("TASK", f"保存路径: {target_dir}")
@@ -364,68 +1164,124 @@ def download_worker():
             with stats_lock:
                 download_stats["total_files"] = total_files_count
 
-            with progress_lock:
-                current_progress["total_size"] = total_selected_size
+            # 文件系统预检：分类已有文件并检查磁盘空间
+            preflight = preflight_plan(plan)
+            free_text = "未知" if preflight["free_bytes"] is None else utils.format_size(preflight["free_bytes"])
+            log_message("TASK", f"预检: 已完整 {preflight['complete']} / 不完整 {preflight['partial']} / "
+                                f"未下载 {preflight['missing']}，待下载 {utils.format_size(preflight['remaining_bytes'])}，"
+                                f"可用空间 {free_text}")
+            if not preflight["enough_space"]:
+                reason = f"磁盘空间不足: 需要 {utils.format_size(preflight['required_bytes'])}，可用 {free_text}"
+                log_message("ERROR", f"任务已取消: {reason}")
+                is_downloading = False
+                current_job_id = None
+                paused_jobs.discard(job_id)
+                failed_list = [(item.path, reason) for item in plan.files]
+                with stats_lock:
+                    download_stats["failed_files"] = total_files_count
+                    download_stats["failed_list"] = failed_list
+                    download_stats["pending_finish"] = True
+                with _tasks_lock:
+                    _tasks.pop(job_id, None)
+                _finish_record(job_id, failed_list)
+                progress.finish_job(job_id)
+                continue
+
+            create_plan_directories(plan)
 
-            downloaded_size = 0
             success_count = 0
             failed_list = []
             rename_log = []
+            done_paths = set()
 
-            # 遍历下载所有文件
-            for i, file_info in enumerate(selected_files):
-                if download_stop_signal:
-                    log_message("TASK", "任务已停止")
-                    break
+            # 遍历下载所有文件（边下边播请求的文件插到下一个），完成后继续下载执行期间合并进来的文件
+            start = 0
+            while True:
+                pending = deque(range(start, len(plan.files)))
+                taken = set()
+                while pending:
+                    if download_stop_signal:
+                        log_message("TASK", "任务已停止")
+                        break
+                    i = _take_wanted(job_id, plan, taken)
+                    if i is not None:
+                        log_message("TASK", f"优先下载（边下边播）: {plan.files[i].path}")
+                    else:
+                        i = pending.popleft()
+                        if i in taken:
+                            continue
+                    taken.add(i)
+                    item = plan.files[i]
 
-                log_message("TASK", f"[{i + 1}/{total_files_count}] {file_info['path']}")
-
-                success, reason, rename_info = download_single_file(
-                    file_info, target_dir, downloaded_size, total_selected_size
-                )
-
-                if success:
-                    downloaded_size += file_info['size']
-                    success_count += 1
-                    with progress_lock:
-                        current_progress["downloaded_size"] = downloaded_size
-                    set_progress(downloaded_size / total_selected_size * 100, 0, "", downloaded_size,
-                                 total_selected_size)
-                    if rename_info:
-                        rename_log.append(rename_info)
+                    log_message("TASK", f"[{i + 1}/{total_files_count}] {item.path}")
+
+                    _record_file(job_id, item.path, "running")
+                    with tracing.span("file", "file", job_id=job_id, path=item.path):
+                        success, reason = download_single_file(item, job_id, plan=plan,
+                                                               state=preflight["states"].get(item.path))
+
+                    if success:
+                        success_count += 1
+                        done_paths.add(item.path)
+                        if item.rename_info:
+                            rename_log.append(item.rename_info)
+                    else:
+                        failed_list.append((item.path, reason))
+                    _record_file(job_id, item.path, "done" if success else "failed", reason)
+
+                start = len(plan.files)
+                merged = _extend_plan(task, plan)
+                if merged is not None:
+                    added = merged.files[start:]
+                    log_message("TASK", f"合并新提交的文件: {len(added)} 个")
+                    create_plan_directories(merged)
+                    progress.add_total(job_id, sum(item.size for item in added))
+                    total_files_count = len(merged.files)
+                    with stats_lock:
+                        download_stats["total_files"] = total_files_count
+                    with _tasks_lock:
+                        plan = _plans[job_id] = merged
                 else:
-                    failed_list.append((file_info['path'], reason))
+                    break
 
-            # 失败文件自动重试
+            # 失败文件自动重试（按路径索引查找，线性时间）
             if failed_list and not download_stop_signal:
                 log_message("WARNING", f"检测到 {len(failed_list)} 个文件失败，5秒后重试...")
-                time.sleep(5)
+                interruptible_sleep(5)
                 retry_failed = []
-                for item in failed_list[:]:
-                    file_info = next(f for f in selected_files if f['path'] == item[0])
+                for index, (path, _) in enumerate(failed_list):
                     if download_stop_signal:
+                        # 未重试的文件保留原失败原因
+                        retry_failed.extend(failed_list[index:])
                         break
-                    success, reason, rename_info = download_single_file(
-                        file_info, target_dir, downloaded_size, total_selected_size
-                    )
+                    item = plan.by_path[path]
+                    _record_file(job_id, item.path, "running")
+                    with tracing.span("file.retry", "file", job_id=job_id, path=item.path):
+                        success, reason = download_single_file(item, job_id, plan=plan)
+                    _record_file(job_id, item.path, "done" if success else "failed", reason)
                     if success:
-                        downloaded_size += file_info['size']
                         success_count += 1
-                        with progress_lock:
-                            current_progress["downloaded_size"] = downloaded_size
-                        set_progress(downloaded_size / total_selected_size * 100, 0, "", downloaded_size,
-                                     total_selected_size)
-                        failed_list.remove(item)
-                        if rename_info:
-                            rename_log.append(rename_info)
+                        done_paths.add(item.path)
+                        if item.rename_info:
+                            rename_log.append(item.rename_info)
                     else:
-                        retry_failed.append((file_info['path'], reason))
+                        retry_failed.append((item.path, reason))
                 failed_list = retry_failed
 
+            # 生成重命名日志
+            if rename_log:
+                generate_rename_log(target_dir, rj_id, rename_log)
+
+            # 更新作品库索引（在报告任务完成之前，完成后立即检索即可找到本次下载的作品）
+            if done_paths:
+                index_job(rj_id, plan, done_paths)
+
             # 任务完成，更新状态
             is_downloading = False
-            set_progress(100 if downloaded_size == total_selected_size else downloaded_size / total_selected_size * 100,
-                         0, "", downloaded_size, total_selected_size)
+            current_job_id = None
+            paused_jobs.discard(job_id)
+            _finish_record(job_id, failed_list)
+            progress.finish_job(job_id)
 
             with stats_lock:
                 download_stats["success_files"] = success_count
@@ -433,19 +1289,37 @@ def download_worker():
                 download_stats["failed_list"] = failed_list
                 download_stats["pending_finish"] = True
 
-            # 生成重命名日志
-            if rename_log:
-                generate_rename_log(target_dir, rj_id, rename_log)
-
             # 输出最终结果
             if download_stop_signal:
                 log_message("TASK", f"任务已手动停止: 成功 {success_count}/{total_files_count}")
             else:
                 log_message("TASK", f"任务完成: 成功 {success_count}/{total_files_count}, 失败 {len(failed_list)}")
+            with stats_lock:
+                dedupe_files, dedupe_bytes = download_stats["dedupe_files"], download_stats["dedupe_bytes"]
+            if dedupe_files:
+                log_message("TASK", f"复用已有文件 {dedupe_files} 个，节省下载 {utils.format_size(dedupe_bytes)}")
 
         except Exception as e:
             log_message("ERROR", f"工作线程异常: {e}")
             is_downloading = False
+            current_job_id = None
+            if job_id is not None:
+                with _tasks_lock:
+                    _tasks.pop(job_id, None)
+                paused_jobs.discard(job_id)
+                _finish_record(job_id)
+                progress.finish_job(job_id)
+        finally:
+            if placed_root is not None:
+                storage_pool.end_write(placed_root)
+            if job_id is not None:
+                with _tasks_lock:
+                    _plans.pop(job_id, None)
+                    _wanted.pop(job_id, None)
+                tracing.add_span("job", "job", job_started, time.perf_counter(), job_id=job_id, rj_id=rj_id)
+                profile_path = tracing.dump_profile(profile, f"job{job_id}_{rj_id}")
+                if profile_path:
+                    log_message("SYSTEM", f"任务性能分析已保存: {profile_path}")
 
 
 def start_worker_thread():
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+文件选择规则模块
+在服务端按规则筛选 get_file_list 返回的文件列表，例如：
+  - 同一音轨同时提供 WAV / FLAC / MP3 时只保留最优先的格式
+  - 只下载音频和字幕
+规则可以是 config.FORMAT_PRESETS 中的预设名称，也可以是规则字典：
+  {"prefer": ["flac", "mp3", "wav"], "types": ["audio", "subtitle"]}
+"""
+
+import posixpath
+import re
+
+import config
+
+# 文件类别 -> 扩展名
+FILE_TYPES = {
+    "audio": {".wav", ".flac", ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".wma", ".ape", ".alac"},
+    "subtitle": {".lrc", ".srt", ".vtt", ".ass", ".ssa"},
+    "image": {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"},
+    "text": {".txt", ".pdf", ".html", ".htm", ".md"},
+    "video": {".mp4", ".mkv", ".webm", ".mov", ".avi"},
+}
+
+# 文件夹名和文件名中的格式标记，如 "WAV"、"mp3版"、"【FLAC】"、"MP3 (320kbps)"
+_FORMAT_TOKEN = re.compile(
+    r"(?i)(?<![a-z0-9])(?:wav|flac|mp3|m4a|aac|ogg|opus|wma|ape|alac)(?![a-z0-9])"
+    r"\s*(?:版|形式|バージョン|ver\.?|version)?"
+    r"|(?<![0-9])\d+(?:\.\d+)?\s*(?:kbps|bit|khz)(?![a-z])"
+)
+_SEPARATORS = re.compile(r"[\s_\-・･.,()\[\]（）【】「」『』]+")
+
+
+def file_type(path):
+    """返回文件类别（audio/subtitle/image/text/video），无法识别时返回 "other" """
+    ext = posixpath.splitext(path)[1].lower()
+    for name, extensions in FILE_TYPES.items():
+        if ext in extensions:
+            return name
+    return "other"
+
+
+def _normalize(text):
+    """去除格式标记和分隔符，用于判断不同格式的同一音轨"""
+    return _SEPARATORS.sub("", _FORMAT_TOKEN.sub("", text)).lower()
+
+
+def twin_key(path):
+    """同一内容不同格式的文件返回相同的键
+
+    文件夹中的格式标记（如 WAV/、mp3版/）会被忽略，只剩格式标记的文件夹整体跳过。
+    """
+    folder, name = posixpath.split(path)
+    segments = tuple(part for part in (_normalize(seg) for seg in folder.split("/") if seg) if part)
+    return segments, _normalize(posixpath.splitext(name)[0])
+
+
+def resolve_rules(rules):
+    """将预设名称或规则字典转换为规则字典，None 或空字符串表示不筛选
+
+    Raises:
+        ValueError: 预设不存在或规则格式错误
+    """
+    if not rules:
+        return None
+    if isinstance(rules, str):
+        if rules not in config.FORMAT_PRESETS:
+            raise ValueError(f"未知的筛选预设: {rules}")
+        return config.FORMAT_PRESETS[rules]
+    if not isinstance(rules, dict):
+        raise ValueError("筛选规则必须是预设名称或规则字典")
+    return rules
+
+
+def select_files(files, rules):
+    """按规则筛选文件列表（保持原有顺序）
+
+    Args:
+        files: get_file_list 返回的文件列表
+        rules: 预设名称或规则字典
+            types: 保留的文件类别列表，缺省时保留全部
+            prefer: 音频格式优先级（扩展名，不含点），同一音轨只保留排名最靠前的格式，
+                    未列出的格式排在最后
+
+    Returns:
+        (保留的文件列表, 跳过的文件列表)
+    """
+    rules = resolve_rules(rules)
+    if not rules:
+        return list(files), []
+
+    types = set(rules.get("types") or ())
+    prefer = [f".{ext.lower().lstrip('.')}" for ext in rules.get("prefer") or ()]
+    rank = {ext: index for index, ext in enumerate(prefer)}
+
+    candidates = [f for f in files if not types or file_type(f["path"]) in types]
+
+    keep = set(id(f) for f in candidates)
+    if prefer:
+        # 按音轨分组，每组只保留优先级最高的格式（同格式的多个文件全部保留）
+        groups = {}
+        for f in candidates:
+            if file_type(f["path"]) == "audio":
+                groups.setdefault(twin_key(f["path"]), []).append(f)
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+            ranks = [rank.get(posixpath.splitext(f["path"])[1].lower(), len(prefer)) for f in group]
+            best = min(ranks)
+            for f, r in zip(group, ranks):
+                if r != best:
+                    keep.discard(id(f))
+
+    selected = [f for f in files if id(f) in keep]
+    skipped = [f for f in files if id(f) not in keep]
+    return selected, skipped
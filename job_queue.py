@@ -0,0 +1,632 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+任务队列模块
+基于 SQLite 的共享任务队列，供多个下载工作进程（可位于不同主机，共享同一存储卷）
+领取任务和文件。文件以租约方式领取，工作进程通过心跳续约并上报进度；
+租约过期的文件会被其他工作进程重新领取。
+"""
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import orjson
+
+import config
+import utils
+
+_local = threading.local()  # 每个线程独立的数据库连接
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rj_id TEXT NOT NULL,
+    save_path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',      -- queued / running / paused / done / cancelled
+    priority INTEGER NOT NULL DEFAULT 0,
+    total_files INTEGER NOT NULL DEFAULT 0,
+    total_size INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    notified INTEGER NOT NULL DEFAULT 0,        -- 完成结果是否已在 Web 界面展示
+    target_root TEXT                            -- 存储池分配的根目录（首个构建计划的工作进程写入）
+);
+CREATE TABLE IF NOT EXISTS files (
+    job_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    hash TEXT,
+    size INTEGER NOT NULL,
+    info TEXT NOT NULL,                         -- 原始文件信息 (JSON)
+    status TEXT NOT NULL DEFAULT 'pending',     -- pending / running / done / failed
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,        -- 大于 0 时优先领取（边下边播请求的文件）
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS files_status ON files (status, job_id);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE TABLE IF NOT EXISTS throttles (
+    host TEXT PRIMARY KEY,
+    blocked_until REAL NOT NULL                 -- 上游限流暂停截止时间，所有工作进程共同遵守
+);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    job_id INTEGER,
+    current_file TEXT,
+    progress TEXT                               -- 最近一次上报的进度 (JSON)
+);
+"""
+
+
+# 旧版本数据库缺少的列（初始化时补齐）
+MIGRATIONS = (
+    "ALTER TABLE jobs ADD COLUMN target_root TEXT",
+    "ALTER TABLE files ADD COLUMN priority INTEGER NOT NULL DEFAULT 0",
+)
+
+# 任务列表与详情查询的列
+JOB_COLUMNS = "id, rj_id, status, priority, total_files, total_size, created_at, updated_at, finished_at"
+
+
+# ============================================================
+# 数据库连接
+# ============================================================
+
+def connect():
+    """获取当前线程的数据库连接（首次调用时创建）"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        db_path = config.QUEUE_DB
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        _local.conn = conn
+    return conn
+
+
+def init_db():
+    """创建数据表（已存在时忽略）"""
+    conn = connect()
+    conn.executescript(SCHEMA)
+    for statement in MIGRATIONS:
+        try:
+            conn.execute(statement)
+        except sqlite3.OperationalError:
+            pass  # 列已存在
+
+
+class _transaction:
+    """以 BEGIN IMMEDIATE 开启写事务，避免多个进程同时领取同一文件"""
+
+    def __enter__(self):
+        self.conn = connect()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# ============================================================
+# 任务提交与控制（Web 服务调用）
+# ============================================================
+
+def _find_active_job(conn, task):
+    """查找同一作品保存到同一目录、尚未结束的任务，返回任务 ID 或 None"""
+    key = utils.job_key(task['rj_id'], task['save_path'])
+    rows = conn.execute("SELECT id, rj_id, save_path FROM jobs WHERE status IN ('queued', 'running', 'paused') "
+                        "ORDER BY id").fetchall()
+    for row in rows:
+        if utils.job_key(row['rj_id'], row['save_path']) == key:
+            return row['id']
+    return None
+
+
+def _merge_files(conn, job_id, files, now):
+    """将任务中尚未包含的文件追加到已有任务，返回新增文件数"""
+    known = {row['path'] for row in conn.execute("SELECT path FROM files WHERE job_id = ?", (job_id,))}
+    added = [f for f in files if f['path'] not in known]
+    if not added:
+        return 0
+    start = conn.execute("SELECT COALESCE(MAX(idx), -1) + 1 FROM files WHERE job_id = ?", (job_id,)).fetchone()[0]
+    conn.executemany(
+        "INSERT INTO files (job_id, idx, path, hash, size, info) VALUES (?, ?, ?, ?, ?, ?)",
+        [(job_id, start + offset, f['path'], f.get('hash'), f['size'], orjson.dumps(f).decode())
+         for offset, f in enumerate(added)])
+    conn.execute("UPDATE jobs SET total_files = total_files + ?, total_size = total_size + ?, updated_at = ? "
+                 "WHERE id = ?", (len(added), sum(f['size'] for f in added), now, job_id))
+    return len(added)
+
+
+def enqueue_job(task, priority=0):
+    """将下载任务写入队列
+
+    同一作品保存到同一目录的任务尚未结束（排队、执行或暂停中）时不新建任务，
+    只把尚未包含的文件合并到已有任务中，避免重复检查和重复下载。
+
+    Args:
+        task: 与 /api/start 相同格式的任务字典（rj_id、files、save_path）
+        priority: 优先级，数值越大越先执行
+
+    Returns:
+        (任务 ID, 新增文件数, 是否合并到已有任务)
+    """
+    now = time.time()
+    files = task['files']
+    with _transaction() as conn:
+        job_id = _find_active_job(conn, task)
+        if job_id is not None:
+            return job_id, _merge_files(conn, job_id, files, now), True
+        cursor = conn.execute(
+            "INSERT INTO jobs (rj_id, save_path, priority, total_files, total_size, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (task['rj_id'], str(task['save_path']), priority, len(files),
+             sum(f['size'] for f in files), now, now))
+        job_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO files (job_id, idx, path, hash, size, info) VALUES (?, ?, ?, ?, ?, ?)",
+            [(job_id, idx, f['path'], f.get('hash'), f['size'], orjson.dumps(f).decode())
+             for idx, f in enumerate(files)])
+    return job_id, len(files), False
+
+
+def cancel_jobs(job_id=None):
+    """取消指定任务，未指定时取消所有未完成的任务"""
+    now = time.time()
+    with _transaction() as conn:
+        if job_id is None:
+            conn.execute("UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ? "
+                         "WHERE status IN ('queued', 'running', 'paused')", (now, now))
+        else:
+            conn.execute("UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ? "
+                         "WHERE id = ? AND status IN ('queued', 'running', 'paused')", (now, now, job_id))
+
+
+def cancel_job_ids(job_ids):
+    """批量取消任务（同一事务），返回实际取消的任务 ID 列表（已结束的任务不变）"""
+    now = time.time()
+    updated = []
+    with _transaction() as conn:
+        for job_id in job_ids:
+            cursor = conn.execute("UPDATE jobs SET status = 'cancelled', updated_at = ?, finished_at = ? "
+                                  "WHERE id = ? AND status IN ('queued', 'running', 'paused')", (now, now, job_id))
+            if cursor.rowcount:
+                updated.append(job_id)
+    return updated
+
+
+def retry_failed(job_ids):
+    """将任务中失败的文件重新放回队列（重置领取次数），已结束的任务重新排队
+
+    Returns:
+        有失败文件被重新排队的任务 ID 列表
+    """
+    now = time.time()
+    updated = []
+    with _transaction() as conn:
+        for job_id in job_ids:
+            cursor = conn.execute(
+                "UPDATE files SET status = 'pending', attempts = 0, error = NULL, lease_owner = NULL, "
+                "lease_expires = NULL WHERE job_id = ? AND status = 'failed'", (job_id,))
+            if not cursor.rowcount:
+                continue
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN status IN ('done', 'cancelled') THEN 'queued' ELSE status END, "
+                "updated_at = ?, finished_at = NULL, notified = 0 WHERE id = ?", (now, job_id))
+            updated.append(job_id)
+    return updated
+
+
+def set_priority(job_ids, priority):
+    """调整尚未结束的任务的优先级（数值越大越先执行），返回实际调整的任务 ID 列表"""
+    now = time.time()
+    updated = []
+    with _transaction() as conn:
+        for job_id in job_ids:
+            cursor = conn.execute("UPDATE jobs SET priority = ?, updated_at = ? "
+                                  "WHERE id = ? AND status IN ('queued', 'running', 'paused')",
+                                  (priority, now, job_id))
+            if cursor.rowcount:
+                updated.append(job_id)
+    return updated
+
+
+def pause_jobs(job_id=None):
+    """暂停指定任务，未指定时暂停所有未完成的任务
+
+    暂停的任务不再被领取；正在下载其文件的工作进程在下次心跳时中断传输并归还文件（保留已下载部分）。
+    """
+    now = time.time()
+    with _transaction() as conn:
+        if job_id is None:
+            conn.execute("UPDATE jobs SET status = 'paused', updated_at = ? WHERE status IN ('queued', 'running')",
+                         (now,))
+        else:
+            conn.execute("UPDATE jobs SET status = 'paused', updated_at = ? "
+                         "WHERE id = ? AND status IN ('queued', 'running')", (now, job_id))
+
+
+def resume_jobs(job_id=None):
+    """继续指定的暂停任务，未指定时继续所有暂停的任务（已没有待下载文件的任务直接结束）"""
+    now = time.time()
+    resume = ("UPDATE jobs SET status = CASE WHEN EXISTS (SELECT 1 FROM files WHERE files.job_id = jobs.id "
+              "AND files.status IN ('pending', 'running')) THEN 'queued' ELSE 'done' END, "
+              "finished_at = CASE WHEN EXISTS (SELECT 1 FROM files WHERE files.job_id = jobs.id "
+              "AND files.status IN ('pending', 'running')) THEN finished_at ELSE ? END, "
+              "updated_at = ? WHERE status = 'paused'")
+    with _transaction() as conn:
+        if job_id is None:
+            conn.execute(resume, (now, now))
+        else:
+            conn.execute(resume + " AND id = ?", (now, now, job_id))
+
+
+def has_active_jobs():
+    """是否有排队中、执行中或暂停的任务"""
+    row = connect().execute(
+        "SELECT 1 FROM jobs WHERE status IN ('queued', 'running', 'paused') LIMIT 1").fetchone()
+    return row is not None
+
+
+def has_paused_jobs():
+    """是否有暂停的任务"""
+    return connect().execute("SELECT 1 FROM jobs WHERE status = 'paused' LIMIT 1").fetchone() is not None
+
+
+def active_jobs():
+    """返回排队中、执行中或暂停的任务（id、rj_id、save_path、target_root、status、file_count）"""
+    return connect().execute(
+        "SELECT id, rj_id, save_path, target_root, status, "
+        "(SELECT COUNT(*) FROM files WHERE files.job_id = jobs.id) AS file_count FROM jobs "
+        "WHERE status IN ('queued', 'running', 'paused') ORDER BY id").fetchall()
+
+
+def get_job_status(job_id):
+    """返回任务状态，任务不存在时返回 None"""
+    row = connect().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return row['status'] if row else None
+
+
+def prioritize_file(job_id, idx):
+    """请求优先下载尚未领取的文件，下一个空闲的工作进程会先领取它"""
+    with _transaction() as conn:
+        conn.execute("UPDATE files SET priority = 1 WHERE job_id = ? AND idx = ? AND status = 'pending'",
+                     (job_id, idx))
+
+
+# ============================================================
+# 工作进程接口
+# ============================================================
+
+def make_worker_id():
+    """生成工作进程 ID（主机名:进程号）"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def register_worker(worker_id):
+    """登记工作进程"""
+    now = time.time()
+    connect().execute(
+        "INSERT OR REPLACE INTO workers (id, host, pid, started_at, heartbeat) VALUES (?, ?, ?, ?, ?)",
+        (worker_id, socket.gethostname(), os.getpid(), now, now))
+
+
+def unregister_worker(worker_id):
+    """注销工作进程，并释放其持有的文件租约"""
+    with _transaction() as conn:
+        conn.execute("UPDATE files SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+                     "WHERE lease_owner = ? AND status = 'running'", (worker_id,))
+        conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+
+def claim_file(worker_id):
+    """领取下一个待下载的文件
+
+    优先领取请求优先下载的文件，其次是优先级高、提交早的任务中的文件；租约过期的执行中文件视为可领取。
+
+    Returns:
+        文件行（含任务的 rj_id、save_path），无可领取文件时返回 None
+    """
+    now = time.time()
+    with _transaction() as conn:
+        row = conn.execute(
+            "SELECT f.job_id, f.idx, f.path, f.size, f.info, f.attempts, j.rj_id, j.save_path, j.target_root "
+            "FROM files f JOIN jobs j ON j.id = f.job_id "
+            "WHERE j.status IN ('queued', 'running') "
+            "AND (f.status = 'pending' OR (f.status = 'running' AND f.lease_expires < ?)) "
+            "ORDER BY f.priority DESC, j.priority DESC, j.id, f.idx LIMIT 1", (now,)).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE files SET status = 'running', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 "
+            "WHERE job_id = ? AND idx = ?",
+            (worker_id, now + config.LEASE_SECONDS, row['job_id'], row['idx']))
+        conn.execute("UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                     (now, row['job_id']))
+    return row
+
+
+def heartbeat(worker_id, job_id=None, current_file=None, progress=None):
+    """上报心跳与进度，并为持有的文件续约
+
+    Returns:
+        当前任务的状态（任务不存在时为 'cancelled'），未持有任务时返回 None
+    """
+    now = time.time()
+    with _transaction() as conn:
+        conn.execute(
+            "UPDATE workers SET heartbeat = ?, job_id = ?, current_file = ?, progress = ? WHERE id = ?",
+            (now, job_id, current_file, orjson.dumps(progress).decode() if progress else None, worker_id))
+        conn.execute("UPDATE files SET lease_expires = ? WHERE lease_owner = ? AND status = 'running'",
+                     (now + config.LEASE_SECONDS, worker_id))
+        if job_id is None:
+            return None
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return 'cancelled' if row is None else row['status']
+
+
+def release_file(worker_id, job_id, idx):
+    """归还因任务暂停而中断的文件（不计入重试次数）"""
+    with _transaction() as conn:
+        conn.execute(
+            "UPDATE files SET status = 'pending', lease_owner = NULL, lease_expires = NULL, "
+            "attempts = MAX(attempts - 1, 0) WHERE job_id = ? AND idx = ? AND lease_owner = ?",
+            (job_id, idx, worker_id))
+
+
+def finish_file(worker_id, job_id, idx, success, error=None):
+    """记录文件下载结果；失败且未超过重试次数时放回队列
+
+    Returns:
+        该文件完成后任务是否已全部结束
+    """
+    now = time.time()
+    with _transaction() as conn:
+        if success:
+            status = 'done'
+        else:
+            attempts = conn.execute("SELECT attempts FROM files WHERE job_id = ? AND idx = ?",
+                                    (job_id, idx)).fetchone()['attempts']
+            status = 'pending' if attempts < config.MAX_FILE_ATTEMPTS else 'failed'
+        conn.execute(
+            "UPDATE files SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL "
+            "WHERE job_id = ? AND idx = ? AND lease_owner = ?",
+            (status, error, job_id, idx, worker_id))
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+        remaining = conn.execute(
+            "SELECT 1 FROM files WHERE job_id = ? AND status IN ('pending', 'running') LIMIT 1",
+            (job_id,)).fetchone()
+        if remaining is None:
+            # 任务在最后一个文件下载期间被暂停时同样结束（否则继续后没有可领取的文件，任务永远不会完成）
+            cursor = conn.execute("UPDATE jobs SET status = 'done', updated_at = ?, finished_at = ? "
+                                  "WHERE id = ? AND status IN ('queued', 'running', 'paused')", (now, now, job_id))
+            return cursor.rowcount > 0
+    return False
+
+
+def set_throttle(host, blocked_until):
+    """记录主机的限流暂停截止时间（只会延长）"""
+    connect().execute(
+        "INSERT INTO throttles (host, blocked_until) VALUES (?, ?) "
+        "ON CONFLICT(host) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+        (host, blocked_until))
+
+
+def get_throttle(host):
+    """返回主机的限流暂停截止时间，没有记录时返回 0"""
+    row = connect().execute("SELECT blocked_until FROM throttles WHERE host = ?", (host,)).fetchone()
+    return row['blocked_until'] if row else 0.0
+
+
+def set_target_root(job_id, root):
+    """记录任务的存储池根目录；已有记录时保持不变
+
+    Returns:
+        最终使用的根目录（其他工作进程先写入时返回其结果）
+    """
+    with _transaction() as conn:
+        conn.execute("UPDATE jobs SET target_root = ? WHERE id = ? AND target_root IS NULL", (str(root), job_id))
+        return conn.execute("SELECT target_root FROM jobs WHERE id = ?", (job_id,)).fetchone()['target_root']
+
+
+def root_load():
+    """返回各根目录正在执行的任务数 {根目录: 任务数}（用于存储池分配）"""
+    rows = connect().execute("SELECT target_root, COUNT(*) AS count FROM jobs "
+                             "WHERE status = 'running' AND target_root IS NOT NULL GROUP BY target_root")
+    return {row['target_root']: row['count'] for row in rows}
+
+
+def get_job_files(job_id):
+    """按顺序返回任务的全部文件信息（用于构建下载计划）"""
+    rows = connect().execute("SELECT info FROM files WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+    return [orjson.loads(row['info']) for row in rows]
+
+
+def get_job_outcome(job_id):
+    """返回任务中已成功文件的路径集合与失败文件列表"""
+    rows = connect().execute("SELECT path, status, error FROM files WHERE job_id = ?", (job_id,)).fetchall()
+    done = {row['path'] for row in rows if row['status'] == 'done'}
+    failed = [(row['path'], row['error']) for row in rows if row['status'] == 'failed']
+    return done, failed
+
+
+# ============================================================
+# 状态汇总（Web 服务调用）
+# ============================================================
+
+def live_workers():
+    """返回心跳未超时的工作进程列表"""
+    cutoff = time.time() - config.LEASE_SECONDS
+    rows = connect().execute("SELECT * FROM workers WHERE heartbeat >= ? ORDER BY id", (cutoff,)).fetchall()
+    workers = []
+    for row in rows:
+        worker = dict(row)
+        worker['progress'] = orjson.loads(row['progress']) if row['progress'] else None
+        workers.append(worker)
+    return workers
+
+
+def live_worker_count():
+    """返回心跳未超时的工作进程数"""
+    cutoff = time.time() - config.LEASE_SECONDS
+    return connect().execute("SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (cutoff,)).fetchone()[0]
+
+
+def get_progress():
+    """汇总所有执行中任务与工作进程的进度，格式与 downloader.get_progress 一致"""
+    conn = connect()
+    totals = conn.execute(
+        "SELECT COALESCE(SUM(f.size), 0) AS total, "
+        "COALESCE(SUM(CASE WHEN f.status = 'done' THEN f.size ELSE 0 END), 0) AS done "
+        "FROM files f JOIN jobs j ON j.id = f.job_id WHERE j.status IN ('queued', 'running', 'paused')").fetchone()
+
+    speed = 0.0
+    in_flight = 0
+    current = []
+    for worker in live_workers():
+        progress = worker['progress'] or {}
+        speed += progress.get('speed', 0.0)
+        in_flight += progress.get('file_bytes', 0)
+        if worker['current_file']:
+            current.append(worker['current_file'])
+
+    total = totals['total']
+    downloaded = totals['done'] + in_flight
+    remaining = max(total - downloaded, 0)
+    return {
+        "total_percent": round(downloaded / total * 100, 2) if total else 0.0,
+        "current_file_percent": 0.0,
+        "current_filename": " | ".join(current),
+        "speed": round(speed, 2),
+        "file_speed": 0.0,
+        "eta": round(remaining / (speed * 1024), 1) if speed > 0 else None,
+        "file_eta": None,
+        "downloaded_size": downloaded,
+        "total_size": total,
+        "workers": len(current),
+    }
+
+
+def _file_counts(conn, job_ids):
+    """按任务统计已完成、失败的文件数与已完成字节数 {任务 ID: 行}"""
+    if not job_ids:
+        return {}
+    rows = conn.execute(
+        "SELECT job_id, SUM(status = 'done') AS done, SUM(status = 'failed') AS failed, "
+        "SUM(CASE WHEN status = 'done' THEN size ELSE 0 END) AS done_size "
+        f"FROM files WHERE job_id IN ({','.join('?' * len(job_ids))}) GROUP BY job_id", job_ids)
+    return {row['job_id']: row for row in rows}
+
+
+def _job_summary(row, counts):
+    return {
+        "id": row['id'],
+        "rj_id": row['rj_id'],
+        "status": row['status'],
+        "priority": row['priority'],
+        "files": row['total_files'],
+        "done": counts['done'] if counts else 0,
+        "failed": counts['failed'] if counts else 0,
+        "size": row['total_size'],
+        "done_size": counts['done_size'] if counts else 0,
+        "created": round(row['created_at'], 3),
+        "updated": round(row['updated_at'], 3),
+        "finished": round(row['finished_at'], 3) if row['finished_at'] else None,
+    }
+
+
+def list_jobs(statuses=None, rj_id=None, updated_since=None, cursor=None, limit=100):
+    """按任务 ID 倒序分页列出任务
+
+    Args:
+        statuses: 只返回这些状态的任务
+        rj_id: 只返回该作品的任务
+        updated_since: 只返回该时间（time.time()）之后有变化的任务（轮询时传入上次响应的时间）
+        cursor: 上一页返回的游标（上一页最后一个任务的 ID）
+
+    Returns:
+        (任务摘要列表, 下一页游标)，没有下一页时游标为 None
+    """
+    clauses, params = [], []
+    if statuses:
+        clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if rj_id:
+        clauses.append("REPLACE(UPPER(rj_id), 'RJ', '') = ?")
+        params.append(rj_id.upper().replace("RJ", ""))
+    if updated_since is not None:
+        clauses.append("updated_at > ?")
+        params.append(updated_since)
+    if cursor is not None:
+        clauses.append("id < ?")
+        params.append(cursor)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    conn = connect()
+    rows = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs {where}ORDER BY id DESC LIMIT ?",
+                        params + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    counts = _file_counts(conn, [row['id'] for row in rows])
+    return [_job_summary(row, counts.get(row['id'])) for row in rows], (rows[-1]['id'] if more else None)
+
+
+def get_job(job_id, file_status=None):
+    """返回任务详情与每个文件的状态，任务不存在时返回 None
+
+    Args:
+        file_status: 只返回该状态的文件（pending / running / done / failed）
+    """
+    conn = connect()
+    row = conn.execute(f"SELECT {JOB_COLUMNS}, save_path, target_root FROM jobs WHERE id = ?",
+                       (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = _job_summary(row, _file_counts(conn, [job_id]).get(job_id))
+    job["save_path"] = row['target_root'] or row['save_path']
+    query = "SELECT idx, path, size, status, attempts, error FROM files WHERE job_id = ?"
+    params = [job_id]
+    if file_status:
+        query += " AND status = ?"
+        params.append(file_status)
+    job["file_list"] = [dict(file) for file in conn.execute(query + " ORDER BY idx", params)]
+    return job
+
+
+def pop_finished_summary():
+    """返回最近一个已结束但尚未展示的任务结果，并标记为已展示"""
+    with _transaction() as conn:
+        job = conn.execute(
+            "SELECT * FROM jobs WHERE status IN ('done', 'cancelled') AND notified = 0 "
+            "ORDER BY finished_at DESC LIMIT 1").fetchone()
+        if job is None:
+            return None
+        conn.execute("UPDATE jobs SET notified = 1 WHERE status IN ('done', 'cancelled') AND notified = 0")
+        rows = conn.execute("SELECT path, status, error FROM files WHERE job_id = ?", (job['id'],)).fetchall()
+
+    failed = [(row['path'], row['error'] or "未完成") for row in rows if row['status'] != 'done']
+    return {
+        "just_finished": True,
+        "job_id": job['id'],
+        "total": job['total_files'],
+        "success": job['total_files'] - len(failed),
+        "failed": len(failed),
+        "failed_list": failed,
+        "stopped_by_user": job['status'] == 'cancelled',
+    }
@@ -0,0 +1,568 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+本地作品库索引模块
+使用 SQLite 持久化保存下载目录中各作品的元数据（来自 get_work_info）、
+原始与清洗后的文件路径、大小和哈希，并建立 FTS5 全文索引。
+作品以 (下载根目录, RJ 号) 为键，同一作品保存在存储池的多个根目录中时分别记录。
+重新扫描时只处理目录修改时间发生变化的作品；下载计划写入的文件记录（大小、哈希）以计划为准，
+扫描不会覆盖或删除，从磁盘消失的文件标记为缺失，由完整性校验报告。
+扫描发现的作品（未经过下载流程）没有作品信息，扫描后在后台补全标题与社团。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import orjson
+
+import config
+import storage_pool
+from shared import log_message
+
+_local = threading.local()  # 每个线程独立的数据库连接
+_rescan_lock = threading.Lock()  # 防止多个扫描同时进行
+
+SCHEMA_VERSION = 2  # 记录在 PRAGMA user_version 中
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS works (
+    root TEXT NOT NULL,                         -- 下载根目录（作品目录的上级目录，绝对路径）
+    rj_id TEXT NOT NULL,
+    title TEXT,
+    circle TEXT,
+    info TEXT,                                  -- 作品信息原始 JSON
+    info_checked REAL,                          -- 最近一次获取作品信息的时间（失败时用于推迟重试）
+    dir_path TEXT NOT NULL,
+    dir_mtime REAL NOT NULL DEFAULT 0,          -- 作品目录及子目录的最大修改时间
+    file_count INTEGER NOT NULL DEFAULT 0,
+    total_size INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (root, rj_id)
+);
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL,
+    rj_id TEXT NOT NULL,
+    safe_path TEXT NOT NULL,                    -- 磁盘上的相对路径（清洗后）
+    original_path TEXT,                         -- 远程原始路径（含中日文标题）
+    size INTEGER NOT NULL,
+    hash TEXT,
+    sha256 TEXT,                                -- 校验时记录的内容摘要（本地清单）
+    verified_at REAL,                           -- 最近一次校验通过的时间
+    missing INTEGER NOT NULL DEFAULT 0,         -- 扫描时文件已不在磁盘上
+    PRIMARY KEY (root, rj_id, safe_path)
+);
+CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+CREATE TABLE IF NOT EXISTS links (
+    rj_id TEXT NOT NULL,
+    safe_path TEXT NOT NULL,
+    source TEXT NOT NULL,                       -- 被复用的已有文件
+    size INTEGER NOT NULL,
+    hardlink INTEGER NOT NULL,                  -- 1：硬链接（同时节省磁盘），0：本地复制（仅节省流量）
+    created_at REAL NOT NULL
+);
+"""
+
+# 版本 1 数据库可能缺少的列（升级前补齐）
+V1_MIGRATIONS = (
+    "ALTER TABLE files ADD COLUMN sha256 TEXT",
+    "ALTER TABLE files ADD COLUMN verified_at REAL",
+    "ALTER TABLE files ADD COLUMN missing INTEGER NOT NULL DEFAULT 0",
+)
+
+# 版本 1 -> 2：作品与文件改为以 (根目录, RJ 号) 为键，根目录取作品目录的上级目录
+V2_UPGRADE = (
+    "ALTER TABLE works RENAME TO works_v1",
+    "ALTER TABLE files RENAME TO files_v1",
+    "DROP INDEX IF EXISTS files_hash",
+    "DROP TABLE IF EXISTS works_fts",
+) + tuple(statement for statement in SCHEMA.split(";") if statement.strip()) + (
+    "INSERT INTO works (root, rj_id, title, circle, info, dir_path, dir_mtime, file_count, total_size, updated_at) "
+    "SELECT dirname(dir_path), rj_id, title, circle, info, dir_path, dir_mtime, file_count, total_size, updated_at "
+    "FROM works_v1",
+    "INSERT OR IGNORE INTO files (root, rj_id, safe_path, original_path, size, hash, sha256, verified_at, missing) "
+    "SELECT dirname(w.dir_path), f.rj_id, f.safe_path, f.original_path, f.size, f.hash, f.sha256, f.verified_at, "
+    "f.missing FROM files_v1 f JOIN works_v1 w ON w.rj_id = f.rj_id",
+    "DROP TABLE works_v1",
+    "DROP TABLE files_v1",
+)
+
+# trigram 分词支持中日文子串检索（需 SQLite 3.34+），不可用时退回默认分词
+FTS_SCHEMAS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5("
+    "root UNINDEXED, rj_id, title, circle, paths, tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5(root UNINDEXED, rj_id, title, circle, paths)",
+)
+
+
+# ============================================================
+# 数据库连接
+# ============================================================
+
+def connect():
+    """获取当前线程的数据库连接（首次调用时创建并初始化表结构）"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        db_path = config.LIBRARY_DB
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        upgraded = _upgrade(conn)
+        conn.executescript(SCHEMA)
+        for statement in FTS_SCHEMAS:
+            try:
+                conn.execute(statement)
+                break
+            except sqlite3.OperationalError:
+                continue
+        if upgraded:
+            with conn:
+                for row in conn.execute("SELECT root, rj_id FROM works").fetchall():
+                    _refresh_fts(conn, row['root'], row['rj_id'])
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        _local.conn = conn
+    return conn
+
+
+def _upgrade(conn):
+    """升级旧版本数据库的表结构，返回是否需要重建全文索引
+
+    在 IMMEDIATE 事务中检查并升级，多个线程或工作进程同时打开旧数据库时只有一个执行升级。
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return False
+    for statement in V1_MIGRATIONS:
+        try:
+            conn.execute(statement)
+        except sqlite3.OperationalError:
+            pass  # 列已存在，或新建的数据库还没有表
+    conn.create_function("dirname", 1, os.path.dirname, deterministic=True)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(works)")}
+        if not columns or 'root' in columns:
+            conn.rollback()
+            return False  # 新建的数据库，或其他连接已完成升级
+        for statement in V2_UPGRADE:
+            conn.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    log_message("SYSTEM", "作品库索引已升级：作品按 (下载根目录, RJ 号) 分别记录")
+    return True
+
+
+def _root_key(path):
+    """下载根目录在索引中的键（绝对路径）"""
+    return os.path.abspath(str(path))
+
+
+def _plan_keys(plan):
+    """返回下载计划对应的 (根目录, RJ 号, 作品目录)"""
+    root = _root_key(plan.target_dir.parent)
+    rj_id = plan.target_dir.name
+    return root, rj_id, os.path.join(root, rj_id)
+
+
+def _fts_available(conn):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'works_fts'").fetchone()
+    return row is not None
+
+
+def _refresh_fts(conn, root, rj_id):
+    """重建单个作品的全文索引记录"""
+    if not _fts_available(conn):
+        return
+    work = conn.execute("SELECT title, circle FROM works WHERE root = ? AND rj_id = ?", (root, rj_id)).fetchone()
+    conn.execute("DELETE FROM works_fts WHERE root = ? AND rj_id = ?", (root, rj_id))
+    if work is None:
+        return
+    paths = conn.execute("SELECT safe_path, original_path FROM files WHERE root = ? AND rj_id = ?",
+                         (root, rj_id)).fetchall()
+    text = "\n".join(f"{row['original_path'] or ''}\n{row['safe_path']}" for row in paths)
+    conn.execute("INSERT INTO works_fts (root, rj_id, title, circle, paths) VALUES (?, ?, ?, ?, ?)",
+                 (root, rj_id, work['title'] or "", work['circle'] or "", text))
+
+
+# ============================================================
+# 下载完成后记录
+# ============================================================
+
+def record_job(plan, done_paths, info=None):
+    """记录一次下载任务的结果
+
+    Args:
+        plan: downloader.JobPlan 下载计划
+        done_paths: 下载成功（或已存在）的原始路径集合
+        info: get_work_info 返回的作品信息，可为 None
+    """
+    root, rj_id, target = _plan_keys(plan)
+    conn = connect()
+    with conn:
+        rows = []
+        for item in plan.files:
+            if item.path not in done_paths:
+                continue
+            safe_path = os.path.relpath(item.save_file, plan.target_dir).replace(os.sep, "/")
+            rows.append((root, rj_id, safe_path, item.path, item.size, item.hash))
+        conn.executemany(
+            "INSERT OR REPLACE INTO files (root, rj_id, safe_path, original_path, size, hash) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        _upsert_work(conn, root, rj_id, info)
+        _refresh_fts(conn, root, rj_id)
+
+
+def record_file(plan, item):
+    """单个文件下载完成后立即写入索引，使同一任务或并行任务中的重复文件可以复用"""
+    root, rj_id, target = _plan_keys(plan)
+    safe_path = os.path.relpath(item.save_file, plan.target_dir).replace(os.sep, "/")
+    conn = connect()
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO works (root, rj_id, dir_path, updated_at) VALUES (?, ?, ?, ?)",
+                     (root, rj_id, target, time.time()))
+        conn.execute(
+            "INSERT OR REPLACE INTO files (root, rj_id, safe_path, original_path, size, hash) "
+            "VALUES (?, ?, ?, ?, ?, ?)", (root, rj_id, safe_path, item.path, item.size, item.hash))
+
+
+def _upsert_work(conn, root, rj_id, info=None, dir_mtime=None):
+    """更新作品记录，info 为 None 时保留原有元数据"""
+    totals = conn.execute("SELECT COUNT(*) AS count, COALESCE(SUM(size), 0) AS size FROM files "
+                          "WHERE root = ? AND rj_id = ?", (root, rj_id)).fetchone()
+    existing = conn.execute("SELECT * FROM works WHERE root = ? AND rj_id = ?", (root, rj_id)).fetchone()
+    now = time.time()
+    if info:
+        title, circle, info_json = info.get('title'), info.get('name'), orjson.dumps(info).decode()
+        info_checked = now
+    elif existing:
+        title, circle, info_json = existing['title'], existing['circle'], existing['info']
+        info_checked = existing['info_checked']
+    else:
+        title, circle, info_json, info_checked = None, None, None, None
+    if dir_mtime is None:
+        dir_mtime = existing['dir_mtime'] if existing else 0
+    conn.execute(
+        "INSERT OR REPLACE INTO works (root, rj_id, title, circle, info, info_checked, dir_path, dir_mtime, "
+        "file_count, total_size, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (root, rj_id, title, circle, info_json, info_checked, os.path.join(root, rj_id), dir_mtime,
+         totals['count'], totals['size'], now))
+
+
+# ============================================================
+# 跨作品去重
+# ============================================================
+
+def find_copies(digest, size):
+    """查找作品库中可能与摘要对应的文件（远程哈希相同，或校验时记录的 SHA-256 相同）且大小相同的文件
+
+    Args:
+        digest: 小写十六进制内容摘要
+
+    Returns:
+        [(绝对路径, 记录的 SHA-256 或 None)]；远程哈希只是候选条件，调用方需确认内容
+    """
+    rows = connect().execute(
+        "SELECT w.dir_path, f.safe_path, f.sha256 FROM files f JOIN works w ON w.root = f.root AND w.rj_id = f.rj_id "
+        "WHERE (lower(f.hash) = ? OR f.sha256 = ?) AND f.size = ? AND f.missing = 0",
+        (digest, digest, size)).fetchall()
+    return [(os.path.join(row['dir_path'], *row['safe_path'].split("/")), row['sha256']) for row in rows]
+
+
+def record_link(plan, item, source, hardlink):
+    """记录一次复用（用于统计节省的流量与磁盘空间）"""
+    safe_path = os.path.relpath(item.save_file, str(plan.target_dir)).replace(os.sep, "/")
+    conn = connect()
+    with conn:
+        conn.execute("INSERT INTO links (rj_id, safe_path, source, size, hardlink, created_at) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+                     (plan.target_dir.name, safe_path, source, item.size, int(hardlink), time.time()))
+
+
+def stats():
+    """返回作品库规模，以及去重累计复用的文件数、节省的流量与磁盘空间（字节）"""
+    conn = connect()
+    library = conn.execute("SELECT COUNT(*) AS works, COALESCE(SUM(file_count), 0) AS files, "
+                           "COALESCE(SUM(total_size), 0) AS size FROM works").fetchone()
+    links = conn.execute(
+        "SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS bandwidth, "
+        "COALESCE(SUM(CASE WHEN hardlink THEN size ELSE 0 END), 0) AS disk FROM links").fetchone()
+    return {
+        "works": library['works'],
+        "files": library['files'],
+        "total_size": library['size'],
+        "dedupe": {"files": links['files'], "bandwidth_bytes": links['bandwidth'], "disk_bytes": links['disk']},
+    }
+
+
+# ============================================================
+# 完整性校验（library_verify 调用）
+# ============================================================
+
+def verify_targets(rj_ids=None):
+    """返回需要校验的文件记录（含根目录与作品目录），rj_ids 为空时返回全部作品的文件"""
+    sql = ("SELECT f.root, f.rj_id, f.safe_path, f.original_path, f.size, f.hash, f.sha256, w.dir_path "
+           "FROM files f JOIN works w ON w.root = f.root AND w.rj_id = f.rj_id")
+    params = ()
+    if rj_ids:
+        sql += f" WHERE f.rj_id IN ({', '.join('?' * len(rj_ids))})"
+        params = tuple(rj_ids)
+    rows = connect().execute(sql + " ORDER BY f.rj_id, f.root, f.safe_path", params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def record_checksums(rows):
+    """保存校验通过的文件摘要
+
+    Args:
+        rows: (root, rj_id, safe_path, sha256) 列表
+    """
+    now = time.time()
+    conn = connect()
+    with conn:
+        conn.executemany(
+            "UPDATE files SET sha256 = ?, verified_at = ? WHERE root = ? AND rj_id = ? AND safe_path = ?",
+            [(digest, now, root, rj_id, safe_path) for root, rj_id, safe_path, digest in rows])
+
+
+# ============================================================
+# 增量扫描
+# ============================================================
+
+def _scan_work_dir(directory):
+    """扫描作品目录，返回 (目录最大修改时间, {相对路径: 大小})
+
+    只有目录修改时间变化时才需要使用文件列表。
+    """
+    max_mtime = 0.0
+    files = {}
+    pending = [(directory, "")]
+    while pending:
+        current, prefix = pending.pop()
+        try:
+            max_mtime = max(max_mtime, os.stat(current).st_mtime)
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    relative = f"{prefix}{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, relative + "/"))
+                    elif entry.is_file():
+                        files[relative] = entry.stat().st_size
+        except OSError:
+            continue
+    return max_mtime, files
+
+
+def _dir_mtime(directory):
+    """只遍历子目录计算目录树的最大修改时间（不读取文件属性）"""
+    max_mtime = 0.0
+    pending = [directory]
+    while pending:
+        current = pending.pop()
+        try:
+            max_mtime = max(max_mtime, os.stat(current).st_mtime)
+            with os.scandir(current) as entries:
+                pending.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return max_mtime
+
+
+def _merge_disk_files(conn, root, rj_id, disk_files):
+    """将作品目录的扫描结果合并到索引
+
+    下载计划写入的文件（有原始路径）保留计划中的大小和哈希，不在磁盘上时标记为缺失；
+    扫描发现的其他文件以磁盘上的大小为准，大小变化时清除摘要，消失时删除记录。
+
+    Args:
+        disk_files: {相对路径: 大小}
+    """
+    key = (root, rj_id)
+    previous = {row['safe_path']: row for row in
+                conn.execute("SELECT safe_path, original_path, size FROM files WHERE root = ? AND rj_id = ?", key)}
+    for path, row in previous.items():
+        planned = row['original_path'] is not None
+        if path in disk_files:
+            if planned or row['size'] == disk_files[path]:
+                conn.execute("UPDATE files SET missing = 0 WHERE root = ? AND rj_id = ? AND safe_path = ?",
+                             key + (path,))
+            else:
+                conn.execute("UPDATE files SET size = ?, hash = NULL, sha256 = NULL, verified_at = NULL, missing = 0 "
+                             "WHERE root = ? AND rj_id = ? AND safe_path = ?", (disk_files[path],) + key + (path,))
+        elif planned:
+            conn.execute("UPDATE files SET missing = 1 WHERE root = ? AND rj_id = ? AND safe_path = ?", key + (path,))
+        else:
+            conn.execute("DELETE FROM files WHERE root = ? AND rj_id = ? AND safe_path = ?", key + (path,))
+    conn.executemany("INSERT INTO files (root, rj_id, safe_path, size) VALUES (?, ?, ?, ?)",
+                     [key + (path, size) for path, size in disk_files.items() if path not in previous])
+
+
+def rescan(root=None):
+    """增量扫描下载目录（默认为存储池的全部根目录），更新作品库索引
+
+    目录已不存在的作品：有下载计划记录时保留并将文件全部标记为缺失，否则移除。
+
+    Returns:
+        {"scanned": 扫描的作品数, "updated": 更新的作品数, "removed": 移除的作品数, "seconds": 耗时}
+    """
+    scan_roots = [root] if root else storage_pool.library_roots()
+    began = time.perf_counter()
+    with _rescan_lock:
+        conn = connect()
+        known = {(row['root'], row['rj_id']): row
+                 for row in conn.execute("SELECT root, rj_id, dir_path, dir_mtime FROM works")}
+        seen = set()
+        updated = 0
+
+        entries = []
+        for scan_root in scan_roots:
+            key_root = _root_key(scan_root)
+            try:
+                entries.extend((key_root, entry) for entry in os.scandir(key_root)
+                               if entry.is_dir() and entry.name.upper().startswith("RJ"))
+            except OSError:
+                continue
+
+        for key_root, entry in entries:
+            key = (key_root, entry.name)
+            if key in seen:
+                continue  # 同一根目录在配置中重复出现
+            seen.add(key)
+            mtime = _dir_mtime(entry.path)
+            if key in known and known[key]['dir_mtime'] == mtime:
+                continue
+
+            _, disk_files = _scan_work_dir(entry.path)
+            with conn:
+                _merge_disk_files(conn, key_root, entry.name, disk_files)
+                _upsert_work(conn, key_root, entry.name, dir_mtime=mtime)
+                _refresh_fts(conn, key_root, entry.name)
+            updated += 1
+
+        # 只处理目录已不存在的作品（下载到其他保存路径的作品不在本次扫描范围内）
+        vanished = [key for key, row in known.items() if key not in seen and not os.path.isdir(row['dir_path'])]
+        removed = []
+        with conn:
+            for key in vanished:
+                conn.execute("DELETE FROM files WHERE root = ? AND rj_id = ? AND original_path IS NULL", key)
+                if conn.execute("UPDATE files SET missing = 1 WHERE root = ? AND rj_id = ?", key).rowcount:
+                    # 目录修改时间记为 0，目录重新出现时会被重新扫描
+                    _upsert_work(conn, *key, dir_mtime=0)
+                    continue
+                conn.execute("DELETE FROM works WHERE root = ? AND rj_id = ?", key)
+                _refresh_fts(conn, *key)
+                removed.append(key)
+
+    return {"scanned": len(seen), "updated": updated, "removed": len(removed),
+            "seconds": round(time.perf_counter() - began, 3)}
+
+
+def backfill_info(limit=None):
+    """为没有标题的作品（扫描发现、未经过下载流程）补全标题与社团
+
+    其他根目录中已有同一作品的信息时直接复制，否则请求作品信息接口；
+    获取失败的作品在 LIBRARY_INFO_RETRY 秒后才会重试，同一作品在多个根目录中时一起更新。
+
+    Returns:
+        补全的作品数
+    """
+    import downloader  # 延迟导入：downloader 导入了本模块
+    limit = limit or config.LIBRARY_INFO_BATCH
+    conn = connect()
+    filled = 0
+    with conn:
+        copies = conn.execute("SELECT root, rj_id FROM works w WHERE title IS NULL AND EXISTS "
+                              "(SELECT 1 FROM works k WHERE k.rj_id = w.rj_id AND k.title IS NOT NULL)").fetchall()
+        for row in copies:
+            conn.execute("UPDATE works SET (title, circle, info, info_checked) = (SELECT title, circle, info, "
+                         "info_checked FROM works WHERE rj_id = ? AND title IS NOT NULL LIMIT 1) "
+                         "WHERE root = ? AND rj_id = ?", (row['rj_id'], row['root'], row['rj_id']))
+            _refresh_fts(conn, row['root'], row['rj_id'])
+            filled += 1
+
+    rj_ids = [row['rj_id'] for row in conn.execute(
+        "SELECT DISTINCT rj_id FROM works WHERE title IS NULL AND (info_checked IS NULL OR info_checked < ?) "
+        "ORDER BY rj_id LIMIT ?", (time.time() - config.LIBRARY_INFO_RETRY, limit))]
+    for rj_id in rj_ids:
+        try:
+            info = downloader.get_work_info(rj_id)
+        except Exception:
+            info = None
+        if not isinstance(info, dict) or not info.get('title'):
+            with conn:
+                conn.execute("UPDATE works SET info_checked = ? WHERE rj_id = ? AND title IS NULL", (time.time(), rj_id))
+            continue
+        with conn:
+            roots = [row['root'] for row in conn.execute("SELECT root FROM works WHERE rj_id = ? AND title IS NULL",
+                                                         (rj_id,))]
+            conn.execute("UPDATE works SET title = ?, circle = ?, info = ?, info_checked = ? "
+                         "WHERE rj_id = ? AND title IS NULL",
+                         (info.get('title'), info.get('name'), orjson.dumps(info).decode(), time.time(), rj_id))
+            for root in roots:
+                _refresh_fts(conn, root, rj_id)
+        filled += 1
+    return filled
+
+
+def rescan_and_log():
+    """增量扫描并输出结果日志，随后补全缺少的作品信息（供后台线程调用）"""
+    try:
+        result = rescan()
+        log_message("SYSTEM", f"作品库索引已更新: 扫描 {result['scanned']} 个作品，更新 {result['updated']}，"
+                              f"移除 {result['removed']}，耗时 {result['seconds']} 秒")
+        filled = backfill_info()
+        if filled:
+            log_message("SYSTEM", f"作品库已补全 {filled} 个作品的标题与社团")
+    except Exception as e:
+        log_message("WARNING", f"作品库索引扫描失败: {e}")
+
+
+# ============================================================
+# 检索
+# ============================================================
+
+def _fts_query(text):
+    """将用户输入转换为 FTS5 查询（每个词按短语匹配，全部命中）"""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " AND ".join(f'"{term}"' for term in terms)
+
+
+def search(text, limit=None):
+    """按 RJ 号、标题、社团和文件路径（含原始中日文标题）检索作品"""
+    text = (text or "").strip()
+    limit = limit or config.LIBRARY_SEARCH_LIMIT
+    conn = connect()
+    columns = "w.rj_id, w.root, w.title, w.circle, w.file_count, w.total_size, w.dir_path"
+    if not text:
+        rows = conn.execute(f"SELECT {columns} FROM works w ORDER BY w.updated_at DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    # trigram 分词无法匹配少于 3 个字符的词，此时退回 LIKE 查询
+    if _fts_available(conn) and all(len(term) >= 3 for term in text.split()):
+        try:
+            rows = conn.execute(
+                f"SELECT {columns} FROM works_fts JOIN works w "
+                f"ON w.root = works_fts.root AND w.rj_id = works_fts.rj_id "
+                f"WHERE works_fts MATCH ? ORDER BY rank LIMIT ?", (_fts_query(text), limit))
+            return [dict(row) for row in rows]
+        except sqlite3.OperationalError:
+            pass
+
+    # 与全文索引相同：每个词分别匹配作品信息或任一文件路径，全部命中
+    clauses, params = [], []
+    for term in text.split():
+        pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clauses.append(
+            "(w.rj_id LIKE ? ESCAPE '\\' OR w.title LIKE ? ESCAPE '\\' OR w.circle LIKE ? ESCAPE '\\' "
+            "OR EXISTS (SELECT 1 FROM files f WHERE f.root = w.root AND f.rj_id = w.rj_id "
+            "AND (f.original_path LIKE ? ESCAPE '\\' OR f.safe_path LIKE ? ESCAPE '\\')))")
+        params.extend([pattern] * 5)
+    rows = conn.execute(f"SELECT {columns} FROM works w WHERE {' AND '.join(clauses)} "
+                        f"ORDER BY w.updated_at DESC LIMIT ?", params + [limit])
+    return [dict(row) for row in rows]
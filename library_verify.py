@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+作品库完整性校验模块
+对作品库索引中的每个文件计算摘要，与以下来源之一比对，找出缺失、截断或内容损坏的文件：
+  1. 外部清单文件（sha256sum / md5sum 格式，或 {相对路径: 摘要} 的 JSON）
+  2. 远程文件哈希（仅当其本身是十六进制摘要时）
+  3. 上次校验时记录在作品库中的 SHA-256（首次校验时记录，之后用于发现静默损坏）
+文件通过 mmap 读取，多个线程并行计算哈希（hashlib 计算时释放 GIL）；
+读取受 VERIFY_IO_CONCURRENCY 限制，避免大量随机读拖慢机械硬盘。
+
+命令行用法:
+    python library_verify.py [--rj RJ01234567 ...] [--manifest SHA256SUMS] [--output report.json]
+"""
+
+import argparse
+import hashlib
+import itertools
+import mmap
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import orjson
+
+import config
+import library_index
+import storage_pool
+import tracing
+import utils
+from shared import log_message
+
+# 十六进制摘要长度 -> 算法
+DIGEST_ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256", 128: "sha512"}
+_HEX_DIGITS = set("0123456789abcdef")
+
+# 需要重新下载的结果
+PROBLEM_STATUSES = ("missing", "size_mismatch", "checksum_mismatch", "error")
+
+PENDING_PER_WORKER = 4  # 每个哈希线程最多排队的文件数（按批提交，避免一次性为所有文件创建任务）
+
+_status_lock = threading.Lock()
+_status = {"running": False}  # 最近一次校验的进度与结果
+
+
+# ============================================================
+# 清单
+# ============================================================
+
+def digest_algorithm(value):
+    """值为十六进制摘要时返回对应算法，否则返回 None"""
+    value = (value or "").strip().lower()
+    if len(value) in DIGEST_ALGORITHMS and set(value) <= _HEX_DIGITS:
+        return DIGEST_ALGORITHMS[len(value)]
+    return None
+
+
+def _manifest_key(path):
+    path = path.replace("\\", "/").lstrip("*")
+    return path[2:] if path.startswith("./") else path
+
+
+def resolve_manifest(path):
+    """检查 Web 接口传入的清单路径：只允许日志目录与下载根目录中的文件（相对路径相对于日志目录）
+
+    Returns:
+        解析后的绝对路径
+
+    Raises:
+        ValueError: 路径不在允许的目录中或文件不存在
+    """
+    resolved = os.path.realpath(os.path.join(config.LOG_DIR, path))
+    allowed = [os.path.realpath(directory) for directory in [config.LOG_DIR] + storage_pool.library_roots()]
+    if not any(os.path.commonpath([resolved, directory]) == directory for directory in allowed):
+        raise ValueError("清单文件必须位于日志目录或下载目录中")
+    if not os.path.isfile(resolved):
+        raise ValueError(f"清单文件不存在: {path}")
+    return resolved
+
+
+def load_manifest(path):
+    """读取清单文件，返回 {相对下载目录的路径: 摘要}
+
+    支持 sha256sum / md5sum 输出格式（"摘要  RJ01234567/MP3/01.mp3"）和同样键值的 JSON 文件。
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if str(path).lower().endswith(".json"):
+        return {_manifest_key(key): value.lower() for key, value in orjson.loads(data).items()}
+    manifest = {}
+    for line in data.decode("utf-8-sig").splitlines():
+        digest, _, name = line.strip().partition(" ")
+        if digest and name and digest_algorithm(digest):
+            manifest[_manifest_key(name.strip())] = digest.lower()
+    return manifest
+
+
+def _expected_digest(row, manifest):
+    """返回 (算法, 期望摘要, 来源)，没有可比对的摘要时返回 None"""
+    if manifest:
+        digest = manifest.get(f"{os.path.basename(row['dir_path'])}/{row['safe_path']}")
+        if digest and digest_algorithm(digest):
+            return digest_algorithm(digest), digest, "manifest"
+    algorithm = digest_algorithm(row['hash'])
+    if algorithm:
+        return algorithm, row['hash'].strip().lower(), "remote"
+    if row['sha256']:
+        return "sha256", row['sha256'], "library"
+    return None
+
+
+# ============================================================
+# 哈希计算
+# ============================================================
+
+def hash_file(path, algorithms, io_limit, on_bytes=None):
+    """通过 mmap 分块读取文件并同时计算多个摘要
+
+    Args:
+        algorithms: 算法名称集合
+        io_limit: 限制同时读取的信号量（只在复制数据块时持有，哈希计算不占用）
+        on_bytes: 每处理一个数据块后以字节数调用
+
+    Returns:
+        {算法: 十六进制摘要}
+    """
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    chunk_size = config.VERIFY_CHUNK_SIZE
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                for offset in range(0, size, chunk_size):
+                    with io_limit:
+                        chunk = mm[offset:offset + chunk_size]
+                    for hasher in hashers.values():
+                        hasher.update(chunk)
+                    if on_bytes:
+                        on_bytes(len(chunk))
+    return {name: hasher.hexdigest() for name, hasher in hashers.items()}
+
+
+def _add_checked_bytes(count):
+    with _status_lock:
+        _status["checked_bytes"] += count
+
+
+def _skip_bytes(count):
+    """未读取内容的文件不计入待校验字节数（进度与预计剩余时间只按实际读取的字节计算）"""
+    with _status_lock:
+        _status["total_bytes"] -= count
+
+
+def _check_file(row, manifest, io_limit):
+    """校验单个文件，返回结果字典（status 为 ok / recorded / missing / size_mismatch / checksum_mismatch / error）"""
+    path = os.path.join(row['dir_path'], *row['safe_path'].split("/"))
+    result = {"root": row['root'], "rj_id": row['rj_id'], "path": row['original_path'] or row['safe_path'],
+              "safe_path": row['safe_path'], "status": "ok", "detail": None, "sha256": None}
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        result.update(status="missing", detail="文件不存在")
+        _skip_bytes(row['size'])
+        return result
+    except OSError as e:
+        result.update(status="error", detail=str(e))
+        _skip_bytes(row['size'])
+        return result
+
+    if size != row['size']:
+        result.update(status="size_mismatch", detail=f"大小不符: {size} / 应为 {row['size']}")
+        _skip_bytes(row['size'])
+        return result
+
+    expected = _expected_digest(row, manifest)
+    algorithms = {"sha256"} | ({expected[0]} if expected else set())
+    try:
+        with tracing.span("verify.hash", "verify", rj_id=row['rj_id'], path=row['safe_path'], size=size):
+            digests = hash_file(path, algorithms, io_limit, _add_checked_bytes)
+    except OSError as e:
+        result.update(status="error", detail=str(e))
+        return result
+
+    result["sha256"] = digests["sha256"]
+    if expected is None:
+        result["status"] = "recorded"
+    elif digests[expected[0]] != expected[1]:
+        result.update(status="checksum_mismatch",
+                      detail=f"{expected[0]} 不符（{expected[2]}）: {digests[expected[0]]} / 应为 {expected[1]}")
+    return result
+
+
+# ============================================================
+# 校验任务
+# ============================================================
+
+def verify_library(rj_ids=None, manifest=None, workers=None, io_concurrency=None):
+    """校验作品库中的文件（阻塞执行，进度可通过 get_status 查询）
+
+    Args:
+        rj_ids: 只校验指定作品，为空时校验全部
+        manifest: load_manifest 返回的清单，可为 None
+        workers: 哈希线程数，默认 config.VERIFY_WORKERS
+        io_concurrency: 同时读取的文件数上限，默认 config.VERIFY_IO_CONCURRENCY
+
+    Returns:
+        校验报告：summary 为各状态计数与吞吐量，redownload 为需要重新下载的文件列表
+    """
+    rows = library_index.verify_targets(rj_ids)
+    io_limit = threading.BoundedSemaphore(io_concurrency or config.VERIFY_IO_CONCURRENCY)
+    began = time.time()
+    with _status_lock:
+        _status.clear()
+        _status.update({
+            "running": True, "started_at": began, "finished_at": None,
+            "total_files": len(rows), "total_bytes": sum(row['size'] for row in rows),
+            "checked_files": 0, "checked_bytes": 0, "problems": 0, "report": None,
+        })
+
+    counts = dict.fromkeys(("ok", "recorded") + PROBLEM_STATUSES, 0)
+    redownload = []
+    checksums = []
+    workers = workers or config.VERIFY_WORKERS
+    window = workers * PENDING_PER_WORKER
+    remaining = iter(rows)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            # 保持最多 window 个文件在排队或校验中，完成一个补充一个
+            for row in itertools.islice(remaining, window - len(pending)):
+                pending.add(pool.submit(_check_file, row, manifest, io_limit))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                counts[result['status']] += 1
+                if result['status'] in PROBLEM_STATUSES:
+                    redownload.append({key: result[key]
+                                       for key in ("root", "rj_id", "path", "safe_path", "status", "detail")})
+                elif result['sha256']:
+                    checksums.append((result['root'], result['rj_id'], result['safe_path'], result['sha256']))
+            with _status_lock:
+                _status["checked_files"] += len(done)
+                _status["problems"] = len(redownload)
+            # 分批写入摘要，校验中途中断时已完成的部分不必重算
+            if len(checksums) >= 500:
+                library_index.record_checksums(checksums)
+                checksums.clear()
+    if checksums:
+        library_index.record_checksums(checksums)
+    redownload.sort(key=lambda item: (item['rj_id'], item['root'], item['safe_path']))
+
+    seconds = time.time() - began
+    with _status_lock:
+        checked_bytes = _status["checked_bytes"]
+    report = {
+        "summary": {**counts, "files": len(rows), "bytes": checked_bytes, "seconds": round(seconds, 1),
+                    "throughput": round(checked_bytes / seconds) if seconds > 0 else 0},
+        "redownload": redownload,
+    }
+    with _status_lock:
+        _status.update(running=False, finished_at=time.time(), report=report)
+    return report
+
+
+def _run(rj_ids, manifest_path, rescan):
+    try:
+        if rescan:
+            library_index.rescan()
+        manifest = load_manifest(manifest_path) if manifest_path else None
+        report = verify_library(rj_ids, manifest)
+        summary = report["summary"]
+        log_message("SYSTEM", f"作品库校验完成: {summary['files']} 个文件，需重新下载 {len(report['redownload'])} 个，"
+                              f"{utils.format_size(summary['bytes'])} / {summary['seconds']} 秒"
+                              f"（{utils.format_size(summary['throughput'])}/s）")
+    except Exception as e:
+        log_message("ERROR", f"作品库校验失败: {e}")
+        with _status_lock:
+            _status.update(running=False, finished_at=time.time(), error=str(e))
+
+
+def start_verify(rj_ids=None, manifest_path=None, rescan=True):
+    """在后台线程中开始校验，已有校验在进行时返回 None
+
+    Returns:
+        后台线程
+    """
+    with _status_lock:
+        if _status.get("running"):
+            return None
+        _status.clear()
+        _status.update(running=True, started_at=time.time(), total_files=0, total_bytes=0,
+                       checked_files=0, checked_bytes=0, problems=0, report=None)
+    thread = threading.Thread(target=_run, args=(rj_ids, manifest_path, rescan), daemon=True)
+    thread.start()
+    return thread
+
+
+def get_status():
+    """返回校验进度（含吞吐量和预计剩余时间），校验结束后包含 report"""
+    with _status_lock:
+        status = dict(_status)
+    started = status.get("started_at")
+    if started:
+        elapsed = (status.get("finished_at") or time.time()) - started
+        checked = status.get("checked_bytes", 0)
+        status["throughput"] = round(checked / elapsed) if elapsed > 0 else 0
+        remaining = status.get("total_bytes", 0) - checked
+        status["eta"] = round(remaining / status["throughput"], 1) if status["running"] and status["throughput"] else None
+    return status
+
+
+# ============================================================
+# 命令行入口
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="ASMRip 作品库完整性校验")
+    parser.add_argument("--rj", nargs="*", default=None, help="只校验指定作品（如 RJ01234567）")
+    parser.add_argument("--manifest", default=None, help="清单文件（sha256sum / md5sum 格式或 JSON）")
+    parser.add_argument("--output", default=None, help="将校验报告写入 JSON 文件")
+    parser.add_argument("--no-rescan", action="store_true", help="校验前不增量扫描下载目录")
+    parser.add_argument("--workers", type=int, default=None, help="哈希线程数（默认 config.VERIFY_WORKERS）")
+    parser.add_argument("--io", type=int, default=None, help="同时读取的文件数（默认 config.VERIFY_IO_CONCURRENCY）")
+    args = parser.parse_args()
+
+    if args.workers:
+        config.VERIFY_WORKERS = args.workers
+    if args.io:
+        config.VERIFY_IO_CONCURRENCY = args.io
+    thread = start_verify(args.rj, args.manifest, rescan=not args.no_rescan)
+    try:
+        while thread.is_alive():
+            thread.join(2)
+            status = get_status()
+            if status.get("total_bytes"):
+                percent = status["checked_bytes"] / status["total_bytes"] * 100
+                print(f"\r{status['checked_files']}/{status['total_files']} 个文件  {percent:6.2f}%  "
+                      f"{utils.format_size(status['throughput'])}/s  问题 {status['problems']}",
+                      end="", file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        return 130
+    print(file=sys.stderr)
+
+    status = get_status()
+    if status.get("error"):
+        print(f"校验失败: {status['error']}", file=sys.stderr)
+        return 1
+    report = status["report"]
+    for item in report["redownload"]:
+        print(f"{item['rj_id']}\t{item['status']}\t{item['path']}")
+    summary = report["summary"]
+    print(f"共 {summary['files']} 个文件，正常 {summary['ok']}，首次记录 {summary['recorded']}，"
+          f"需重新下载 {len(report['redownload'])}；{utils.format_size(summary['bytes'])} / {summary['seconds']} 秒",
+          file=sys.stderr)
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    return 1 if report["redownload"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
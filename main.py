@@ -8,6 +8,7 @@ import threading
 import webbrowser
 import logging
 import os
+import multiprocessing
 from datetime import datetime
 from pathlib import Path
 import queue
@@ -15,6 +16,9 @@ import queue
 import config
 import downloader
 import web_server
+import job_queue
+import library_index
+import worker
 import system_tray
 import console_window
 from shared import set_console_window, LOG_MESSAGES, log_message, save_log as shared_save_log
@@ -100,9 +104,15 @@ def main():
         config.DEFAULT_DOWNLOAD_DIR.mkdir(parents=True)
         log_message("SYSTEM", f"创建下载目录: {config.DEFAULT_DOWNLOAD_DIR}")
 
-    # 启动后台下载线程
-    downloader.start_worker_thread()
-    log_message("SYSTEM", "[System] 下载线程已启动")
+    # 启动后台下载线程（pool 模式下改为启动共享队列工作进程）
+    if config.WORKER_MODE == "pool":
+        start_pool_workers()
+    else:
+        downloader.start_worker_thread()
+        log_message("SYSTEM", "[System] 下载线程已启动")
+
+    # 后台增量扫描下载目录，更新作品库索引
+    threading.Thread(target=library_index.rescan_and_log, daemon=True).start()
 
     # 启动 Web 服务器
     server_thread = threading.Thread(target=web_server.run_flask, daemon=True)
@@ -129,10 +139,24 @@ def main():
     finally:
         save_log("自动")                  # 保存普通日志
         shared_save_log("自动", detailed=True)  # 保存详细日志
+        stop_pool_workers()
         log_message("SYSTEM", "程序已退出")
         os._exit(0)
 
 
+def start_pool_workers():
+    """初始化共享队列并在本机启动工作进程"""
+    job_queue.init_db()
+    worker.start_local_workers(config.POOL_LOCAL_WORKERS, str(config.QUEUE_DB))
+    log_message("SYSTEM", f"[System] 已启动 {config.POOL_LOCAL_WORKERS} 个工作进程，队列: {config.QUEUE_DB}")
+
+
+def stop_pool_workers():
+    """退出前结束本机工作进程（非 pool 模式下没有工作进程）"""
+    if worker.stop_local_workers():
+        log_message("SYSTEM", "[System] 工作进程已结束")
+
+
 def open_browser_delayed():
     """延迟 1.5 秒后自动打开浏览器"""
     time.sleep(1.5)
@@ -145,4 +169,5 @@ def open_browser_delayed():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包后支持启动工作进程
     main()
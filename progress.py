@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+下载进度登记模块
+每个进行中的文件传输对应一个 Transfer 记录，每个任务对应一个 JobProgress 记录（均使用 __slots__）。
+传输记录只由执行该传输的线程写入，采样更新时不加锁；只有登记、注销记录和生成快照时使用一把锁。
+snapshot() 按任务和全局汇总所有记录，支持多个任务、多个文件并行传输。
+"""
+
+import threading
+import time
+
+import config
+
+_jobs = {}  # 任务 ID -> JobProgress
+_lock = threading.Lock()  # 保护 _jobs 与各任务的传输列表（不保护采样更新）
+
+
+class Transfer:
+    """单个文件传输的进度记录（网速为基于真实字节数的指数加权移动平均）"""
+
+    __slots__ = ("job_id", "filename", "size", "bytes", "rate", "alpha", "last_time", "last_bytes", "samples")
+
+    def __init__(self, job_id, filename, size, start_bytes=0):
+        self.job_id = job_id
+        self.filename = filename
+        self.size = size
+        self.bytes = start_bytes  # 已写入磁盘的字节数
+        self.rate = 0.0  # 字节/秒
+        self.alpha = config.SPEED_EWMA_ALPHA
+        self.last_time = time.monotonic()
+        self.last_bytes = start_bytes
+        self.samples = 0
+
+    def update(self, total_bytes, now=None):
+        """记录一次累计字节数采样，返回平滑后的速度（字节/秒）"""
+        now = time.monotonic() if now is None else now
+        delta_time = now - self.last_time
+        self.bytes = total_bytes
+        if delta_time <= 0:
+            return self.rate
+        instant = max(total_bytes - self.last_bytes, 0) / delta_time
+        # 首个采样直接作为初值，之后按 alpha 平滑
+        self.rate = instant if self.samples == 0 else self.alpha * instant + (1 - self.alpha) * self.rate
+        self.samples += 1
+        self.last_bytes = total_bytes
+        self.last_time = now
+        return self.rate
+
+    def eta(self):
+        """按当前速度估算剩余时间（秒），速度未知时返回 None"""
+        return _eta(self.size - self.bytes, self.rate)
+
+
+class JobProgress:
+    """单个任务的进度记录"""
+
+    __slots__ = ("job_id", "total_size", "completed", "transfers", "finished")
+
+    def __init__(self, job_id, total_size=0):
+        self.job_id = job_id
+        self.total_size = total_size  # 任务总字节数
+        self.completed = 0  # 已完成文件的字节数（含跳过、复用的文件）
+        self.transfers = []  # 进行中的传输
+        self.finished = False
+
+
+def _eta(remaining_bytes, rate):
+    if remaining_bytes <= 0:
+        return 0.0
+    if rate <= 0:
+        return None
+    return remaining_bytes / rate
+
+
+# ============================================================
+# 登记与注销
+# ============================================================
+
+def start_job(job_id, total_size):
+    """登记一个任务（同时清理已结束的任务记录）"""
+    with _lock:
+        for key in [key for key, job in _jobs.items() if job.finished]:
+            del _jobs[key]
+        job = _jobs[job_id] = JobProgress(job_id, total_size)
+    return job
+
+
+def finish_job(job_id):
+    """标记任务结束，记录保留到下一个任务开始（供界面显示最终进度）"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.finished = True
+            job.transfers.clear()
+
+
+def add_total(job_id, size):
+    """任务合并了新文件时增加任务总字节数"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.total_size += size
+
+
+def add_completed(job_id, size):
+    """记录无需传输即已完成的文件（已存在或复用）"""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.completed += size
+
+
+def begin_transfer(job_id, filename, size, start_bytes=0):
+    """登记一个文件传输，任务未登记时以该文件大小自动登记
+
+    Args:
+        start_bytes: 断点续传时已有的字节数（不计入网速）
+    """
+    transfer = Transfer(job_id, filename, size, start_bytes)
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            job = _jobs[job_id] = JobProgress(job_id, size)
+        job.transfers.append(transfer)
+    return transfer
+
+
+def end_transfer(transfer, completed):
+    """注销文件传输；completed 为 True 时将文件大小计入任务已完成字节数"""
+    with _lock:
+        job = _jobs.get(transfer.job_id)
+        if job is None:
+            return
+        if transfer in job.transfers:
+            job.transfers.remove(transfer)
+        if completed:
+            job.completed += transfer.size
+
+
+def clear():
+    """清除所有记录"""
+    with _lock:
+        _jobs.clear()
+
+
+# ============================================================
+# 快照
+# ============================================================
+
+def _transfer_snapshot(transfer):
+    eta = transfer.eta()
+    return {
+        "filename": transfer.filename,
+        "size": transfer.size,
+        "bytes": transfer.bytes,
+        "percent": round(transfer.bytes / transfer.size * 100, 2) if transfer.size else 0.0,
+        "speed": round(transfer.rate / 1024, 2),  # KB/s
+        "eta": None if eta is None else round(eta, 1),
+    }
+
+
+def _summary(total_size, done_bytes, rate, transfers):
+    eta = _eta(total_size - done_bytes, rate)
+    return {
+        "total_size": total_size,
+        "downloaded_size": done_bytes,
+        "percent": round(done_bytes / total_size * 100, 2) if total_size else 0.0,
+        "speed": round(rate / 1024, 2),  # KB/s
+        "eta": None if eta is None else round(eta, 1),
+        "transfers": transfers,
+    }
+
+
+def snapshot():
+    """按任务和全局汇总进度
+
+    Returns:
+        {"jobs": [任务汇总], "total": 全局汇总}，汇总中的 transfers 为进行中的传输列表
+    """
+    with _lock:
+        jobs = [(job, list(job.transfers)) for job in _jobs.values()]
+
+    result = []
+    total_size = done_bytes = 0
+    total_rate = 0.0
+    all_transfers = []
+    for job, transfers in jobs:
+        rate = sum(t.rate for t in transfers)
+        in_flight = sum(t.bytes for t in transfers)
+        items = [_transfer_snapshot(t) for t in transfers]
+        summary = _summary(job.total_size, job.completed + in_flight, rate, items)
+        summary["job_id"] = job.job_id
+        summary["finished"] = job.finished
+        result.append(summary)
+        total_size += job.total_size
+        done_bytes += job.completed + in_flight
+        total_rate += rate
+        all_transfers.extend(items)
+    return {"jobs": result, "total": _summary(total_size, done_bytes, total_rate, all_transfers)}
+
+
+def legacy_progress():
+    """转换为界面使用的单文件进度格式（/api/progress）"""
+    total = snapshot()["total"]
+    transfers = total["transfers"]
+    first = transfers[0] if transfers else None
+    return {
+        "total_percent": total["percent"],
+        "current_file_percent": f"{first['percent']:.2f}%" if first else 0.0,
+        "current_filename": " | ".join(t["filename"] for t in transfers),
+        "speed": total["speed"],
+        "file_speed": first["speed"] if first else 0.0,
+        "eta": total["eta"],
+        "file_eta": first["eta"] if first else None,
+        "downloaded_size": total["downloaded_size"],
+        "total_size": total["total_size"],
+    }
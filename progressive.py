@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+边下边播模块
+下载中的文件（本地下载线程正在执行的任务，或 pool 模式下尚未结束的任务）可以在传输完成前播放。
+curl 直接写入最终路径并按顺序追加，因此按请求的 Range 读取已写入磁盘的部分，
+尚未到达的数据轮询等待写入（超过 STREAM_WAIT_TIMEOUT 秒没有新数据时结束响应）。
+请求的文件尚未开始下载时通知调度器优先下载：本地模式插到当前文件之后，
+pool 模式提高队列中该文件的优先级，由下一个空闲的工作进程领取。
+查找只读取任务信息，不会为任务分配存储池根目录（由领取任务的工作进程决定）。
+"""
+
+import os
+import pathlib
+import threading
+import time
+
+import config
+import downloader
+import job_queue
+from shared import log_message
+
+# pool 模式任务的下载计划缓存：任务 ID -> ((根目录, 文件数), 下载计划)
+# 根目录确定或合并了新文件时重建，任务结束后移除
+_plans_lock = threading.Lock()
+_pool_plans = {}
+
+
+def _split(relative_path):
+    """将 RJ01234567/MP3/01.mp3 拆分为作品文件夹名与作品内相对路径，路径无效时返回 None"""
+    parts = pathlib.PurePosixPath(relative_path).parts
+    if len(parts) < 2 or any(part in ("..", ".") for part in parts):
+        return None
+    return parts[0], "/".join(parts[1:])
+
+
+def _pool_plan(job, work_name):
+    """获取（或构建并缓存）pool 模式任务的下载计划
+
+    尚未分配根目录的任务以相对路径构建计划，只用于按路径查找文件序号（清洗后的相对路径与根目录无关）。
+    """
+    key = (job['target_root'], job['file_count'])
+    with _plans_lock:
+        cached = _pool_plans.get(job['id'])
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    base = pathlib.Path(job['target_root']) if job['target_root'] else pathlib.Path()
+    plan = downloader.build_job_plan(job_queue.get_job_files(job['id']), base / work_name)
+    with _plans_lock:
+        _pool_plans[job['id']] = (key, plan)
+    return plan
+
+
+def _find_pool_file(work_name, relative):
+    """在 pool 模式尚未结束的任务中查找文件
+
+    Returns:
+        (任务 ID, 文件序号, 计划项, 是否已分配根目录) 或 None
+    """
+    jobs = job_queue.active_jobs()
+    with _plans_lock:
+        active = {job['id'] for job in jobs}
+        for job_id in [job_id for job_id in _pool_plans if job_id not in active]:
+            del _pool_plans[job_id]
+    for job in jobs:
+        if f"RJ{job['rj_id'].replace('RJ', '')}" != work_name:
+            continue
+        plan = _pool_plan(job, work_name)
+        idx = plan.by_relative.get(relative)
+        if idx is not None:
+            return job['id'], idx, plan.files[idx], job['target_root'] is not None
+    return None
+
+
+def locate(relative_path):
+    """查找下载中的文件
+
+    Args:
+        relative_path: 相对于下载根目录的路径（与 /api/library/file 相同）
+
+    Returns:
+        {"job_id", "idx", "item", "pool", "started"}，文件不在下载中的任务里或已完整下载时返回 None；
+        started 为 False 表示任务尚未由工作进程开始（保存位置未确定，item.save_file 不可读取）
+    """
+    split = _split(relative_path)
+    if split is None:
+        return None
+    work_name, relative = split
+    if config.WORKER_MODE == "pool":
+        found = _find_pool_file(work_name, relative)
+        if found is None:
+            return None
+        job_id, idx, item, started = found
+        entry = {"job_id": job_id, "idx": idx, "item": item, "pool": True, "started": started}
+        if not started:
+            return entry
+    else:
+        found = downloader.find_planned_file(work_name, relative)
+        if found is None:
+            return None
+        job_id, item = found
+        entry = {"job_id": job_id, "idx": None, "item": item, "pool": False, "started": True}
+    if _size(item.save_file) >= item.size:
+        return None
+    return entry
+
+
+def prioritize(entry):
+    """请求调度器优先下载该文件（已开始或已完成时不影响调度）"""
+    if entry["pool"]:
+        job_queue.prioritize_file(entry["job_id"], entry["idx"])
+    else:
+        downloader.prioritize_file(entry["job_id"], entry["item"].path)
+
+
+def _still_pending(entry):
+    """文件是否仍可能继续写入"""
+    if entry["pool"]:
+        return job_queue.get_job_status(entry["job_id"]) in ("queued", "running", "paused")
+    return downloader.is_job_planned(entry["job_id"])
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def written_bytes(entry):
+    """文件已写入磁盘的字节数"""
+    return _size(entry["item"].save_file)
+
+
+def iter_range(entry, start, end):
+    """按顺序产出文件 [start, end] 范围内的数据，尚未写入的部分等待下载
+
+    每次读取时重新打开文件，不长时间占用句柄（Windows 上下载失败时需要删除重下的文件）。
+    """
+    save_file = entry["item"].save_file
+    position = start
+    idle_since = time.monotonic()
+    while position <= end:
+        available = min(_size(save_file), end + 1)
+        if available > position:
+            try:
+                with open(save_file, "rb") as f:
+                    f.seek(position)
+                    data = f.read(min(available - position, config.STREAM_CHUNK_SIZE))
+            except OSError:
+                data = b""
+            if data:
+                position += len(data)
+                idle_since = time.monotonic()
+                yield data
+                continue
+        if not _still_pending(entry) and _size(save_file) <= position:
+            log_message("WARNING", f"边下边播中断: 下载已结束但文件不完整 - {entry['item'].path}")
+            return
+        if time.monotonic() - idle_since > config.STREAM_WAIT_TIMEOUT:
+            log_message("WARNING", f"边下边播中断: {config.STREAM_WAIT_TIMEOUT} 秒内没有新数据 - {entry['item'].path}")
+            return
+        time.sleep(config.STREAM_POLL_INTERVAL)
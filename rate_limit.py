@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+请求速率控制模块
+所有访问上游的请求（元数据接口、媒体下载、封面）在发出前调用 acquire()，
+按主机共享同一个令牌桶（默认只有 API 主机有预算 API_RATE_LIMIT，其他主机可在 RATE_LIMITS 中设置），
+请求结束后调用 report() 上报 HTTP 状态码。
+收到 429（或带 Retry-After 的 503）时按 Retry-After（缺省时指数退避）暂停该主机的全部请求；
+pool 模式下暂停时间写入共享队列数据库，其他工作进程同样等待，
+令牌桶的速率与容量按在线工作进程数平分，所有进程合计不超过配置的预算。
+"""
+
+import email.utils
+import threading
+import time
+import urllib.parse
+
+import config
+from shared import log_message
+
+SHARED_CHECK_INTERVAL = 1.0  # 读取共享暂停时间与在线工作进程数的最短间隔（秒）
+
+_lock = threading.Lock()
+_hosts = {}  # 主机名 -> HostBudget
+
+
+class HostBudget:
+    """单个主机的请求预算（令牌桶）与限流暂停状态"""
+
+    __slots__ = ("host", "total_rate", "total_burst", "rate", "burst", "tokens", "updated", "blocked_until",
+                 "strikes", "shared_checked")
+
+    def __init__(self, host):
+        rate, burst = _configured_limit(host) or (None, None)
+        self.host = host
+        self.total_rate = rate  # 配置的预算（pool 模式下为所有进程合计），None 表示不限速
+        self.total_burst = burst
+        self.rate = rate  # 本进程每秒补充的请求数
+        self.burst = burst  # 本进程令牌桶容量（允许的突发请求数）
+        self.tokens = float(burst or 0)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # 限流暂停截止时间（time.time()）
+        self.strikes = 0  # 连续被限流的次数（用于指数退避）
+        self.shared_checked = 0.0
+
+    def take(self, now):
+        """尝试取出一个令牌，返回需要等待的秒数（0 表示已取得）"""
+        if self.rate is None:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def share(self, processes):
+        """按共享预算的进程数平分速率与容量"""
+        if self.total_rate is None:
+            return
+        processes = max(processes, 1)
+        self.rate = self.total_rate / processes
+        self.burst = max(self.total_burst / processes, 1.0)
+        self.tokens = min(self.tokens, self.burst)
+
+
+def _host_of(url):
+    return urllib.parse.urlsplit(url).hostname or ""
+
+
+def _configured_limit(host):
+    """返回主机配置的 (每秒请求数, 突发请求数)，不限速时返回 None"""
+    if host in config.RATE_LIMITS:
+        return config.RATE_LIMITS[host]
+    if host == _host_of(config.API_ENDPOINT):
+        return config.API_RATE_LIMIT
+    return config.RATE_LIMIT_DEFAULT
+
+
+def _budget(host):
+    budget = _hosts.get(host)
+    if budget is None:
+        budget = _hosts[host] = HostBudget(host)
+    return budget
+
+
+def _read_shared(host):
+    """pool 模式下读取其他进程记录的暂停时间与在线工作进程数（限制读取频率）
+
+    在 _lock 之外查询数据库，数据库繁忙时不会阻塞本进程其他线程的请求。
+
+    Returns:
+        (暂停截止时间, 在线工作进程数)，未到读取时间或读取失败时返回 None
+    """
+    if config.WORKER_MODE != "pool":
+        return None
+    now = time.time()
+    with _lock:
+        budget = _budget(host)
+        if now - budget.shared_checked < SHARED_CHECK_INTERVAL:
+            return None
+        budget.shared_checked = now  # 先登记，避免多个线程同时查询
+    try:
+        import job_queue
+        return job_queue.get_throttle(host), job_queue.live_worker_count()
+    except Exception:
+        return None
+
+
+def parse_retry_after(value, now=None):
+    """解析 Retry-After（秒数或 HTTP 日期），返回需要等待的秒数，无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - (time.time() if now is None else now), 0.0)
+
+
+def acquire(url, cancelled=None):
+    """等待目标主机的请求预算，必要时阻塞
+
+    Args:
+        cancelled: 返回 True 时放弃等待的函数（如停止、暂停信号）
+
+    Returns:
+        False 表示等待期间被取消
+    """
+    host = _host_of(url)
+    while True:
+        shared = _read_shared(host)
+        with _lock:
+            budget = _budget(host)
+            if shared is not None:
+                budget.blocked_until = max(budget.blocked_until, shared[0])
+                budget.share(shared[1])
+            wait = budget.blocked_until - time.time()
+            if wait <= 0:
+                wait = budget.take(time.monotonic())
+                if wait <= 0:
+                    return True
+        if cancelled is not None and cancelled():
+            return False
+        time.sleep(min(wait, 0.2))
+
+
+def report(url, status, retry_after=None):
+    """上报请求结果；限流状态码会暂停该主机的所有请求
+
+    Returns:
+        是否为限流响应
+    """
+    if not status:
+        return False
+    host = _host_of(url)
+    with _lock:
+        budget = _budget(host)
+        # 503 只在带有 Retry-After 时视为限流，否则按普通失败处理
+        if status != 429 and not (status == 503 and retry_after):
+            budget.strikes = 0
+            return False
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = config.RATE_LIMIT_BACKOFF * 2 ** budget.strikes
+        delay = min(delay, config.RATE_LIMIT_MAX_BACKOFF)
+        budget.strikes += 1
+        until = time.time() + delay
+        budget.blocked_until = max(budget.blocked_until, until)
+        budget.tokens = 0.0
+    log_message("WARNING", f"上游限流 ({status}): {host}，{delay:.0f} 秒后继续请求")
+    if config.WORKER_MODE == "pool":
+        try:
+            import job_queue
+            job_queue.set_throttle(host, until)
+        except Exception as e:
+            log_message("WARNING", f"写入共享限流状态失败: {e}")
+    return True
+
+
+def parse_headers(data):
+    """解析 curl -D 输出的响应头（跟随重定向时有多段，取最后一段）
+
+    Returns:
+        (状态码, {小写头名: 值}, 响应头之后的剩余数据)，没有响应头时状态码为 None
+    """
+    status, headers = None, {}
+    while data.startswith(b"HTTP/"):
+        block, separator, rest = data.partition(b"\r\n\r\n")
+        if not separator:
+            block, rest = data, b""
+        lines = block.decode("latin-1").split("\r\n")
+        parts = lines[0].split()
+        status = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        data = rest
+    return status, headers, data
+
+
+def snapshot():
+    """返回各主机的预算与限流状态"""
+    now = time.time()
+    with _lock:
+        return [{"host": b.host, "rate": b.rate, "burst": b.burst,
+                 "tokens": None if b.rate is None else round(b.tokens, 2),
+                 "blocked_for": round(max(b.blocked_until - now, 0), 1), "strikes": b.strikes}
+                for b in _hosts.values()]
@@ -11,6 +11,8 @@ import queue
 from datetime import datetime
 from pathlib import Path
 
+import tracing
+
 
 def get_config():
     """获取配置模块"""
@@ -66,7 +68,8 @@ def log_message(level, message):
 
     if console_window_ref:
         try:
-            console_window_ref.log(level, f"[{timestamp}] [{level}] {message}")
+            with tracing.span("console.log", "log", level=level):
+                console_window_ref.log(level, f"[{timestamp}] [{level}] {message}")
         except:
             pass
 
@@ -0,0 +1,438 @@
+/*
+ * ASMRip 界面交互逻辑
+ */
+
+let currentFiles = [];       // 当前加载的文件列表
+let fileTree = null;         // 文件目录树（children 中的整数为 currentFiles 下标）
+let selected = new Uint8Array(0);  // 选中状态（按文件下标）
+let expanded = new Set();    // 已展开的文件夹节点
+let visibleRows = [];        // 展开后的可见行 {folder, depth} 或 {index, depth}
+let renderPending = false;   // 是否已安排下一帧渲染
+const ROW_HEIGHT = 36;       // 文件列表行高（像素）
+const ROW_OVERSCAN = 10;     // 可见区域上下额外渲染的行数
+const EXPAND_ALL_LIMIT = 300;  // 文件数不超过该值时默认展开全部文件夹
+let progressTimer = null;    // 进度更新定时器
+
+// HTML 转义，防止 XSS 攻击
+function escapeHtml(text) {
+    if (!text) return "";
+    return text.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;").replace(/'/g, "&#039;");
+}
+
+// 格式化网速显示
+function formatSpeed(bytesPerSecond) {
+    if (bytesPerSecond === 0) return '0.00 B/s';
+    const k = 1024;
+    if (bytesPerSecond < k) {
+        return bytesPerSecond.toFixed(2) + ' B/s';
+    } else if (bytesPerSecond < k * k) {
+        return (bytesPerSecond / k).toFixed(2) + ' KB/s';
+    } else if (bytesPerSecond < k * k * k) {
+        return (bytesPerSecond / k / k).toFixed(2) + ' MB/s';
+    } else {
+        return (bytesPerSecond / k / k / k).toFixed(2) + ' GB/s';
+    }
+}
+
+// 格式化剩余时间显示
+function formatEta(seconds) {
+    if (seconds === null || seconds === undefined) return '剩余 --:--';
+    const s = Math.round(seconds);
+    const h = Math.floor(s / 3600);
+    const m = Math.floor((s % 3600) / 60);
+    const pad = n => String(n).padStart(2, '0');
+    return '剩余 ' + (h > 0 ? h + ':' + pad(m) : pad(m)) + ':' + pad(s % 60);
+}
+
+// 获取作品信息
+async function fetchWorkInfo() {
+    const rjId = document.getElementById('rjInput').value.trim().toUpperCase();
+    if (!rjId.startsWith('RJ')) { alert('请输入有效的 RJ 号'); return; }
+
+    const btn = document.getElementById('btnSearch');
+    btn.disabled = true;
+    btn.innerText = '加载中...';
+
+    try {
+        const res = await fetch(`/api/info/${rjId}`);
+        const data = await res.json();
+        if (data.error) { alert(data.error); return; }
+
+        // 显示封面
+        document.getElementById('workCover').src = `/api/image/${rjId}`;
+        document.getElementById('workCover').onload = () => {
+            document.getElementById('workCover').classList.remove('hidden');
+            document.getElementById('coverPlaceholder').classList.add('hidden');
+        };
+
+        // 显示作品信息
+        document.getElementById('workTitle').innerText = data.title;
+        document.getElementById('workId').innerText = data.id;
+        document.getElementById('workCircle').innerText = data.name;
+        document.getElementById('workArea').classList.remove('hidden');
+
+        // 获取文件列表
+        await fetchFileList(rjId);
+    } catch (e) { alert('网络请求失败'); console.error(e); }
+
+    btn.disabled = false;
+    btn.innerText = '搜索';
+}
+
+// 获取文件列表（附带目录树）
+async function fetchFileList(rjId) {
+    const res = await fetch(`/api/files/${rjId}?tree=1`);
+    const data = await res.json();
+    currentFiles = data.files;
+    fileTree = data.tree;
+    selected = new Uint8Array(currentFiles.length).fill(1);
+    expanded = new Set();
+    fileTree.children.forEach(child => {
+        if (typeof child !== 'number') expandFolder(child, currentFiles.length <= EXPAND_ALL_LIMIT);
+    });
+    document.getElementById('workSize').innerText = formatSize(fileTree.size);
+    document.getElementById('fileList').scrollTop = 0;
+    renderFiles();
+    if (document.getElementById('formatPreset').value) applyPreset();
+}
+
+// 展开文件夹（recursive 为 true 时同时展开所有子文件夹）
+function expandFolder(folder, recursive) {
+    expanded.add(folder);
+    if (recursive) folder.children.forEach(child => {
+        if (typeof child !== 'number') expandFolder(child, true);
+    });
+}
+
+// 文件夹下所有文件的下标（首次访问时计算并缓存）
+function folderIndices(folder) {
+    if (!folder.indices) {
+        const result = [];
+        const walk = node => node.children.forEach(child => {
+            if (typeof child === 'number') result.push(child); else walk(child);
+        });
+        walk(folder);
+        folder.indices = result;
+    }
+    return folder.indices;
+}
+
+// 重新计算可见行（仅在展开/折叠时调用）并渲染
+function renderFiles() {
+    visibleRows = [];
+    const walk = (node, depth) => node.children.forEach(child => {
+        if (typeof child === 'number') {
+            visibleRows.push({index: child, depth});
+        } else {
+            visibleRows.push({folder: child, depth});
+            if (expanded.has(child)) walk(child, depth + 1);
+        }
+    });
+    if (fileTree) walk(fileTree, 0);
+    document.getElementById('fileSpacer').style.height = `${visibleRows.length * ROW_HEIGHT}px`;
+    renderVisible();
+}
+
+// 下一帧再渲染，合并连续的滚动事件
+function scheduleRender() {
+    if (renderPending) return;
+    renderPending = true;
+    requestAnimationFrame(() => { renderPending = false; renderVisible(); });
+}
+
+// 只渲染可见区域内的行
+function renderVisible() {
+    const list = document.getElementById('fileList');
+    const rows = document.getElementById('fileRows');
+    const start = Math.max(0, Math.floor(list.scrollTop / ROW_HEIGHT) - ROW_OVERSCAN);
+    const end = Math.min(visibleRows.length, Math.ceil((list.scrollTop + list.clientHeight) / ROW_HEIGHT) + ROW_OVERSCAN);
+    const html = [];
+    for (let i = start; i < end; i++) html.push(renderRow(visibleRows[i], i));
+    rows.style.transform = `translateY(${start * ROW_HEIGHT}px)`;
+    rows.innerHTML = html.join('');
+    rows.querySelectorAll('input[data-partial]').forEach(cb => cb.indeterminate = true);
+    updateSelectionInfo();
+}
+
+function renderRow(row, i) {
+    const indent = 12 + row.depth * 20;
+    if (row.folder) {
+        const folder = row.folder;
+        const indices = folderIndices(folder);
+        let count = 0;
+        for (const index of indices) count += selected[index];
+        const state = count === indices.length ? 'checked' : (count > 0 ? 'data-partial="1"' : '');
+        return `
+            <div class="file-item flex items-center gap-2 pr-3 rounded-lg cursor-pointer" data-row="${i}"
+                 style="height: ${ROW_HEIGHT}px; padding-left: ${indent}px">
+                <span class="w-4 text-gray-400 text-xs">${expanded.has(folder) ? '▼' : '▶'}</span>
+                <input type="checkbox" ${state} class="w-5 h-5 text-indigo-600 rounded">
+                <div class="flex-1 min-w-0 text-sm font-medium text-gray-700 truncate" title="${escapeHtml(folder.name)}">${escapeHtml(folder.name)}</div>
+                <div class="text-xs text-gray-400">${folder.count} 个文件</div>
+                <div class="text-xs text-gray-500 font-mono w-20 text-right">${formatSize(folder.size)}</div>
+            </div>`;
+    }
+    const file = currentFiles[row.index];
+    const name = file.path.slice(file.path.lastIndexOf('/') + 1);
+    return `
+        <div class="file-item flex items-center gap-2 pr-3 rounded-lg" data-row="${i}"
+             style="height: ${ROW_HEIGHT}px; padding-left: ${indent + 24}px">
+            <input type="checkbox" ${selected[row.index] ? 'checked' : ''} class="w-5 h-5 text-indigo-600 rounded">
+            <div class="flex-1 min-w-0 text-sm text-gray-900 truncate" title="${escapeHtml(file.path)}">${escapeHtml(name)}</div>
+            <div class="text-xs text-gray-500 font-mono w-20 text-right">${formatSize(file.size)}</div>
+        </div>`;
+}
+
+// 行点击：勾选框切换选中，点击文件夹其他区域展开/折叠
+function onFileRowClick(event) {
+    const rowElement = event.target.closest('[data-row]');
+    if (!rowElement) return;
+    const row = visibleRows[Number(rowElement.dataset.row)];
+    if (event.target.type === 'checkbox') {
+        const value = event.target.checked ? 1 : 0;
+        if (row.folder) folderIndices(row.folder).forEach(index => selected[index] = value);
+        else selected[row.index] = value;
+        renderVisible();
+    } else if (row.folder) {
+        if (expanded.has(row.folder)) expanded.delete(row.folder); else expanded.add(row.folder);
+        renderFiles();
+    }
+}
+
+// 显示已选文件数与大小
+function updateSelectionInfo() {
+    let count = 0, size = 0;
+    for (let i = 0; i < selected.length; i++) {
+        if (selected[i]) { count++; size += currentFiles[i].size; }
+    }
+    document.getElementById('selectionInfo').innerText =
+        currentFiles.length ? `已选 ${count}/${currentFiles.length} 个，${formatSize(size)}` : '';
+}
+
+// 格式化文件大小
+function formatSize(bytes) {
+    if (bytes === 0) return '0 B';
+    const k = 1024;
+    const sizes = ['B', 'KB', 'MB', 'GB'];
+    const i = Math.floor(Math.log(bytes) / Math.log(k));
+    return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
+}
+
+// 加载文件选择预设
+async function loadPresets() {
+    const res = await fetch('/api/format_presets');
+    const data = await res.json();
+    const select = document.getElementById('formatPreset');
+    Object.keys(data.presets).forEach(name => {
+        const option = document.createElement('option');
+        option.value = name;
+        option.innerText = name;
+        select.appendChild(option);
+    });
+    if (data.default) select.value = data.default;
+}
+
+// 按预设规则在服务端筛选，并勾选保留的文件
+async function applyPreset() {
+    const preset = document.getElementById('formatPreset').value;
+    const rjId = document.getElementById('workId').innerText;
+    if (!preset || !rjId) { toggleAll(true); return; }
+    const res = await fetch(`/api/files/${rjId}?filter=${encodeURIComponent(preset)}`);
+    const data = await res.json();
+    const keep = new Set(data.selected || []);
+    currentFiles.forEach((file, index) => selected[index] = keep.has(file.path) ? 1 : 0);
+    renderVisible();
+}
+
+// 全选/取消全选
+function toggleAll(checked) {
+    selected.fill(checked ? 1 : 0);
+    renderVisible();
+}
+
+// 开始下载
+async function startDownload() {
+    const selectedFiles = currentFiles.filter((file, index) => selected[index]);
+    if (selectedFiles.length === 0) { alert('请至少选择一个文件'); return; }
+
+    const rjId = document.getElementById('workId').innerText;
+    const savePath = document.getElementById('savePath')?.value || undefined;  // 留空时由存储池分配
+
+    const res = await fetch('/api/start', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ rj_id: rjId, files: selectedFiles, save_path: savePath })
+    });
+
+    if (!res.ok) { alert('下载启动失败'); return; }
+    const data = await res.json();
+    if (data.status === 'merged') {
+        // 同一作品已在队列中，新勾选的文件已合并到该任务
+        alert(`该作品已在下载队列中（任务 #${data.job_id}），已合并 ${data.files} 个新文件`);
+    }
+
+    // 显示开始提示弹窗
+    document.getElementById('startModal').classList.remove('hidden');
+    document.getElementById('progressArea').classList.remove('hidden');
+
+    // 启动进度更新定时器
+    if (progressTimer) clearInterval(progressTimer);
+    progressTimer = setInterval(updateProgress, 1000);
+}
+
+// 确认停止下载弹窗
+function confirmStop() { document.getElementById('stopModal').classList.remove('hidden'); }
+function closeStopModal() { document.getElementById('stopModal').classList.add('hidden'); }
+function closeStartModal() { document.getElementById('startModal').classList.add('hidden'); }
+
+// 立即停止下载
+async function stopDownload() {
+    closeStopModal();
+    await fetch('/api/stop_immediate', { method: 'POST' });
+    if (progressTimer) clearInterval(progressTimer);
+    progressTimer = null;
+    document.getElementById('progressArea').classList.add('hidden');
+    document.getElementById('progressBar').style.width = '0%';
+    document.getElementById('progressPercent').innerText = '0.00%';
+}
+
+// 暂停 / 继续下载（暂停时立即中断传输，已下载部分在继续后续传）
+let downloadPaused = false;
+async function togglePause() {
+    await fetch(downloadPaused ? '/api/resume' : '/api/pause', { method: 'POST' });
+    checkStatus();
+}
+
+// 更新下载进度显示
+async function updateProgress() {
+    try {
+        const res = await fetch('/api/progress');
+        const data = await res.json();
+
+        if (data.total_percent !== undefined && data.total_percent > 0) {
+            document.getElementById('progressBar').style.width = data.total_percent + '%';
+            document.getElementById('progressPercent').innerText = data.total_percent.toFixed(2) + '%';
+            document.getElementById('currentFileProgress').innerText = data.current_filename || '下载中...';
+
+            // 网速转换与显示
+            const speedBytes = (data.speed || 0) * 1024;
+            document.getElementById('speedDisplay').innerText = formatSpeed(speedBytes);
+            document.getElementById('etaDisplay').innerText = formatEta(data.eta);
+            document.getElementById('totalProgress').innerText = '总进度: ' + data.total_percent.toFixed(2) + '%';
+        }
+    } catch (e) { console.error(e); }
+}
+
+// 检查下载状态
+async function checkStatus() {
+    try {
+        const res = await fetch('/api/status');
+        const data = await res.json();
+
+        const startBtn = document.getElementById('btnStart');
+        const stopBtn = document.getElementById('btnStop');
+        const pauseBtn = document.getElementById('btnPause');
+        const indicator = document.getElementById('statusIndicator');
+
+        downloadPaused = !!data.paused;
+        pauseBtn.disabled = !data.downloading;
+        pauseBtn.innerText = downloadPaused ? '继续' : '暂停';
+
+        if (data.downloading && downloadPaused) {
+            // 暂停状态
+            startBtn.disabled = true;
+            startBtn.classList.add('opacity-50', 'cursor-not-allowed');
+            stopBtn.disabled = false;
+            stopBtn.classList.remove('opacity-50', 'cursor-not-allowed');
+            indicator.className = 'px-3 py-1 rounded-full text-xs font-medium bg-gray-100 text-gray-500';
+            indicator.innerText = '已暂停';
+        } else if (data.downloading) {
+            // 下载中状态
+            startBtn.disabled = true;
+            startBtn.classList.add('opacity-50', 'cursor-not-allowed');
+            stopBtn.disabled = false;
+            stopBtn.classList.remove('opacity-50', 'cursor-not-allowed');
+            indicator.className = 'px-3 py-1 rounded-full text-xs font-medium bg-green-100 text-green-600';
+            indicator.innerText = '下载中';
+        } else {
+            // 空闲状态
+            startBtn.disabled = false;
+            startBtn.classList.remove('opacity-50', 'cursor-not-allowed');
+            stopBtn.disabled = true;
+            stopBtn.classList.add('opacity-50', 'cursor-not-allowed');
+            indicator.className = 'px-3 py-1 rounded-full text-xs font-medium bg-gray-100 text-gray-500';
+            indicator.innerText = '空闲';
+
+            if (progressTimer) {
+                clearInterval(progressTimer);
+                progressTimer = null;
+            }
+
+            // 检查是否刚完成
+            const finishRes = await fetch('/api/finish_check');
+            const finishData = await finishRes.json();
+            if (finishData.just_finished) {
+                showFinishModal(finishData);
+            }
+        }
+    } catch (e) { console.error(e); }
+}
+
+// 显示下载完成弹窗
+function showFinishModal(data) {
+    document.getElementById('finishTotal').innerText = data.total;
+    document.getElementById('finishSuccess').innerText = data.success;
+    document.getElementById('finishFailed').innerText = data.failed;
+
+    const failedList = document.getElementById('finishFailedList');
+    if (data.failed_list && data.failed_list.length > 0) {
+        failedList.classList.remove('hidden');
+        failedList.innerHTML = '<p class="font-medium mb-1">失败列表:</p>' + 
+            data.failed_list.map(f => `<p>• ${f[0]}: ${f[1]}</p>`).join('');
+    } else {
+        failedList.classList.add('hidden');
+    }
+
+    document.getElementById('finishModal').classList.remove('hidden');
+}
+
+// 关闭完成弹窗
+function closeFinishModal() {
+    document.getElementById('finishModal').classList.add('hidden');
+    document.getElementById('progressArea').classList.add('hidden');
+    document.getElementById('progressBar').style.width = '0%';
+    document.getElementById('progressPercent').innerText = '0.00%';
+}
+
+// 清空界面
+function clearUI() {
+    document.getElementById('rjInput').value = '';
+    document.getElementById('workArea').classList.add('hidden');
+    document.getElementById('fileRows').innerHTML = '';
+    document.getElementById('fileSpacer').style.height = '0px';
+    document.getElementById('progressArea').classList.add('hidden');
+    document.getElementById('progressBar').style.width = '0%';
+    currentFiles = [];
+    fileTree = null;
+    selected = new Uint8Array(0);
+    visibleRows = [];
+    updateSelectionInfo();
+    if (progressTimer) clearInterval(progressTimer);
+    progressTimer = null;
+}
+
+// 打包下载已完成的作品
+function exportZip() {
+    const rjId = document.getElementById('workId').innerText;
+    window.open(`/api/export_zip/RJ${rjId.replace(/^RJ/i, '')}`, '_blank');
+}
+
+// 导出日志
+async function exportLog() {
+    window.open('/api/export_log', '_blank');
+}
+
+// 定期检查状态
+setInterval(checkStatus, 1000);
+loadPresets();
+window.addEventListener('resize', scheduleRender);
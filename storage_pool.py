@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+存储池模块
+将多个下载根目录（STORAGE_ROOTS，可位于不同磁盘）作为一个整体使用。
+保存路径为默认下载目录的任务在开始时按作品选择根目录：
+  1. 作品已存在于某个根目录时继续使用该目录（续传、去重与作品库保持一致）
+  2. 否则在剩余空间足够的根目录中，选择 写入速度 / (1 + 正在写入的任务数) 最大的一个
+写入速度通过写入并同步一个测试文件测得，结果缓存 STORAGE_PROBE_INTERVAL 秒；
+测量在后台线程中进行，不阻塞任务开始（测量期间使用上次的结果）。
+作品库的查找、扫描与文件读取覆盖所有根目录。
+"""
+
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+
+import config
+from shared import log_message
+
+PROBE_FILE_PREFIX = ".asmrip_probe-"  # 测试文件名前缀（每次测量使用唯一的文件名）
+
+_lock = threading.Lock()
+_active = {}  # 根目录 -> 正在写入的任务数（本进程）
+_probes = {}  # 根目录 -> (测得的写入速度 字节/秒, 测量时间)，由 _lock 保护
+_probing = set()  # 正在后台测量写入速度的根目录，由 _lock 保护
+
+
+def roots():
+    """返回下载根目录列表（未配置 STORAGE_ROOTS 时只有默认下载目录）"""
+    return [pathlib.Path(root) for root in config.STORAGE_ROOTS] or [config.DEFAULT_DOWNLOAD_DIR]
+
+
+def library_roots():
+    """返回作品库覆盖的全部根目录（含默认下载目录中的已有作品）"""
+    result = roots()
+    if config.DEFAULT_DOWNLOAD_DIR not in result:
+        result.append(config.DEFAULT_DOWNLOAD_DIR)
+    return result
+
+
+def _normalize(path):
+    return os.path.normcase(os.path.abspath(str(path)))
+
+
+def uses_pool(save_path):
+    """保存路径为空或为默认下载目录时由存储池分配根目录"""
+    return not save_path or _normalize(save_path) == _normalize(config.DEFAULT_DOWNLOAD_DIR)
+
+
+def find_work(work_name):
+    """在所有根目录中查找作品文件夹，不存在时返回 None"""
+    for root in library_roots():
+        candidate = root / work_name
+        if candidate.is_dir():
+            return candidate
+    return None
+
+
+def root_for(relative_path):
+    """返回包含指定相对路径（如 RJ01234567/MP3/01.mp3）的根目录，都不存在时返回第一个根目录"""
+    for root in library_roots():
+        if (root / relative_path).exists():
+            return root
+    return library_roots()[0]
+
+
+def free_space(root):
+    """返回根目录所在磁盘的可用字节数（目录尚未创建时查询最近的上级目录），无法获取时返回 None"""
+    probe = pathlib.Path(root)
+    while not probe.exists() and probe.parent != probe:
+        probe = probe.parent
+    try:
+        return shutil.disk_usage(probe).free
+    except OSError:
+        return None
+
+
+def measure_throughput(root):
+    """写入并同步测试文件，测量根目录写入速度（字节/秒），无法写入时返回 0"""
+    block = os.urandom(1024 * 1024)
+    path = None
+    try:
+        pathlib.Path(root).mkdir(parents=True, exist_ok=True)
+        # 唯一的文件名：多个进程或主机同时测量同一根目录时互不影响
+        fd, path = tempfile.mkstemp(prefix=PROBE_FILE_PREFIX, dir=str(root))
+        began = time.perf_counter()
+        with os.fdopen(fd, "wb") as f:
+            for _ in range(max(config.STORAGE_PROBE_BYTES // len(block), 1)):
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+        seconds = time.perf_counter() - began
+        return max(config.STORAGE_PROBE_BYTES, len(block)) / max(seconds, 1e-6)
+    except OSError as e:
+        log_message("WARNING", f"存储目录不可写: {root} ({e})")
+        return 0.0
+    finally:
+        if path is not None:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+
+def _probe(key, root):
+    """后台测量线程：记录结果并清除测量中标记"""
+    try:
+        throughput = measure_throughput(root)
+        with _lock:
+            _probes[key] = (throughput, time.time())
+    finally:
+        with _lock:
+            _probing.discard(key)
+
+
+def write_throughput(root):
+    """返回根目录的写入速度（字节/秒），无法写入时为 0，尚未测得时返回 None
+
+    缓存过期或尚未测量时在后台线程中测量（每个根目录同时只有一个），期间返回上次的结果。
+    """
+    key = str(root)
+    with _lock:
+        cached = _probes.get(key)
+        if cached and time.time() - cached[1] < config.STORAGE_PROBE_INTERVAL:
+            return cached[0]
+        if key not in _probing:
+            _probing.add(key)
+            threading.Thread(target=_probe, args=(key, root), name=f"storage-probe {key}", daemon=True).start()
+    return cached[0] if cached else None
+
+
+def choose_root(work_name, required_bytes, busy=None):
+    """为作品选择根目录
+
+    Args:
+        work_name: 作品文件夹名（如 RJ01234567）
+        required_bytes: 作品需要的字节数
+        busy: {根目录字符串: 正在写入的任务数}，默认使用本进程的计数
+
+    Returns:
+        选中的根目录
+    """
+    existing = find_work(work_name)
+    if existing is not None:
+        return existing.parent
+
+    candidates = roots()
+    if len(candidates) == 1:
+        return candidates[0]
+
+    with _lock:
+        busy = dict(_active) if busy is None else busy
+    needed = required_bytes + config.DISK_SPACE_RESERVE
+    speeds = {str(root): write_throughput(root) for root in candidates}
+    # 尚未测得速度的目录按已测得的最快速度估计，全部未测得时只按正在写入的任务数与剩余空间选择
+    fallback = max((speed for speed in speeds.values() if speed), default=1.0)
+    scored = []
+    for root in candidates:
+        free = free_space(root)
+        if free is None:
+            continue
+        throughput = speeds[str(root)]
+        if throughput is None:
+            throughput = fallback
+        score = throughput / (1 + busy.get(str(root), 0))
+        scored.append((free >= needed and throughput > 0, score, free, root))
+    if not scored:
+        return candidates[0]
+    # 空间足够的目录优先；都不够时选剩余空间最大的目录（预检会给出空间不足的提示）
+    fits = [entry for entry in scored if entry[0]]
+    if fits:
+        return max(fits, key=lambda entry: (entry[1], entry[2]))[3]
+    return max(scored, key=lambda entry: entry[2])[3]
+
+
+def resolve_base(save_path, work_name, required_bytes, busy=None):
+    """返回任务实际使用的保存目录：默认下载目录由存储池分配，其他路径保持不变"""
+    if not uses_pool(save_path):
+        return pathlib.Path(save_path)
+    root = choose_root(work_name, required_bytes, busy)
+    if len(roots()) > 1:
+        log_message("TASK", f"存储池分配: {work_name} -> {root}")
+    return root
+
+
+def begin_write(root):
+    """登记一个正在写入该根目录的任务"""
+    with _lock:
+        _active[str(root)] = _active.get(str(root), 0) + 1
+
+
+def end_write(root):
+    """注销正在写入该根目录的任务"""
+    with _lock:
+        count = _active.get(str(root), 0) - 1
+        if count > 0:
+            _active[str(root)] = count
+        else:
+            _active.pop(str(root), None)
+
+
+def status():
+    """返回各根目录的剩余空间、已测得的写入速度与正在写入的任务数"""
+    with _lock:
+        active = dict(_active)
+        probes = dict(_probes)
+    result = []
+    for root in library_roots():
+        probe = probes.get(str(root))
+        try:
+            usage = shutil.disk_usage(root) if root.exists() else None
+        except OSError:
+            usage = None
+        result.append({
+            "root": str(root),
+            "pool": root in roots(),
+            "free": free_space(root),
+            "total": usage.total if usage else None,
+            "write_throughput": round(probe[0]) if probe else None,
+            "active_jobs": active.get(str(root), 0),
+        })
+    return result
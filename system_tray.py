@@ -65,6 +65,13 @@ def on_exit(icon, item):
     except Exception as e:
         print(f"停止下载任务失败: {e}")
 
+    # 结束 pool 模式下的本机工作进程（os._exit 不会执行 multiprocessing 的清理）
+    try:
+        import worker
+        worker.stop_local_workers()
+    except Exception as e:
+        print(f"结束工作进程失败: {e}")
+
     # 保存日志文件
     save_log("自动")
     log_message("SYSTEM", "用户退出程序")
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+测试公共配置
+把项目根目录加入导入路径；每个测试使用临时目录中的独立数据库。
+"""
+
+import pathlib
+import sys
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+import job_queue  # noqa: E402
+import library_index  # noqa: E402
+
+
+def _close(module):
+    """关闭模块缓存在当前线程的数据库连接"""
+    conn = getattr(module._local, "conn", None)
+    if conn is not None:
+        conn.close()
+        del module._local.conn
+
+
+@pytest.fixture
+def queue_db(tmp_path, monkeypatch):
+    """临时的共享队列数据库"""
+    _close(job_queue)
+    monkeypatch.setattr(config, "QUEUE_DB", tmp_path / "queue.db")
+    job_queue.init_db()
+    yield job_queue.connect()
+    _close(job_queue)
+
+
+@pytest.fixture
+def library_db(tmp_path, monkeypatch):
+    """临时的作品库索引数据库路径（首次 connect() 时创建）"""
+    _close(library_index)
+    monkeypatch.setattr(config, "LIBRARY_DB", tmp_path / "library.db")
+    yield config.LIBRARY_DB
+    _close(library_index)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""下载流程：传输停滞检测与下载前的文件系统预检"""
+
+import pytest
+
+import config
+import downloader
+
+
+@pytest.fixture
+def stall_limits(monkeypatch):
+    monkeypatch.setattr(config, "STALL_TIMEOUT", 30)
+    monkeypatch.setattr(config, "LOW_SPEED_TIME", 60)
+    monkeypatch.setattr(config, "LOW_SPEED_LIMIT", 1024)
+
+
+def test_watchdog_detects_no_data(stall_limits):
+    watchdog = downloader.StallWatchdog(0, now=0)
+    assert watchdog.check(100, now=10) is None
+    assert watchdog.check(100, now=39) is None
+    assert "30 秒没有收到数据" in watchdog.check(100, now=40)
+
+
+def test_watchdog_detects_low_speed(stall_limits):
+    watchdog = downloader.StallWatchdog(0, now=0)
+    for second in range(1, 60):
+        assert watchdog.check(second * 100, now=second) is None
+    assert "60 秒平均速度" in watchdog.check(6000, now=60)
+
+
+def test_watchdog_slides_window_when_fast_enough(stall_limits):
+    watchdog = downloader.StallWatchdog(1000, now=0)
+    assert watchdog.check(1000 + 60 * 2048, now=60) is None
+    # 新窗口从第 60 秒开始计算，之前的速度不再计入
+    assert watchdog.check(1000 + 60 * 2048 + 100, now=90) is None
+    assert watchdog.check(1000 + 60 * 2048 + 200, now=120) is not None
+
+
+def _plan(tmp_path, sizes):
+    files = [{"path": f"MP3/{index:02d}.mp3", "size": size, "hash": str(index)} for index, size in enumerate(sizes)]
+    return downloader.build_job_plan(files, tmp_path / "RJ01234567")
+
+
+def test_preflight_classifies_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DISK_SPACE_RESERVE", 0)
+    plan = _plan(tmp_path, [100, 100, 100, 100])
+    downloader.create_plan_directories(plan)
+    plan.files[0].save_file.write_bytes(b"x" * 100)  # 完整
+    plan.files[1].save_file.write_bytes(b"x" * 30)  # 不完整：只需下载缺少的 70 字节
+    plan.files[2].save_file.write_bytes(b"x" * 150)  # 比预期大：重新下载，原文件占用的空间可回收
+
+    result = downloader.preflight_plan(plan)
+    assert result["states"] == {"MP3/00.mp3": "complete", "MP3/01.mp3": "partial",
+                                "MP3/02.mp3": "partial", "MP3/03.mp3": "missing"}
+    assert (result["complete"], result["partial"], result["missing"]) == (1, 2, 1)
+    assert result["remaining_bytes"] == 70 + 100 + 100
+    assert result["required_bytes"] == 270 - 150
+    assert result["enough_space"] is True
+
+
+def test_preflight_before_directories_exist(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DISK_SPACE_RESERVE", 10)
+    plan = _plan(tmp_path, [100, 200])
+    result = downloader.preflight_plan(plan)
+    assert result["missing"] == 2
+    assert result["remaining_bytes"] == 300 and result["required_bytes"] == 310
+    assert result["free_bytes"] is not None
+
+
+def test_preflight_reports_insufficient_space(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "DISK_SPACE_RESERVE", 0)
+    plan = _plan(tmp_path, [1 << 62])
+    assert downloader.preflight_plan(plan)["enough_space"] is False
+
+    # 已全部下载完成时不检查空间
+    monkeypatch.setattr(downloader, "_scan_directory", lambda directory: {"00.mp3": 1 << 62})
+    result = downloader.preflight_plan(plan)
+    assert result["complete"] == 1 and result["enough_space"] is True
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""文件选择规则：同一音轨的格式优先级与文件类别筛选"""
+
+import pytest
+
+import file_filters
+
+FILES = [
+    {"path": "WAV/01 本編.wav", "size": 50},
+    {"path": "WAV/02 おまけ.wav", "size": 40},
+    {"path": "mp3版/01 本編.mp3", "size": 5},
+    {"path": "【FLAC】/01 本編.flac", "size": 30},
+    {"path": "WAV/01 本編.lrc", "size": 1},
+    {"path": "イラスト.png", "size": 2},
+    {"path": "readme.txt", "size": 1},
+]
+
+
+def _paths(files):
+    return [f["path"] for f in files]
+
+
+def test_prefer_keeps_best_format_per_track():
+    selected, skipped = file_filters.select_files(FILES, "prefer_flac")
+    assert _paths(selected) == ["WAV/02 おまけ.wav", "【FLAC】/01 本編.flac", "WAV/01 本編.lrc",
+                                "イラスト.png", "readme.txt"]
+    assert _paths(skipped) == ["WAV/01 本編.wav", "mp3版/01 本編.mp3"]
+
+
+def test_unlisted_formats_rank_last():
+    selected, _ = file_filters.select_files(FILES, {"prefer": ["mp3"]})
+    assert "mp3版/01 本編.mp3" in _paths(selected)
+    assert "WAV/01 本編.wav" not in _paths(selected)
+    assert "【FLAC】/01 本編.flac" not in _paths(selected)
+
+
+def test_types_filter():
+    selected, skipped = file_filters.select_files(FILES, "audio_subtitles")
+    assert _paths(selected) == ["WAV/01 本編.wav", "WAV/02 おまけ.wav", "mp3版/01 本編.mp3",
+                                "【FLAC】/01 本編.flac", "WAV/01 本編.lrc"]
+    assert _paths(skipped) == ["イラスト.png", "readme.txt"]
+
+
+def test_same_format_duplicates_are_kept():
+    files = [{"path": "A/01.mp3", "size": 1}, {"path": "B/01.mp3", "size": 1}, {"path": "B/01.wav", "size": 9}]
+    selected, skipped = file_filters.select_files(files, {"prefer": ["mp3", "wav"]})
+    assert _paths(selected) == ["A/01.mp3", "B/01.mp3"]
+    assert _paths(skipped) == ["B/01.wav"]
+
+
+def test_no_rules_keeps_everything():
+    for rules in (None, "", {}):
+        selected, skipped = file_filters.select_files(FILES, rules)
+        assert selected == FILES and skipped == []
+
+
+def test_invalid_rules():
+    with pytest.raises(ValueError):
+        file_filters.select_files(FILES, "no_such_preset")
+    with pytest.raises(ValueError):
+        file_filters.select_files(FILES, ["flac"])
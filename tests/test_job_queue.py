@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""共享任务队列：领取、心跳续约、完成、暂停与继续、重复提交合并"""
+
+import config
+import job_queue
+
+
+def _task(rj_id="RJ01234567", save_path="/data", count=2, size=100):
+    files = [{"path": f"MP3/{index:02d}.mp3", "size": size, "hash": f"{rj_id}/{index}"} for index in range(count)]
+    return {"rj_id": rj_id, "save_path": save_path, "files": files}
+
+
+def _file(conn, job_id, idx):
+    return conn.execute("SELECT * FROM files WHERE job_id = ? AND idx = ?", (job_id, idx)).fetchone()
+
+
+def test_claim_order_and_lease(queue_db):
+    low, _, _ = job_queue.enqueue_job(_task("RJ1"), priority=0)
+    high, _, _ = job_queue.enqueue_job(_task("RJ2"), priority=5)
+
+    row = job_queue.claim_file("w1")
+    assert (row['job_id'], row['idx']) == (high, 0)
+    assert job_queue.get_job_status(high) == "running"
+    assert job_queue.get_job_status(low) == "queued"
+    claimed = _file(queue_db, high, 0)
+    assert claimed['status'] == "running" and claimed['lease_owner'] == "w1" and claimed['attempts'] == 1
+
+    # 请求优先下载的文件排在任务优先级之前
+    job_queue.prioritize_file(low, 1)
+    row = job_queue.claim_file("w2")
+    assert (row['job_id'], row['idx']) == (low, 1)
+
+
+def test_claim_returns_none_when_empty(queue_db):
+    assert job_queue.claim_file("w1") is None
+    job_id, _, _ = job_queue.enqueue_job(_task(count=1))
+    assert job_queue.claim_file("w1")['job_id'] == job_id
+    assert job_queue.claim_file("w2") is None
+
+
+def test_expired_lease_is_reclaimed(queue_db, monkeypatch):
+    job_id, _, _ = job_queue.enqueue_job(_task(count=1))
+    monkeypatch.setattr(config, "LEASE_SECONDS", -1)
+    job_queue.claim_file("crashed")
+    row = job_queue.claim_file("w2")
+    assert (row['job_id'], row['idx']) == (job_id, 0)
+    assert _file(queue_db, job_id, 0)['lease_owner'] == "w2"
+    assert _file(queue_db, job_id, 0)['attempts'] == 2
+
+
+def test_heartbeat_renews_lease_and_reports_status(queue_db, monkeypatch):
+    job_queue.register_worker("w1")
+    job_id, _, _ = job_queue.enqueue_job(_task(count=1))
+    monkeypatch.setattr(config, "LEASE_SECONDS", 1)
+    job_queue.claim_file("w1")
+    before = _file(queue_db, job_id, 0)['lease_expires']
+
+    monkeypatch.setattr(config, "LEASE_SECONDS", 600)
+    assert job_queue.heartbeat("w1", job_id, "MP3/00.mp3", {"bytes": 10}) == "running"
+    assert _file(queue_db, job_id, 0)['lease_expires'] > before + 500
+    worker = queue_db.execute("SELECT * FROM workers WHERE id = 'w1'").fetchone()
+    assert worker['job_id'] == job_id and worker['current_file'] == "MP3/00.mp3"
+
+    assert job_queue.heartbeat("w1") is None
+    assert job_queue.heartbeat("w1", 9999) == "cancelled"
+    job_queue.cancel_jobs(job_id)
+    assert job_queue.heartbeat("w1", job_id) == "cancelled"
+
+
+def test_finish_file_retries_then_fails(queue_db, monkeypatch):
+    monkeypatch.setattr(config, "MAX_FILE_ATTEMPTS", 2)
+    job_id, _, _ = job_queue.enqueue_job(_task(count=2))
+
+    first = job_queue.claim_file("w1")
+    assert job_queue.finish_file("w1", job_id, first['idx'], False, "超时") is False
+    assert _file(queue_db, job_id, first['idx'])['status'] == "pending"
+
+    again = job_queue.claim_file("w1")
+    assert again['idx'] == first['idx']
+    assert job_queue.finish_file("w1", job_id, again['idx'], False, "超时") is False
+    failed = _file(queue_db, job_id, first['idx'])
+    assert failed['status'] == "failed" and failed['error'] == "超时"
+
+    last = job_queue.claim_file("w1")
+    assert job_queue.finish_file("w1", job_id, last['idx'], True) is True
+    assert job_queue.get_job_status(job_id) == "done"
+    assert job_queue.get_job_outcome(job_id) == ({"MP3/01.mp3"}, [("MP3/00.mp3", "超时")])
+
+
+def test_finish_file_ignores_stale_owner(queue_db, monkeypatch):
+    job_id, _, _ = job_queue.enqueue_job(_task(count=1))
+    monkeypatch.setattr(config, "LEASE_SECONDS", -1)
+    job_queue.claim_file("slow")
+    job_queue.claim_file("w2")
+    job_queue.finish_file("slow", job_id, 0, True)
+    assert _file(queue_db, job_id, 0)['lease_owner'] == "w2"
+    assert _file(queue_db, job_id, 0)['status'] == "running"
+
+
+def test_release_file_does_not_count_attempt(queue_db):
+    job_id, _, _ = job_queue.enqueue_job(_task(count=1))
+    job_queue.claim_file("w1")
+    job_queue.release_file("w1", job_id, 0)
+    released = _file(queue_db, job_id, 0)
+    assert released['status'] == "pending" and released['attempts'] == 0 and released['lease_owner'] is None
+
+
+def test_pause_and_resume(queue_db):
+    job_id, _, _ = job_queue.enqueue_job(_task(count=2))
+    job_queue.pause_jobs(job_id)
+    assert job_queue.get_job_status(job_id) == "paused"
+    assert job_queue.claim_file("w1") is None
+    assert job_queue.heartbeat("w1", job_id) == "paused"
+
+    job_queue.resume_jobs(job_id)
+    assert job_queue.get_job_status(job_id) == "queued"
+    assert job_queue.claim_file("w1")['job_id'] == job_id
+
+
+def test_last_file_finishing_while_paused_ends_job(queue_db):
+    job_id, _, _ = job_queue.enqueue_job(_task(count=1))
+    job_queue.claim_file("w1")
+    job_queue.pause_jobs(job_id)
+    assert job_queue.finish_file("w1", job_id, 0, True) is True
+    assert job_queue.get_job_status(job_id) == "done"
+
+
+def test_resume_without_pending_files_finishes_job(queue_db):
+    job_id, _, _ = job_queue.enqueue_job(_task(count=1))
+    job_queue.pause_jobs(job_id)
+    queue_db.execute("UPDATE files SET status = 'done' WHERE job_id = ?", (job_id,))
+    job_queue.resume_jobs()
+    assert job_queue.get_job_status(job_id) == "done"
+
+
+def test_duplicate_submission_merges_new_files(queue_db):
+    job_id, added, merged = job_queue.enqueue_job(_task(count=2))
+    assert (added, merged) == (2, False)
+
+    again = _task(count=3)
+    assert job_queue.enqueue_job(again) == (job_id, 1, True)
+    assert job_queue.enqueue_job(again) == (job_id, 0, True)
+    job = job_queue.get_job(job_id)
+    assert job['files'] == 3 and job['size'] == 300
+    assert [f['idx'] for f in job['file_list']] == [0, 1, 2]
+
+    # 保存到其他目录或原任务已结束时新建任务
+    other, _, merged = job_queue.enqueue_job(_task(save_path="/other"))
+    assert other != job_id and merged is False
+    job_queue.cancel_jobs(job_id)
+    assert job_queue.enqueue_job(_task())[0] not in (job_id, other)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""作品库索引：旧版本数据库升级与检索"""
+
+import os
+import sqlite3
+
+import library_index
+
+# 版本 1 的表结构（作品以 RJ 号为键，没有校验相关的列）
+V1_SCHEMA = """
+CREATE TABLE works (
+    rj_id TEXT PRIMARY KEY,
+    title TEXT,
+    circle TEXT,
+    info TEXT,
+    dir_path TEXT NOT NULL,
+    dir_mtime REAL NOT NULL DEFAULT 0,
+    file_count INTEGER NOT NULL DEFAULT 0,
+    total_size INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE files (
+    rj_id TEXT NOT NULL,
+    safe_path TEXT NOT NULL,
+    original_path TEXT,
+    size INTEGER NOT NULL,
+    hash TEXT,
+    PRIMARY KEY (rj_id, safe_path)
+);
+CREATE INDEX files_hash ON files (hash);
+CREATE VIRTUAL TABLE works_fts USING fts5(rj_id, title, circle, paths);
+"""
+
+
+def _create_v1(path, root):
+    conn = sqlite3.connect(str(path))
+    conn.executescript(V1_SCHEMA)
+    conn.execute("INSERT INTO works (rj_id, title, circle, dir_path, file_count, total_size, updated_at) "
+                 "VALUES ('RJ01234567', '耳かき屋さん', 'サークル', ?, 1, 100, 1)",
+                 (os.path.join(root, "RJ01234567"),))
+    conn.execute("INSERT INTO files (rj_id, safe_path, original_path, size, hash) "
+                 "VALUES ('RJ01234567', 'MP3/01.mp3', 'MP3/01 本編.mp3', 100, 'RJ01234567/1')")
+    conn.commit()
+    conn.close()
+
+
+def test_upgrade_from_v1(library_db, tmp_path):
+    root = str(tmp_path / "downloads")
+    _create_v1(library_db, root)
+
+    conn = library_index.connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == library_index.SCHEMA_VERSION
+    work = conn.execute("SELECT * FROM works").fetchone()
+    assert (work['root'], work['rj_id'], work['title']) == (root, "RJ01234567", "耳かき屋さん")
+    file = conn.execute("SELECT * FROM files").fetchone()
+    assert (file['root'], file['safe_path'], file['hash'], file['missing']) == (root, "MP3/01.mp3", "RJ01234567/1", 0)
+    assert file['sha256'] is None
+    tables = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert not {"works_v1", "files_v1"} & tables
+
+    # 全文索引按新结构重建
+    results = library_index.search("耳かき屋")
+    assert [(row['rj_id'], row['root']) for row in results] == [("RJ01234567", root)]
+    assert library_index.search("本編")[0]['rj_id'] == "RJ01234567"
+
+
+def test_upgrade_is_idempotent(library_db, tmp_path):
+    _create_v1(library_db, str(tmp_path / "downloads"))
+    library_index.connect()
+    conn = sqlite3.connect(str(library_db))
+    conn.row_factory = sqlite3.Row
+    assert library_index._upgrade(conn) is False
+    # 其他连接已完成升级但尚未写入版本号时同样跳过
+    conn.execute("PRAGMA user_version = 1")
+    assert library_index._upgrade(conn) is False
+    assert conn.execute("SELECT COUNT(*) FROM works").fetchone()[0] == 1
+    conn.close()
+
+
+def test_new_database_needs_no_upgrade(library_db):
+    conn = library_index.connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == library_index.SCHEMA_VERSION
+    assert library_index.search("anything") == []
+
+
+def _add_work(conn, rj_id, title, circle, paths):
+    conn.execute("INSERT INTO works (root, rj_id, title, circle, dir_path, updated_at) VALUES ('/d', ?, ?, ?, ?, 1)",
+                 (rj_id, title, circle, f"/d/{rj_id}"))
+    conn.executemany("INSERT INTO files (root, rj_id, safe_path, original_path, size) VALUES ('/d', ?, ?, ?, 1)",
+                     [(rj_id, path, path) for path in paths])
+
+
+def test_short_terms_match_each_term(library_db):
+    conn = library_index.connect()
+    with conn:
+        _add_work(conn, "RJ01000001", "耳かき", "AB", ["MP3/01 本編.mp3", "MP3/02 おまけ.mp3"])
+        _add_work(conn, "RJ01000002", "本編集", "CD", ["MP3/01.mp3"])
+        _add_work(conn, "RJ01000003", "100%_ok", "EF", [])
+
+    # 少于 3 个字符的词走 LIKE 查询，与全文索引一样每个词都要命中（可以在不同字段或不同文件中）
+    assert [row['rj_id'] for row in library_index.search("本編 AB")] == ["RJ01000001"]
+    assert [row['rj_id'] for row in library_index.search("本編 おまけ")] == ["RJ01000001"]
+    assert library_index.search("本編 XY") == []
+    assert {row['rj_id'] for row in library_index.search("本編")} == {"RJ01000001", "RJ01000002"}
+    # % 和 _ 按字面匹配
+    assert [row['rj_id'] for row in library_index.search("%_")] == ["RJ01000003"]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""作品库完整性校验：问题文件分类与已校验字节数"""
+
+import downloader
+import library_index
+import library_verify
+
+
+def test_checked_bytes_count_only_hashed_content(library_db, tmp_path):
+    files = [{"path": f"MP3/{index}.mp3", "hash": f"h{index}", "size": 1000} for index in range(3)]
+    plan = downloader.build_job_plan(files, tmp_path / "downloads" / "RJ01234567")
+    downloader.create_plan_directories(plan)
+    plan.files[0].save_file.write_bytes(b"x" * 1000)
+    plan.files[1].save_file.write_bytes(b"x" * 10)  # 大小不符，不读取内容
+    library_index.record_job(plan, {f["path"] for f in files})  # MP3/2.mp3 不存在
+
+    report = library_verify.verify_library()
+    summary = report["summary"]
+    assert (summary["recorded"], summary["size_mismatch"], summary["missing"]) == (1, 1, 1)
+    assert summary["bytes"] == 1000
+    assert [(item["path"], item["status"]) for item in report["redownload"]] == [
+        ("MP3/1.mp3", "size_mismatch"), ("MP3/2.mp3", "missing")]
+    status = library_verify.get_status()
+    assert status["checked_bytes"] == status["total_bytes"] == 1000
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""上游请求预算：响应头解析、Retry-After 与限流上报"""
+
+import email.utils
+import time
+
+import pytest
+
+import config
+import rate_limit
+
+URL = "https://api.example.test/api/tracks/1"
+
+
+@pytest.fixture(autouse=True)
+def fresh_hosts(monkeypatch):
+    monkeypatch.setattr(config, "WORKER_MODE", "local")
+    monkeypatch.setattr(config, "RATE_LIMIT_BACKOFF", 5)
+    monkeypatch.setattr(config, "RATE_LIMIT_MAX_BACKOFF", 300)
+    monkeypatch.setattr(config, "API_ENDPOINT", "https://api.example.test")
+    monkeypatch.setattr(config, "API_RATE_LIMIT", (4, 8))
+    monkeypatch.setattr(config, "RATE_LIMIT_DEFAULT", None)
+    monkeypatch.setattr(config, "RATE_LIMITS", {})
+    rate_limit._hosts.clear()
+    yield
+    rate_limit._hosts.clear()
+
+
+def _blocked_for():
+    (host,) = rate_limit.snapshot()
+    return host["blocked_for"]
+
+
+def test_parse_headers_single_response():
+    data = b"HTTP/1.1 429 Too Many Requests\r\nRetry-After: 30\r\nContent-Type: text/plain\r\n\r\nbody"
+    status, headers, rest = rate_limit.parse_headers(data)
+    assert status == 429
+    assert headers == {"retry-after": "30", "content-type": "text/plain"}
+    assert rest == b"body"
+
+
+def test_parse_headers_keeps_last_redirect_block():
+    data = (b"HTTP/1.1 302 Found\r\nLocation: https://cdn.example.test/a\r\n\r\n"
+            b"HTTP/2 200\r\ncontent-length: 4\r\n\r\n")
+    status, headers, rest = rate_limit.parse_headers(data)
+    assert status == 200
+    assert headers == {"content-length": "4"}
+    assert rest == b""
+
+
+def test_parse_headers_without_headers():
+    assert rate_limit.parse_headers(b"{\"ok\": true}") == (None, {}, b"{\"ok\": true}")
+    assert rate_limit.parse_headers(b"HTTP/1.1 xyz\r\n\r\n")[0] is None
+
+
+def test_parse_retry_after():
+    now = time.time()
+    assert rate_limit.parse_retry_after("120") == 120.0
+    assert rate_limit.parse_retry_after(" 7 ") == 7.0
+    assert rate_limit.parse_retry_after(email.utils.formatdate(now + 60, usegmt=True), now) == pytest.approx(60, abs=1)
+    assert rate_limit.parse_retry_after(email.utils.formatdate(now - 60, usegmt=True), now) == 0.0
+    assert rate_limit.parse_retry_after("soon") is None
+    assert rate_limit.parse_retry_after("") is None
+    assert rate_limit.parse_retry_after(None) is None
+
+
+def test_report_uses_retry_after():
+    assert rate_limit.report(URL, 429, "30") is True
+    assert _blocked_for() == pytest.approx(30, abs=1)
+
+
+def test_report_backs_off_exponentially_and_caps(monkeypatch):
+    monkeypatch.setattr(config, "RATE_LIMIT_MAX_BACKOFF", 12)
+    rate_limit.report(URL, 429)
+    assert _blocked_for() == pytest.approx(5, abs=1)
+    rate_limit.report(URL, 429)
+    assert _blocked_for() == pytest.approx(10, abs=1)
+    rate_limit.report(URL, 429)
+    assert _blocked_for() == pytest.approx(12, abs=1)
+    assert rate_limit.snapshot()[0]["strikes"] == 3
+
+
+def test_report_ignores_ordinary_failures():
+    assert rate_limit.report(URL, None) is False
+    assert rate_limit.report(URL, 503) is False
+    assert rate_limit.report(URL, 404) is False
+    assert _blocked_for() == 0
+
+    assert rate_limit.report(URL, 503, "10") is True
+    assert rate_limit.report(URL, 200) is False
+    assert rate_limit.snapshot()[0]["strikes"] == 0
+
+
+def test_budget_take_and_share():
+    budget = rate_limit.HostBudget("api.example.test")
+    budget.total_rate, budget.total_burst = 4, 2
+    budget.rate, budget.burst, budget.tokens = 4, 2, 2.0
+    now = budget.updated
+    assert budget.take(now) == 0 and budget.take(now) == 0
+    assert budget.take(now) == pytest.approx(0.25)
+    budget.share(4)
+    assert (budget.rate, budget.burst) == (1, 1.0)
+
+
+def test_only_api_host_is_budgeted_by_default(monkeypatch):
+    api = rate_limit.HostBudget("api.example.test")
+    assert (api.rate, api.burst) == (4, 8)
+
+    media = rate_limit.HostBudget("media.example.test")
+    assert media.rate is None
+    assert all(media.take(media.updated) == 0 for _ in range(100))
+    media.share(4)
+    assert media.rate is None
+
+    monkeypatch.setattr(config, "RATE_LIMITS", {"media.example.test": (10, 20)})
+    assert rate_limit.HostBudget("media.example.test").rate == 10
+    monkeypatch.setattr(config, "RATE_LIMIT_DEFAULT", (1, 1))
+    assert rate_limit.HostBudget("cover.example.test").rate == 1
+
+
+def test_unlimited_host_still_honours_throttling():
+    media = "https://media.example.test/file.mp3"
+    assert rate_limit.acquire(media) is True
+    rate_limit.report(media, 429, "30")
+    assert rate_limit.acquire(media, cancelled=lambda: True) is False
+    (host,) = rate_limit.snapshot()
+    assert host["rate"] is None and host["tokens"] is None
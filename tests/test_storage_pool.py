@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""存储池：后台测量写入速度与根目录选择"""
+
+import threading
+
+import pytest
+
+import config
+import storage_pool
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool(monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_PROBE_BYTES", 1024 * 1024)
+    monkeypatch.setattr(config, "STORAGE_PROBE_INTERVAL", 3600)
+    monkeypatch.setattr(config, "DISK_SPACE_RESERVE", 0)
+    storage_pool._probes.clear()
+    storage_pool._active.clear()
+    yield
+    storage_pool._probes.clear()
+    storage_pool._active.clear()
+
+
+def _wait_for_probes():
+    for thread in threading.enumerate():
+        if thread.name.startswith("storage-probe"):
+            thread.join()
+
+
+def test_probe_runs_in_background_once_per_root(tmp_path, monkeypatch):
+    started = []
+    release = threading.Event()
+
+    def slow_measure(root):
+        started.append(root)
+        release.wait()
+        return 123.0
+
+    monkeypatch.setattr(storage_pool, "measure_throughput", slow_measure)
+    assert storage_pool.write_throughput(tmp_path) is None
+    assert storage_pool.write_throughput(tmp_path) is None
+    release.set()
+    _wait_for_probes()
+    assert started == [tmp_path]
+    assert storage_pool.write_throughput(tmp_path) == 123.0
+
+
+def test_measure_uses_unique_file_and_cleans_up(tmp_path):
+    assert storage_pool.measure_throughput(tmp_path / "new") > 0
+    assert list((tmp_path / "new").iterdir()) == []
+    (tmp_path / "file.txt").write_bytes(b"")
+    assert storage_pool.measure_throughput(tmp_path / "file.txt" / "sub") == 0.0
+
+
+def test_choose_root_without_measurements(tmp_path, monkeypatch):
+    roots = [tmp_path / "a", tmp_path / "b"]
+    monkeypatch.setattr(config, "STORAGE_ROOTS", roots)
+    monkeypatch.setattr(storage_pool, "measure_throughput", lambda root: 1.0)
+    storage_pool.begin_write(roots[0])
+    # 尚未测得速度时不等待测量，按正在写入的任务数选择
+    assert storage_pool.choose_root("RJ01234567", 0) == roots[1]
+    _wait_for_probes()
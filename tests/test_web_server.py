@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""Web 接口：暂停与继续的 job_id 参数"""
+
+import pytest
+
+import config
+import downloader
+import web_server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(config, "WORKER_MODE", "local")
+    downloader.paused_jobs.clear()
+    yield web_server.app.test_client()
+    downloader.paused_jobs.clear()
+    downloader.queue_running.set()
+
+
+@pytest.mark.parametrize("job_id", [3, "3", " 3 "])
+def test_pause_accepts_integer_job_id(client, job_id):
+    assert client.post("/api/pause", json={"job_id": job_id}).status_code == 200
+    assert downloader.paused_jobs == {3}
+    assert downloader.queue_running.is_set()
+    assert client.post("/api/resume", json={"job_id": job_id}).status_code == 200
+    assert downloader.paused_jobs == set()
+
+
+@pytest.mark.parametrize("job_id", ["abc", True, 1.5, [3]])
+def test_pause_rejects_invalid_job_id(client, job_id):
+    response = client.post("/api/pause", json={"job_id": job_id})
+    assert response.status_code == 400
+    assert downloader.paused_jobs == set() and downloader.queue_running.is_set()
+
+
+def test_pause_without_job_id_pauses_queue(client):
+    assert client.post("/api/pause").status_code == 200
+    assert not downloader.queue_running.is_set()
+    assert client.post("/api/resume").status_code == 200
+    assert downloader.queue_running.is_set()
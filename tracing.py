@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+性能追踪模块
+TRACE_ENABLED 打开后，各阶段（元数据请求、任务规划、curl 启动、DNS / 连接 / TLS / 首字节 / 传输、
+完整性校验、Web 请求、控制台日志）以时间段（span）记录在内存环形缓冲区中，
+可导出为 Chrome trace JSON（chrome://tracing 或 https://ui.perfetto.dev 打开）。
+时间戳基于系统时间，多个工作进程导出的文件可以合并查看。
+PROFILE_JOBS 打开后，每个下载任务在 cProfile 下运行，结束时将统计结果保存到 PROFILE_DIR。
+关闭时 span() 只做一次配置检查，几乎没有开销。
+"""
+
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+import orjson
+
+import config
+
+_PERF_ORIGIN = time.perf_counter()
+_EPOCH_ORIGIN = time.time()  # perf_counter 与系统时间的对应关系，用于生成跨进程一致的时间戳
+
+_lock = threading.Lock()
+_events = deque(maxlen=config.TRACE_MAX_EVENTS)
+_thread_names = {}  # 线程 ID -> 线程名（导出为 Chrome trace 元数据）
+_NULL = contextlib.nullcontext()
+
+
+# ============================================================
+# 记录
+# ============================================================
+
+def _timestamp(perf):
+    """将 perf_counter 值转换为 Chrome trace 时间戳（微秒）"""
+    return (_EPOCH_ORIGIN + perf - _PERF_ORIGIN) * 1e6
+
+
+def add_span(name, cat, start, end, **args):
+    """记录一个已结束的时间段
+
+    Args:
+        name: 名称
+        cat: 类别（job / file / curl / http / verify / web / log 等）
+        start, end: time.perf_counter() 值
+        args: 附加信息（job_id 用于按任务导出）
+    """
+    if not config.TRACE_ENABLED:
+        return
+    thread = threading.current_thread()
+    event = {"name": name, "cat": cat, "ph": "X", "ts": round(_timestamp(start), 1),
+             "dur": round((end - start) * 1e6, 1), "pid": os.getpid(), "tid": thread.ident, "args": args}
+    with _lock:
+        _events.append(event)
+        _thread_names.setdefault(thread.ident, thread.name)
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        add_span(self.name, self.cat, self.start, time.perf_counter(), **self.args)
+
+
+def span(name, cat="app", **args):
+    """记录 with 语句块的耗时，未启用追踪时返回空上下文"""
+    if not config.TRACE_ENABLED:
+        return _NULL
+    return _Span(name, cat, args)
+
+
+def traced(name, cat="app"):
+    """记录函数调用耗时的装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not config.TRACE_ENABLED:
+                return func(*args, **kwargs)
+            with _Span(name, cat, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# curl -w 输出的各阶段时间（秒，均从请求开始计时）
+CURL_TIMING_FORMAT = ("\\ntiming=%{time_namelookup},%{time_connect},%{time_appconnect},"
+                      "%{time_pretransfer},%{time_starttransfer},%{time_total}")
+
+
+def add_curl_phases(output, started, **args):
+    """根据 curl -w CURL_TIMING_FORMAT 的输出记录 DNS、连接、TLS、首字节与传输各阶段
+
+    Args:
+        output: curl 标准输出中响应头之后的部分
+        started: curl 进程启动完成时的 perf_counter 值
+    """
+    marker = output.rfind(b"timing=")
+    if marker < 0:
+        return
+    try:
+        dns, connect, tls, pretransfer, first_byte, total = (
+            float(value) for value in output[marker + 7:].split(b"\n")[0].split(b","))
+    except ValueError:
+        return
+    phases = (("dns", 0.0, dns), ("connect", dns, connect), ("tls", connect, tls),
+              ("wait", max(connect, tls, pretransfer), first_byte), ("transfer", first_byte, total))
+    for name, begin, end in phases:
+        if end > begin:
+            add_span(f"curl.{name}", "curl", started + begin, started + end, **args)
+
+
+# ============================================================
+# 导出
+# ============================================================
+
+def export_chrome_trace(job_id=None):
+    """导出 Chrome trace 格式的数据，指定 job_id 时只包含该任务的时间段"""
+    with _lock:
+        events = list(_events)
+        names = dict(_thread_names)
+    if job_id is not None:
+        events = [e for e in events if e["args"].get("job_id") == job_id]
+    pid = os.getpid()
+    metadata = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                for tid, name in names.items()]
+    return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+
+def dump_chrome_trace(path, job_id=None):
+    """将追踪数据写入文件，没有数据时不写入并返回 False"""
+    trace = export_chrome_trace(job_id)
+    if not any(event["ph"] == "X" for event in trace["traceEvents"]):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(trace))
+    return True
+
+
+def clear():
+    """清空已记录的时间段"""
+    with _lock:
+        _events.clear()
+
+
+# ============================================================
+# cProfile
+# ============================================================
+
+def new_profile():
+    """PROFILE_JOBS 打开时返回新的 cProfile.Profile（未启动），否则返回 None"""
+    return cProfile.Profile() if config.PROFILE_JOBS else None
+
+
+def profiling(profile):
+    """在 with 语句块中启用 profile（profile 为 None 时不做任何事）"""
+    return profile if profile is not None else _NULL
+
+
+def dump_profile(profile, name):
+    """保存 profile 的统计结果：.prof（pstats / snakeviz 读取）与按累计耗时排序的 .txt 摘要
+
+    Returns:
+        .prof 文件路径，profile 为 None 时返回 None
+    """
+    if profile is None:
+        return None
+    profile.disable()
+    config.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    stem = config.PROFILE_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}_{name}"
+    profile.dump_stats(f"{stem}.prof")
+    text = io.StringIO()
+    pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(40)
+    with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+        f.write(text.getvalue())
+    return f"{stem}.prof"
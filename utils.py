@@ -11,11 +11,14 @@ import sys
 import pathlib
 import re
 
+import config
+
 
 def get_curl_path():
     """查找 curl 可执行文件路径
 
     查找顺序：
+    0. 配置项 config.CURL_PATH 指定的路径
     1. 脚本同目录下的 curl.exe
     2. 打包后的资源目录下的 curl.exe
     3. 系统环境变量中的 curl
@@ -23,6 +26,9 @@ def get_curl_path():
     Returns:
         curl 可执行文件的完整路径或命令名
     """
+    if config.CURL_PATH:
+        return str(config.CURL_PATH)
+
     if getattr(sys, 'frozen', False):
         # 打包后的运行环境
         base_path = pathlib.Path(sys._MEIPASS)
@@ -70,6 +76,19 @@ def safe_path_part(part: str) -> str:
     return part or "_"
 
 
+def job_key(rj_id, save_path):
+    """返回任务的去重键：同一作品保存到同一目录的任务视为重复任务
+
+    Examples:
+        job_key("RJ01234567", "D:/ASMR") == job_key("01234567", "D:\\ASMR\\")
+    """
+    number = str(rj_id).upper().replace('RJ', '')
+    directory = str(pathlib.Path(save_path).expanduser().absolute())
+    if sys.platform == 'win32':
+        directory = directory.lower()
+    return number, directory
+
+
 def format_size(bytes):
     """将字节数转换为易读的文件大小字符串
 
@@ -91,5 +110,5 @@ def format_size(bytes):
     sizes = ['B', 'KB', 'MB', 'GB', 'TB']
     import math
 
-    i = int(math.floor(math.log(bytes, k))) if bytes > 0 else 0
+    i = min(int(math.floor(math.log(bytes, k))), len(sizes) - 1) if bytes > 0 else 0
     return f"{float(bytes / math.pow(k, i)):.2f} {sizes[i]}"
@@ -5,43 +5,60 @@
 # Flask Web 服务器模块
 # 提供 Web 界面 API 接口
 
-from flask import Flask, request, jsonify, render_template_string, send_file
+from flask import Flask, g, request, send_file, send_from_directory, stream_with_context
+import urllib.error
 import urllib.request
+import urllib.parse
+import orjson
 import logging
 import os
+import re
+import sys
+import pathlib
+import gzip
+import hashlib
+import mimetypes
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli  # 可选依赖，未安装时仅支持 gzip
+except ImportError:
+    brotli = None
 
 import config
 import downloader
+import file_filters
+import job_queue
+import library_index
+import library_verify
+import progress
+import progressive
+import rate_limit
+import storage_pool
+import tracing
+import utils
+import zip_stream
 from shared import LOG_MESSAGES, save_log, log_message
 
 # 初始化 Flask 应用
-app = Flask(__name__)
+app = Flask(__name__, static_folder=None)  # 静态资源由 /static/<带哈希的文件名> 路由提供
 app.config['JSON_AS_ASCII'] = False  # 允许中文直接显示
+app.config['USE_X_SENDFILE'] = config.USE_X_SENDFILE  # 本地文件交由前端服务器 sendfile 发送
 
 # ============================================================
-# 前端页面模板 (HTML + JavaScript + CSS)
+# 前端页面模板（样式与脚本位于 static 目录，启动时替换为带内容哈希的文件名）
 # ============================================================
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="zh-CN">
 <head>
-    <link rel="icon" type="image/x-icon" href="favicon.ico">
+    <link rel="icon" type="image/x-icon" href="/favicon.ico">
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <meta http-equiv="Cache-Control" content="no-cache, no-store, must-revalidate">
     <title>ASMRip - ASMR 本地下载器 - zimo</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <style>
-        body { font-family: 'Segoe UI', Roboto, sans-serif; background-color: #f3f4f6; }
-        .file-item:hover { background-color: #f9fafb; }
-        ::-webkit-scrollbar { width: 8px; }
-        ::-webkit-scrollbar-track { background: #f1f1f1; }
-        ::-webkit-scrollbar-thumb { background: #cbd5e1; border-radius: 4px; }
-        .progress-fill {
-            background: linear-gradient(90deg, #8b5cf6 0%, #a78bfa 100%);
-            transition: width 0.3s ease;
-        }
-    </style>
+    <link rel="stylesheet" href="__APP_CSS__">
 </head>
 <body class="text-gray-800 h-screen flex flex-col">
     <!-- 顶部导航栏 -->
@@ -81,6 +98,7 @@ HTML_TEMPLATE = """
                 <div class="flex gap-4">
                     <span id="currentFileProgress">等待开始...</span>
                     <span id="speedDisplay">0.00 KB/s</span>
+                    <span id="etaDisplay">剩余 --:--</span>
                 </div>
                 <span id="totalProgress">0.00%</span>
             </div>
@@ -108,9 +126,9 @@ HTML_TEMPLATE = """
                 <div>
                     <label class="block text-sm font-medium text-gray-700 mb-2">保存路径</label>
                     <div class="flex gap-2">
-                        <input type="text" id="savePath" value="./Download" readonly 
+                        <input type="text" id="savePath" value="" placeholder="./Download（存储池自动分配）" readonly 
                                class="flex-1 px-3 py-2 bg-gray-50 border border-gray-200 rounded text-sm text-gray-600">
-                        <button onclick="alert('请在启动程序的目录下手动修改 Download 文件夹位置，或使用默认路径。')" 
+                        <button onclick="alert('默认保存到 Download 文件夹；在 config.py 的 STORAGE_ROOTS 中配置多个目录后自动选择剩余空间足够、写入最快的目录。')" 
                                 class="px-3 py-2 bg-gray-100 hover:bg-gray-200 text-gray-600 rounded text-sm transition">设置</button>
                     </div>
                 </div>
@@ -119,23 +137,40 @@ HTML_TEMPLATE = """
                     <div class="flex gap-2">
                         <button onclick="startDownload()" id="btnStart"
                                 class="flex-1 py-3 bg-green-600 hover:bg-green-700 text-white font-bold rounded-lg shadow-lg shadow-green-200 transition-all disabled:opacity-50 disabled:cursor-not-allowed">开始下载</button>
+                        <button onclick="togglePause()" id="btnPause" disabled
+                                class="flex-1 py-3 bg-indigo-600 hover:bg-indigo-700 text-white font-bold rounded-lg shadow-lg transition-all disabled:opacity-50 disabled:cursor-not-allowed">暂停</button>
                         <button onclick="confirmStop()" id="btnStop" disabled
                                 class="flex-1 py-3 bg-red-500 hover:bg-red-600 text-white font-bold rounded-lg shadow-lg shadow-red-200 transition-all disabled:opacity-50 disabled:cursor-not-allowed">停止下载</button>
                     </div>
+                    <button onclick="exportZip()"
+                            class="w-full mt-2 py-2 bg-gray-100 hover:bg-gray-200 text-gray-700 font-medium rounded-lg transition-colors">打包下载 ZIP</button>
                 </div>
             </div>
 
             <!-- 右侧：文件列表 -->
             <div class="flex-1 bg-white rounded-xl shadow-sm border border-gray-100 flex flex-col overflow-hidden">
                 <div class="p-4 border-b border-gray-100 flex justify-between items-center bg-gray-50">
-                    <h3 class="font-bold text-gray-700">文件列表</h3>
-                    <div class="flex gap-2 text-sm">
+                    <div class="flex items-baseline gap-3">
+                        <h3 class="font-bold text-gray-700">文件列表</h3>
+                        <span id="selectionInfo" class="text-xs text-gray-500"></span>
+                    </div>
+                    <div class="flex gap-2 text-sm items-center">
+                        <select id="formatPreset" onchange="applyPreset()"
+                                class="px-2 py-1 bg-white border border-gray-200 rounded text-sm text-gray-600">
+                            <option value="">全部文件</option>
+                        </select>
+                        <span class="text-gray-300">|</span>
                         <button onclick="toggleAll(true)" class="text-indigo-600 hover:underline">全选</button>
                         <span class="text-gray-300">|</span>
                         <button onclick="toggleAll(false)" class="text-indigo-600 hover:underline">全不选</button>
                     </div>
                 </div>
-                <div id="fileList" class="flex-1 overflow-y-auto p-2 space-y-1"></div>
+                <!-- 虚拟列表：只渲染可见区域的行 -->
+                <div id="fileList" class="flex-1 overflow-y-auto p-2" onscroll="scheduleRender()">
+                    <div id="fileSpacer" class="relative">
+                        <div id="fileRows" class="absolute left-0 right-0 top-0" onclick="onFileRowClick(event)"></div>
+                    </div>
+                </div>
             </div>
         </div>
     </main>
@@ -191,266 +226,148 @@ HTML_TEMPLATE = """
     </div>
 
     <!-- JavaScript 交互逻辑 -->
-    <script>
-        let currentFiles = [];       // 当前加载的文件列表
-        let progressTimer = null;    // 进度更新定时器
-
-        // HTML 转义，防止 XSS 攻击
-        function escapeHtml(text) {
-            if (!text) return "";
-            return text.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;").replace(/'/g, "&#039;");
-        }
-
-        // 格式化网速显示
-        function formatSpeed(bytesPerSecond) {
-            if (bytesPerSecond === 0) return '0.00 B/s';
-            const k = 1024;
-            if (bytesPerSecond < k) {
-                return bytesPerSecond.toFixed(2) + ' B/s';
-            } else if (bytesPerSecond < k * k) {
-                return (bytesPerSecond / k).toFixed(2) + ' KB/s';
-            } else if (bytesPerSecond < k * k * k) {
-                return (bytesPerSecond / k / k).toFixed(2) + ' MB/s';
-            } else {
-                return (bytesPerSecond / k / k / k).toFixed(2) + ' GB/s';
-            }
-        }
-
-        // 获取作品信息
-        async function fetchWorkInfo() {
-            const rjId = document.getElementById('rjInput').value.trim().toUpperCase();
-            if (!rjId.startsWith('RJ')) { alert('请输入有效的 RJ 号'); return; }
-
-            const btn = document.getElementById('btnSearch');
-            btn.disabled = true;
-            btn.innerText = '加载中...';
-
-            try {
-                const res = await fetch(`/api/info/${rjId}`);
-                const data = await res.json();
-                if (data.error) { alert(data.error); return; }
-
-                // 显示封面
-                document.getElementById('workCover').src = `/api/image/${rjId}`;
-                document.getElementById('workCover').onload = () => {
-                    document.getElementById('workCover').classList.remove('hidden');
-                    document.getElementById('coverPlaceholder').classList.add('hidden');
-                };
-
-                // 显示作品信息
-                document.getElementById('workTitle').innerText = data.title;
-                document.getElementById('workId').innerText = data.id;
-                document.getElementById('workCircle').innerText = data.name;
-                document.getElementById('workArea').classList.remove('hidden');
-
-                // 获取文件列表
-                await fetchFileList(rjId);
-            } catch (e) { alert('网络请求失败'); console.error(e); }
-
-            btn.disabled = false;
-            btn.innerText = '搜索';
-        }
-
-        // 获取文件列表
-        async function fetchFileList(rjId) {
-            const res = await fetch(`/api/files/${rjId}`);
-            const data = await res.json();
-            currentFiles = data.files;
-            renderFiles(currentFiles);
-        }
-
-        // 渲染文件列表
-        function renderFiles(files) {
-            const container = document.getElementById('fileList');
-            container.innerHTML = '';
-            let totalSize = 0;
-            files.forEach(f => totalSize += f.size);
-            document.getElementById('workSize').innerText = formatSize(totalSize);
-
-            files.forEach((file, index) => {
-                const div = document.createElement('div');
-                div.className = 'file-item flex items-center gap-3 p-3 rounded-lg hover:bg-gray-50';
-                div.innerHTML = `
-                    <input type="checkbox" id="file-${index}" checked class="w-5 h-5 text-indigo-600 rounded">
-                    <div class="flex-1 min-w-0">
-                        <div class="text-sm font-medium text-gray-900 truncate" title="${escapeHtml(file.path)}">${escapeHtml(file.path)}</div>
-                    </div>
-                    <div class="text-xs text-gray-500 font-mono w-20 text-right">${formatSize(file.size)}</div>
-                `;
-                container.appendChild(div);
-            });
-        }
-
-        // 格式化文件大小
-        function formatSize(bytes) {
-            if (bytes === 0) return '0 B';
-            const k = 1024;
-            const sizes = ['B', 'KB', 'MB', 'GB'];
-            const i = Math.floor(Math.log(bytes) / Math.log(k));
-            return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
-        }
-
-        // 全选/取消全选
-        function toggleAll(checked) {
-            document.querySelectorAll('#fileList input[type="checkbox"]').forEach(cb => cb.checked = checked);
-        }
-
-        // 开始下载
-        async function startDownload() {
-            const checkboxes = document.querySelectorAll('#fileList input[type="checkbox"]:checked');
-            if (checkboxes.length === 0) { alert('请至少选择一个文件'); return; }
-
-            const selectedFiles = [];
-            checkboxes.forEach((cb, i) => { if (cb.checked) selectedFiles.push(currentFiles[i]); });
-
-            const rjId = document.getElementById('workId').innerText;
-            const savePath = document.getElementById('savePath')?.value || './Download';
-
-            const res = await fetch('/api/start', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({ rj_id: rjId, files: selectedFiles, save_path: savePath })
-            });
-
-            if (!res.ok) { alert('下载启动失败'); return; }
-
-            // 显示开始提示弹窗
-            document.getElementById('startModal').classList.remove('hidden');
-            document.getElementById('progressArea').classList.remove('hidden');
-
-            // 启动进度更新定时器
-            if (progressTimer) clearInterval(progressTimer);
-            progressTimer = setInterval(updateProgress, 1000);
-        }
-
-        // 确认停止下载弹窗
-        function confirmStop() { document.getElementById('stopModal').classList.remove('hidden'); }
-        function closeStopModal() { document.getElementById('stopModal').classList.add('hidden'); }
-        function closeStartModal() { document.getElementById('startModal').classList.add('hidden'); }
-
-        // 立即停止下载
-        async function stopDownload() {
-            closeStopModal();
-            await fetch('/api/stop_immediate', { method: 'POST' });
-            if (progressTimer) clearInterval(progressTimer);
-            progressTimer = null;
-            document.getElementById('progressArea').classList.add('hidden');
-            document.getElementById('progressBar').style.width = '0%';
-            document.getElementById('progressPercent').innerText = '0.00%';
-        }
-
-        // 更新下载进度显示
-        async function updateProgress() {
-            try {
-                const res = await fetch('/api/progress');
-                const data = await res.json();
-
-                if (data.total_percent !== undefined && data.total_percent > 0) {
-                    document.getElementById('progressBar').style.width = data.total_percent + '%';
-                    document.getElementById('progressPercent').innerText = data.total_percent.toFixed(2) + '%';
-                    document.getElementById('currentFileProgress').innerText = data.current_filename || '下载中...';
-
-                    // 网速转换与显示
-                    const speedBytes = (data.speed || 0) * 1024;
-                    document.getElementById('speedDisplay').innerText = formatSpeed(speedBytes);
-                    document.getElementById('totalProgress').innerText = '总进度: ' + data.total_percent.toFixed(2) + '%';
-                }
-            } catch (e) { console.error(e); }
-        }
-
-        // 检查下载状态
-        async function checkStatus() {
-            try {
-                const res = await fetch('/api/status');
-                const data = await res.json();
-
-                const startBtn = document.getElementById('btnStart');
-                const stopBtn = document.getElementById('btnStop');
-                const indicator = document.getElementById('statusIndicator');
-
-                if (data.downloading) {
-                    // 下载中状态
-                    startBtn.disabled = true;
-                    startBtn.classList.add('opacity-50', 'cursor-not-allowed');
-                    stopBtn.disabled = false;
-                    stopBtn.classList.remove('opacity-50', 'cursor-not-allowed');
-                    indicator.className = 'px-3 py-1 rounded-full text-xs font-medium bg-green-100 text-green-600';
-                    indicator.innerText = '下载中';
-                } else {
-                    // 空闲状态
-                    startBtn.disabled = false;
-                    startBtn.classList.remove('opacity-50', 'cursor-not-allowed');
-                    stopBtn.disabled = true;
-                    stopBtn.classList.add('opacity-50', 'cursor-not-allowed');
-                    indicator.className = 'px-3 py-1 rounded-full text-xs font-medium bg-gray-100 text-gray-500';
-                    indicator.innerText = '空闲';
-
-                    if (progressTimer) {
-                        clearInterval(progressTimer);
-                        progressTimer = null;
-                    }
-
-                    // 检查是否刚完成
-                    const finishRes = await fetch('/api/finish_check');
-                    const finishData = await finishRes.json();
-                    if (finishData.just_finished) {
-                        showFinishModal(finishData);
-                    }
-                }
-            } catch (e) { console.error(e); }
-        }
-
-        // 显示下载完成弹窗
-        function showFinishModal(data) {
-            document.getElementById('finishTotal').innerText = data.total;
-            document.getElementById('finishSuccess').innerText = data.success;
-            document.getElementById('finishFailed').innerText = data.failed;
-
-            const failedList = document.getElementById('finishFailedList');
-            if (data.failed_list && data.failed_list.length > 0) {
-                failedList.classList.remove('hidden');
-                failedList.innerHTML = '<p class="font-medium mb-1">失败列表:</p>' + 
-                    data.failed_list.map(f => `<p>• ${f[0]}: ${f[1]}</p>`).join('');
-            } else {
-                failedList.classList.add('hidden');
-            }
-
-            document.getElementById('finishModal').classList.remove('hidden');
-        }
-
-        // 关闭完成弹窗
-        function closeFinishModal() {
-            document.getElementById('finishModal').classList.add('hidden');
-            document.getElementById('progressArea').classList.add('hidden');
-            document.getElementById('progressBar').style.width = '0%';
-            document.getElementById('progressPercent').innerText = '0.00%';
-        }
-
-        // 清空界面
-        function clearUI() {
-            document.getElementById('rjInput').value = '';
-            document.getElementById('workArea').classList.add('hidden');
-            document.getElementById('fileList').innerHTML = '';
-            document.getElementById('progressArea').classList.add('hidden');
-            document.getElementById('progressBar').style.width = '0%';
-            currentFiles = [];
-            if (progressTimer) clearInterval(progressTimer);
-            progressTimer = null;
-        }
-
-        // 导出日志
-        async function exportLog() {
-            window.open('/api/export_log', '_blank');
-        }
-
-        // 定期检查状态
-        setInterval(checkStatus, 1000);
-    </script>
+    <script src="__APP_JS__"></script>
 </body>
 </html>
 """
 
 
+# ============================================================
+# JSON 响应
+# ============================================================
+
+def json_response(data, status=200):
+    """使用 orjson 序列化并返回 JSON 响应（中文直接输出，不转义）"""
+    return app.response_class(orjson.dumps(data), status=status, mimetype='application/json')
+
+
+COMPRESS_MIN_SIZE = 1024  # 小于该字节数的响应不压缩
+COMPRESS_CACHE_SIZE = 32  # 压缩结果缓存条目数
+_compress_cache = OrderedDict()  # (内容摘要, 编码) -> 压缩后的数据
+_compress_lock = threading.Lock()
+
+
+def _choose_encoding():
+    """根据 Accept-Encoding 选择压缩方式，优先 brotli"""
+    accept = request.accept_encodings
+    if brotli is not None and accept.quality('br') > 0:
+        return 'br'
+    if accept.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def _compress(digest, encoding, body):
+    """压缩响应体，按内容摘要缓存结果避免重复压缩"""
+    key = (digest, encoding)
+    with _compress_lock:
+        if key in _compress_cache:
+            _compress_cache.move_to_end(key)
+            return _compress_cache[key]
+
+    if encoding == 'br':
+        data = brotli.compress(body, quality=5)
+    else:
+        data = gzip.compress(body, compresslevel=6)
+
+    with _compress_lock:
+        _compress_cache[key] = data
+        while len(_compress_cache) > COMPRESS_CACHE_SIZE:
+            _compress_cache.popitem(last=False)
+    return data
+
+
+def cached_json_response(data):
+    """返回带强 ETag 的 JSON 响应，支持 304 与 gzip/brotli 压缩"""
+    return cached_response(orjson.dumps(data), 'application/json')
+
+
+def cached_response(body, mimetype, digest=None, cache_control='no-cache'):
+    """返回带强 ETag 的响应，支持 304 与 gzip/brotli 压缩
+
+    ETag 由未压缩的内容计算；不同压缩方式的响应使用带后缀的 ETag，
+    客户端携带任一版本的 ETag 请求时，内容未变即返回 304 Not Modified。
+
+    Args:
+        digest: 预先计算的内容摘要（静态资源启动时计算一次），为 None 时按内容计算
+    """
+    digest = digest or hashlib.sha1(body).hexdigest()
+    encoding = _choose_encoding() if len(body) >= COMPRESS_MIN_SIZE else None
+    etag = f"{digest}-{encoding}" if encoding else digest
+
+    # If-None-Match 使用弱比较，忽略压缩方式后缀
+    if any(tag.split('-')[0] == digest for tag in request.if_none_match.as_set()) or request.if_none_match.star_tag:
+        response = app.response_class(status=304)
+    else:
+        if encoding:
+            body = _compress(digest, encoding, body)
+        response = app.response_class(body, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+# ============================================================
+# 静态资源（内容哈希文件名 + 长期缓存）
+# ============================================================
+
+if getattr(sys, 'frozen', False):
+    # 打包后的运行环境
+    STATIC_DIR = pathlib.Path(sys._MEIPASS) / "static"
+else:
+    # 开发环境
+    STATIC_DIR = pathlib.Path(__file__).parent / "static"
+
+STATIC_MIMETYPES = {".css": "text/css", ".js": "text/javascript"}
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"  # 文件名随内容变化，可永久缓存
+
+
+def load_static_assets():
+    """读取静态资源并生成带内容哈希的文件名，同时生成最终的页面 HTML
+
+    Returns:
+        ({带哈希的文件名: (内容, 摘要, MIME 类型)}, 页面 HTML 字节串)
+    """
+    assets = {}
+    html = HTML_TEMPLATE
+    for name, placeholder in (("app.css", "__APP_CSS__"), ("app.js", "__APP_JS__")):
+        body = (STATIC_DIR / name).read_bytes()
+        digest = hashlib.sha1(body).hexdigest()
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{digest[:12]}{ext}"
+        assets[hashed] = (body, digest, STATIC_MIMETYPES[ext])
+        html = html.replace(placeholder, f"/static/{hashed}")
+    return assets, html.encode('utf-8')
+
+
+STATIC_ASSETS, INDEX_HTML = load_static_assets()
+INDEX_DIGEST = hashlib.sha1(INDEX_HTML).hexdigest()
+
+
+# ============================================================
+# 请求耗时追踪（TRACE_ENABLED 打开时）
+# ============================================================
+
+@app.before_request
+def _trace_request_start():
+    g.trace_start = time.perf_counter() if config.TRACE_ENABLED else None
+
+
+@app.after_request
+def _trace_request_end(response):
+    # 流式响应只统计到开始发送为止
+    start = g.get('trace_start')
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule else request.path
+        tracing.add_span(f"{request.method} {rule}", "web", start, time.perf_counter(),
+                         status=response.status_code)
+    return response
+
+
 # ============================================================
 # Flask API 接口路由
 # ============================================================
@@ -458,22 +375,57 @@ HTML_TEMPLATE = """
 # 主页
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    # 页面启动时已生成，每次请求只需 ETag 校验（资源更新后文件名变化，页面需重新验证）
+    return cached_response(INDEX_HTML, 'text/html', INDEX_DIGEST)
+
+
+# 带内容哈希的静态资源
+@app.route('/static/<name>')
+def static_asset(name):
+    asset = STATIC_ASSETS.get(name)
+    if asset is None:
+        return json_response({"error": "not found"}, status=404)
+    body, digest, mimetype = asset
+    return cached_response(body, mimetype, digest, STATIC_CACHE_CONTROL)
+
+
+# 网站图标
+@app.route('/favicon.ico')
+def favicon():
+    return send_from_directory(STATIC_DIR.parent, "icon.ico", mimetype='image/x-icon', max_age=86400)
 
 
 # 获取作品信息
 @app.route('/api/info/<rj_id>')
 def get_info(rj_id):
     data = downloader.get_work_info(rj_id)
-    if data: return jsonify(data)
-    return jsonify({"error": "获取作品信息失败"})
+    if data: return cached_json_response(data)
+    return json_response({"error": "获取作品信息失败"})
 
 
 # 获取文件列表
 @app.route('/api/files/<rj_id>')
 def get_files(rj_id):
     files = downloader.get_file_list(rj_id)
-    return jsonify({"files": files})
+    data = {"files": files}
+    # tree=1 时附带目录树（文件夹大小与文件数），界面据此按需展开
+    if request.args.get('tree'):
+        data["tree"] = downloader.build_file_tree(files)
+    # 指定 filter 时附带按规则预选的文件路径，供界面勾选
+    preset = request.args.get('filter')
+    if preset:
+        try:
+            selected, _ = file_filters.select_files(files, preset)
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+        data["selected"] = [f["path"] for f in selected]
+    return cached_json_response(data)
+
+
+# 可用的文件选择预设
+@app.route('/api/format_presets')
+def get_format_presets():
+    return json_response({"presets": config.FORMAT_PRESETS, "default": config.DEFAULT_FORMAT_PRESET})
 
 
 # 获取封面图片
@@ -485,10 +437,15 @@ def get_cover_image(rj_id):
         cover_url = info.get('mainCoverUrl') or info.get('thumbnailCoverUrl')
         if not cover_url: return "No Cover URL found", 404
 
-        # 代理请求封面图片
+        # 代理请求封面图片（与下载共享上游请求预算）
+        rate_limit.acquire(cover_url)
         req = urllib.request.Request(cover_url, headers={'User-Agent': 'Mozilla/5.0'})
-        with urllib.request.urlopen(req) as response:
-            img_data = response.read()
+        try:
+            with urllib.request.urlopen(req) as response:
+                img_data = response.read()
+        except urllib.error.HTTPError as e:
+            rate_limit.report(cover_url, e.code, e.headers.get('Retry-After'))
+            raise
         return app.response_class(img_data, mimetype='image/jpeg')
     except Exception as e:
         log_message("ERROR", f"获取封面失败: {e}")
@@ -496,45 +453,352 @@ def get_cover_image(rj_id):
 
 
 # 提交下载任务
+def prepare_task(payload):
+    """整理提交的任务：未提供文件列表时获取完整列表，并应用文件选择规则
+
+    Raises:
+        ValueError: 筛选规则无效或无法获取文件列表
+    """
+    files = payload.get('files')
+    rules = payload.get('filter')
+    if files is None:
+        # 未指定文件时下载整个作品，默认预设只在这种情况下生效（不覆盖用户手动勾选的结果）
+        files = downloader.get_file_list(payload['rj_id'])
+        if not files:
+            raise ValueError(f"无法获取文件列表: {payload['rj_id']}")
+        rules = payload.get('filter', config.DEFAULT_FORMAT_PRESET)
+    selected, skipped = file_filters.select_files(files, rules)
+    if skipped:
+        log_message("TASK", f"[{payload['rj_id']}] 按筛选规则跳过 {len(skipped)} 个文件，"
+                            f"共 {utils.format_size(sum(f['size'] for f in skipped))}")
+    return {
+        "rj_id": payload['rj_id'],
+        "files": selected,
+        "save_path": payload.get('save_path') or str(config.DEFAULT_DOWNLOAD_DIR),
+    }
+
+
+def submit_task(task, priority=0):
+    """将任务加入下载队列，返回响应数据
+
+    同一作品保存到同一目录的任务尚未结束时合并到已有任务，返回已有任务的 ID（status 为 merged）。
+    priority 只在 pool 模式下生效。
+    """
+    if config.WORKER_MODE == "pool":
+        job_id, added, merged = job_queue.enqueue_job(task, priority)
+    else:
+        job_id, added, merged = downloader.submit_task(task)
+    if merged:
+        log_message("TASK", f"任务 #{job_id} 已在队列中: {task['rj_id']}, 合并新文件 {added} 个")
+        return {"status": "merged", "job_id": job_id, "files": added}
+    log_message("TASK", f"下载任务已提交: {task['rj_id']}, 文件数: {added}, 任务 ID: {job_id}")
+    return {"status": "queued", "job_id": job_id, "files": added}
+
+
 @app.route('/api/start', methods=['POST'])
 def start_download_api():
+    try:
+        task = prepare_task(request.json)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    if not task['files']:
+        return json_response({"error": "筛选后没有需要下载的文件"}, status=400)
+    return json_response(submit_task(task))
+
+
+# 批量提交任务：{"rj_ids": [...], "save_path": "...", "filter": "prefer_flac"}
+@app.route('/api/start_batch', methods=['POST'])
+def start_batch_api():
     payload = request.json
-    downloader.task_queue.put(payload)
-    log_message("TASK", f"下载任务已提交: {payload['rj_id']}, 文件数: {len(payload['files'])}")
-    return jsonify({"status": "queued"})
+    results = []
+    for rj_id in payload.get('rj_ids', []):
+        try:
+            task = prepare_task({"rj_id": rj_id, "save_path": payload.get('save_path'),
+                                 "filter": payload.get('filter', config.DEFAULT_FORMAT_PRESET)})
+            if not task['files']:
+                raise ValueError("筛选后没有需要下载的文件")
+            results.append({"rj_id": rj_id, **submit_task(task)})
+        except ValueError as e:
+            results.append({"rj_id": rj_id, "status": "error", "error": str(e)})
+    return json_response({"results": results})
 
 
 # 停止下载（温和）
 @app.route('/api/stop', methods=['POST'])
 def stop_download_api():
+    if config.WORKER_MODE == "pool":
+        job_queue.cancel_jobs()
     downloader.stop_download(immediately=False)
-    return jsonify({"status": "stop_signal_sent"})
+    return json_response({"status": "stop_signal_sent"})
 
 
 # 立即停止下载
 @app.route('/api/stop_immediate', methods=['POST'])
 def stop_download_immediate_api():
+    if config.WORKER_MODE == "pool":
+        job_queue.cancel_jobs()
     downloader.stop_download(immediately=True)
-    return jsonify({"status": "stop_immediate_sent"})
+    return json_response({"status": "stop_immediate_sent"})
+
+
+def _job_id_arg():
+    """读取请求中的 job_id 并转换为整数（未指定时为 None）
+
+    Raises:
+        ValueError: job_id 不是整数（任务 ID 为整数，字符串形式的 ID 无法匹配任何任务）
+    """
+    job_id = (request.get_json(silent=True) or {}).get('job_id')
+    if job_id is None:
+        return None
+    if isinstance(job_id, bool) or not isinstance(job_id, (int, str)):
+        raise ValueError("job_id 必须是整数")
+    try:
+        return int(job_id)
+    except ValueError:
+        raise ValueError("job_id 必须是整数")
+
+
+# 暂停下载：{"job_id": 任务 ID}，未指定时暂停整个队列（保留已下载部分）
+@app.route('/api/pause', methods=['POST'])
+def pause_download_api():
+    try:
+        job_id = _job_id_arg()
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    if config.WORKER_MODE == "pool":
+        job_queue.pause_jobs(job_id)
+    else:
+        downloader.pause_download(job_id)
+    return json_response({"status": "paused", "job_id": job_id})
+
+
+# 继续下载：{"job_id": 任务 ID}，未指定时继续整个队列
+@app.route('/api/resume', methods=['POST'])
+def resume_download_api():
+    try:
+        job_id = _job_id_arg()
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    if config.WORKER_MODE == "pool":
+        job_queue.resume_jobs(job_id)
+    else:
+        downloader.resume_download(job_id)
+    return json_response({"status": "resumed", "job_id": job_id})
+
+
+# ============================================================
+# 任务 API v2（pool 模式的任务保存在共享队列数据库中；本地模式的任务只保存在内存中，
+# 支持创建、列表、详情与取消，重新下载和优先级只在 pool 模式下可用）
+# ============================================================
+
+JOB_STATUSES = ("queued", "running", "paused", "done", "cancelled")
+FILE_STATUSES = ("pending", "running", "done", "failed")
+POOL_ACTIONS = ("retry", "priority")
+
+
+def job_store():
+    """当前模式下保存任务的模块（job_queue 或 downloader，两者的查询接口相同）"""
+    return job_queue if config.WORKER_MODE == "pool" else downloader
+
+
+def _create_job(payload):
+    """创建单个任务，返回结果字典（失败时 status 为 error）"""
+    rj_id = payload.get('rj_id') if isinstance(payload, dict) else None
+    if not rj_id:
+        return {"rj_id": rj_id, "status": "error", "error": "缺少 rj_id"}
+    try:
+        priority = int(payload.get('priority', 0))
+        task = prepare_task(payload)
+        if not task['files']:
+            raise ValueError("筛选后没有需要下载的文件")
+    except (TypeError, ValueError) as e:
+        return {"rj_id": rj_id, "status": "error", "error": str(e)}
+    return {"rj_id": rj_id, **submit_task(task, priority)}
+
+
+# 创建任务：单个 {"rj_id", "files"?, "filter"?, "save_path"?, "priority"?} 或批量 {"jobs": [...]}
+@app.route('/api/v2/jobs', methods=['POST'])
+def create_jobs_v2():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return json_response({"error": "请求体必须是 JSON 对象"}, status=400)
+    if 'jobs' in payload:
+        if not isinstance(payload['jobs'], list):
+            return json_response({"error": "jobs 必须是数组"}, status=400)
+        return json_response({"results": [_create_job(item) for item in payload['jobs']]})
+    result = _create_job(payload)
+    return json_response(result, status=400 if result['status'] == "error" else 201)
+
+
+# 任务列表：?status=queued,running&rj_id=&updated_since=&cursor=&limit=（按任务 ID 倒序，游标分页）
+@app.route('/api/v2/jobs')
+def list_jobs_v2():
+    args = request.args
+    statuses = [s for s in args.get('status', '').split(',') if s]
+    if any(s not in JOB_STATUSES for s in statuses):
+        return json_response({"error": f"status 只能是 {', '.join(JOB_STATUSES)}"}, status=400)
+    try:
+        limit = min(max(int(args.get('limit', config.JOBS_PAGE_SIZE)), 1), config.JOBS_PAGE_MAX)
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        updated_since = float(args['updated_since']) if args.get('updated_since') else None
+    except ValueError:
+        return json_response({"error": "limit、cursor、updated_since 必须是数字"}, status=400)
+    now = time.time()
+    jobs, next_cursor = job_store().list_jobs(statuses, args.get('rj_id'), updated_since, cursor, limit)
+    return json_response({"jobs": jobs, "next_cursor": next_cursor, "now": round(now, 3)})
+
+
+# 任务详情与每个文件的状态：?files=failed 只返回指定状态的文件
+@app.route('/api/v2/jobs/<int:job_id>')
+def get_job_v2(job_id):
+    file_status = request.args.get('files')
+    if file_status and file_status not in FILE_STATUSES:
+        return json_response({"error": f"files 只能是 {', '.join(FILE_STATUSES)}"}, status=400)
+    job = job_store().get_job(job_id, file_status)
+    if job is None:
+        return json_response({"error": "任务不存在"}, status=404)
+    return json_response(job)
+
+
+def _apply_job_action(action, job_ids, payload):
+    """执行任务操作，返回实际生效的任务 ID 列表
+
+    Raises:
+        ValueError: 操作或参数无效
+    """
+    if action == "cancel":
+        if config.WORKER_MODE != "pool":
+            return downloader.cancel_jobs(job_ids)
+        return job_queue.cancel_job_ids(job_ids)
+    if action == "retry":
+        return job_queue.retry_failed(job_ids)
+    if action == "priority":
+        try:
+            priority = int(payload['priority'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("priority 必须是整数")
+        return job_queue.set_priority(job_ids, priority)
+    raise ValueError(f"未知操作: {action}（可用 cancel / retry / priority）")
+
+
+# 单个任务操作：cancel 取消、retry 重新下载失败的文件、priority 调整优先级 {"priority": n}
+def _pool_action_error(action):
+    """本地模式下请求 pool 模式专用的操作时返回 409 响应，否则返回 None"""
+    if action in POOL_ACTIONS and config.WORKER_MODE != "pool":
+        return json_response({"error": f'{action} 需要 pool 模式（config.WORKER_MODE = "pool"），'
+                                        f'本地模式只支持 cancel'}, status=409)
+    return None
+
+
+@app.route('/api/v2/jobs/<int:job_id>/<action>', methods=['POST'])
+def job_action_v2(job_id, action):
+    error = _pool_action_error(action)
+    if error is not None:
+        return error
+    if job_store().get_job_status(job_id) is None:
+        return json_response({"error": "任务不存在"}, status=404)
+    try:
+        updated = _apply_job_action(action, [job_id], request.get_json(silent=True) or {})
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    return json_response({"job_id": job_id, "updated": bool(updated)})
+
+
+# 批量任务操作：{"ids": [...], "priority"?}，返回实际生效的任务 ID
+@app.route('/api/v2/jobs/<action>', methods=['POST'])
+def bulk_job_action_v2(action):
+    error = _pool_action_error(action)
+    if error is not None:
+        return error
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get('ids')
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return json_response({"error": "ids 必须是任务 ID 数组"}, status=400)
+    try:
+        updated = _apply_job_action(action, ids, payload)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    return json_response({"updated": updated})
+
+
+# 上游请求预算与限流状态（按主机）
+@app.route('/api/rate_limits')
+def rate_limits_api():
+    return json_response({"hosts": rate_limit.snapshot()})
+
+
+# 存储池各根目录的剩余空间、写入速度与正在写入的任务数
+@app.route('/api/storage')
+def storage_api():
+    return json_response({"roots": storage_pool.status()})
 
 
 # 获取下载状态
 @app.route('/api/status')
 def get_status():
-    return jsonify({"downloading": downloader.get_status()})
+    if config.WORKER_MODE == "pool":
+        return json_response({"downloading": job_queue.has_active_jobs(), "paused": job_queue.has_paused_jobs()})
+    return json_response({"downloading": downloader.get_status(),
+                          "paused": downloader.is_paused(downloader.current_job_id)})
 
 
 # 获取下载进度
 @app.route('/api/progress')
 def get_progress():
+    if config.WORKER_MODE == "pool":
+        return json_response(job_queue.get_progress())
     progress = downloader.get_progress()
-    return jsonify(progress)
+    return json_response(progress)
+
+
+# 导出追踪数据（Chrome trace JSON）：?job_id= 只导出指定任务
+@app.route('/api/trace')
+def export_trace():
+    job_id = request.args.get('job_id', type=int)
+    response = json_response(tracing.export_chrome_trace(job_id))
+    name = f"trace_job{job_id}.json" if job_id is not None else "trace.json"
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
+
+# 开关追踪与性能分析：{"enabled": true, "profile": false, "clear": true}
+# （只影响本进程，pool 工作进程使用 config.py 或 worker.py --trace / --profile）
+@app.route('/api/trace', methods=['POST'])
+def configure_trace():
+    payload = request.get_json(silent=True) or {}
+    if 'enabled' in payload:
+        config.TRACE_ENABLED = bool(payload['enabled'])
+    if 'profile' in payload:
+        config.PROFILE_JOBS = bool(payload['profile'])
+    if payload.get('clear'):
+        tracing.clear()
+    return json_response({"enabled": config.TRACE_ENABLED, "profile": config.PROFILE_JOBS})
+
+
+# 获取各任务与各传输的详细进度
+@app.route('/api/transfers')
+def get_transfers():
+    if config.WORKER_MODE == "pool":
+        return json_response({"workers": job_queue.live_workers()})
+    return json_response(progress.snapshot())
+
+
+# 获取工作进程列表（pool 模式）
+@app.route('/api/workers')
+def get_workers():
+    if config.WORKER_MODE != "pool":
+        return json_response({"workers": []})
+    return json_response({"workers": job_queue.live_workers()})
 
 
 # 检查是否刚完成下载
 @app.route('/api/finish_check')
 def finish_check():
     """查询下载是否刚完成，如果是则返回结果"""
+    if config.WORKER_MODE == "pool":
+        if job_queue.has_active_jobs():
+            return json_response({"just_finished": False})
+        return json_response(job_queue.pop_finished_summary() or {"just_finished": False})
     if not downloader.is_downloading:
         with downloader.stats_lock:
             # 只有 pending_finish 为 True 时才返回结果
@@ -545,12 +809,150 @@ def finish_check():
                     "success": downloader.download_stats["success_files"],
                     "failed": downloader.download_stats["failed_files"],
                     "failed_list": downloader.download_stats["failed_list"],
-                    "stopped_by_user": downloader.download_stats.get("stopped_by_user", False)
+                    "stopped_by_user": downloader.download_stats.get("stopped_by_user", False),
+                    "dedupe_files": downloader.download_stats["dedupe_files"],
+                    "dedupe_bytes": downloader.download_stats["dedupe_bytes"]
                 }
                 # 清除标志，避免重复显示
                 downloader.download_stats["pending_finish"] = False
-                return jsonify(result)
-    return jsonify({"just_finished": False})
+                return json_response(result)
+    return json_response({"just_finished": False})
+
+
+def get_work_dir(rj_id):
+    """根据 RJ 号返回存储池中的作品文件夹，RJ 号无效时返回 None"""
+    match = re.fullmatch(r'(?i)(?:RJ)?(\d+)', rj_id.strip())
+    if not match:
+        return None
+    work_name = f"RJ{match.group(1)}"
+    return storage_pool.find_work(work_name) or config.DEFAULT_DOWNLOAD_DIR / work_name
+
+
+# 打包下载已完成的作品（流式 ZIP）
+@app.route('/api/export_zip/<rj_id>')
+def export_zip(rj_id):
+    work_dir = get_work_dir(rj_id)
+    if work_dir is None or not work_dir.is_dir():
+        return json_response({"error": "作品尚未下载"}, status=404)
+
+    log_message("TASK", f"开始打包下载: {work_dir.name}")
+    response = app.response_class(
+        stream_with_context(zip_stream.iter_zip(work_dir, work_dir.name)),
+        mimetype='application/zip'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="{work_dir.name}.zip"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# 列出已下载作品的文件
+@app.route('/api/library/files/<rj_id>')
+def library_files(rj_id):
+    work_dir = get_work_dir(rj_id)
+    if work_dir is None or not work_dir.is_dir():
+        return json_response({"error": "作品尚未下载"}, status=404)
+    files = []
+    for full_path, relative in zip_stream.list_files(work_dir):
+        path = f"{work_dir.name}/{relative}"
+        files.append({"path": path, "size": os.path.getsize(full_path), "url": f"/api/library/file/{urllib.parse.quote(path)}"})
+    return json_response({"files": files})
+
+
+# 读取下载目录中的文件（支持 Range 断点与拖动播放、If-Modified-Since 与 ETag 校验）
+@app.route('/api/library/file/<path:relative_path>')
+def library_file(relative_path):
+    # send_from_directory 会拒绝目录穿越，并通过服务器的 wsgi.file_wrapper 发送文件
+    return send_from_directory(
+        storage_pool.root_for(relative_path), relative_path,
+        conditional=True, etag=True, max_age=config.LIBRARY_FILE_MAX_AGE
+    )
+
+
+# 边下边播：下载中的文件按 Range 返回已写入的部分，尚未到达的数据等待下载，并请求优先下载该文件；
+# 不在下载中的文件按 /api/library/file 处理
+@app.route('/api/library/stream/<path:relative_path>')
+def library_stream(relative_path):
+    entry = progressive.locate(relative_path)
+    if entry is None:
+        return library_file(relative_path)
+    progressive.prioritize(entry)
+    if not entry["started"]:
+        # 任务尚未被工作进程领取，保存位置未确定；已请求优先下载，客户端稍后重试
+        response = json_response({"error": "文件尚未开始下载", "job_id": entry["job_id"]}, status=503)
+        response.headers['Retry-After'] = str(config.HEARTBEAT_INTERVAL)
+        return response
+
+    total = entry["item"].size
+    start, stop, status = 0, total, 200
+    if request.range is not None:
+        byte_range = request.range.range_for_length(total)
+        if byte_range is None:
+            response = json_response({"error": "请求的范围无效"}, status=416)
+            response.headers['Content-Range'] = f"bytes */{total}"
+            return response
+        start, stop = byte_range
+        status = 206
+
+    response = app.response_class(
+        stream_with_context(progressive.iter_range(entry, start, stop - 1)), status=status,
+        mimetype=mimetypes.guess_type(relative_path)[0] or 'application/octet-stream'
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    # 只有请求的范围已全部写入时才声明长度，否则使用分块传输（下载中断时响应提前结束，不会少于声明的长度）
+    if progressive.written_bytes(entry) >= stop:
+        response.headers['Content-Length'] = str(stop - start)
+    if status == 206:
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{total}"
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# 检索作品库索引（RJ 号、标题、社团、原始文件路径）
+@app.route('/api/library/search')
+def library_search():
+    query = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', config.LIBRARY_SEARCH_LIMIT)), 500))
+    except ValueError:
+        limit = config.LIBRARY_SEARCH_LIMIT
+    began = time.perf_counter()
+    results = library_index.search(query, limit)
+    return json_response({"results": results, "count": len(results),
+                          "took_ms": round((time.perf_counter() - began) * 1000, 2)})
+
+
+# 作品库统计（作品数、文件数、跨作品去重节省的流量与磁盘空间）
+@app.route('/api/library/stats')
+def library_stats():
+    return json_response(library_index.stats())
+
+
+# 重新扫描下载目录（后台执行）
+@app.route('/api/library/rescan', methods=['POST'])
+def library_rescan():
+    threading.Thread(target=library_index.rescan_and_log, daemon=True).start()
+    return json_response({"success": True})
+
+
+# 校验作品库文件完整性（后台执行）：{"rj_ids": [...], "manifest": "清单文件路径", "rescan": true}
+@app.route('/api/library/verify', methods=['POST'])
+def library_verify_start():
+    payload = request.get_json(silent=True) or {}
+    manifest = payload.get('manifest')
+    if manifest:
+        try:
+            manifest = library_verify.resolve_manifest(str(manifest))
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+    if library_verify.start_verify(payload.get('rj_ids'), manifest, payload.get('rescan', True)) is None:
+        return json_response({"error": "校验正在进行中"}, status=409)
+    return json_response({"success": True}, status=202)
+
+
+# 校验进度与结果（report.redownload 为需要重新下载的文件列表）
+@app.route('/api/library/verify')
+def library_verify_status():
+    return json_response(library_verify.get_status())
 
 
 # 导出日志文件
@@ -572,5 +974,17 @@ def run_flask():
     # 抑制 werkzeug 日志
     log = logging.getLogger('werkzeug')
     log.setLevel(logging.ERROR)
+
+    if config.WSGI_SERVER == "waitress":
+        try:
+            from waitress import serve
+        except ImportError:
+            log_message("WARNING", "未安装 waitress，改用 Flask 开发服务器")
+        else:
+            log_message("SYSTEM", f"Waitress 服务启动: http://{config.HOST}:{config.PORT} (线程数 {config.WSGI_THREADS})")
+            serve(app, host=config.HOST, port=config.PORT, threads=config.WSGI_THREADS,
+                  connection_limit=config.WSGI_CONNECTION_LIMIT, _quiet=True)
+            return
+
     log_message("SYSTEM", f"Flask 服务启动: http://{config.HOST}:{config.PORT}")
     app.run(host=config.HOST, port=config.PORT, use_reloader=False, threaded=True)
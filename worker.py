@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+下载工作进程模块
+从 SQLite 共享队列中领取文件并下载，定期上报心跳与进度。
+可由主程序以子进程方式启动，也可在其他主机上独立运行（需挂载同一存储卷，
+且任务的保存路径在各主机上一致）。
+
+用法:
+    python worker.py --db /mnt/archive/queue.db
+"""
+
+import argparse
+import multiprocessing
+import os
+import pathlib
+import threading
+import time
+
+import config
+import downloader
+import job_queue
+import progress
+import shared
+import storage_pool
+import tracing
+from shared import log_message
+
+PLAN_CACHE_SIZE = 8  # 缓存的任务计划数
+EXIT_POLL_INTERVAL = 0.5  # 检查主程序是否退出的间隔（秒）
+
+
+class StdoutConsole:
+    """将日志输出到标准输出（替代控制台窗口）"""
+
+    def log(self, level, message, extra=None):
+        print(message, flush=True)
+
+
+class WorkerState:
+    """工作进程当前状态，供心跳线程读取"""
+
+    def __init__(self):
+        self.job_id = None
+        self.current_file = None
+        self.paused = False  # 当前任务是否在下载过程中被暂停
+        self.running = True
+        self.exiting = False  # 主程序已退出或要求结束，归还当前文件后退出
+        self.parent = None  # 启动本进程的主程序（multiprocessing 父进程对象）
+        self.stop_event = None  # 主程序要求本机工作进程结束时设置
+
+    def should_exit(self):
+        """主程序是否已退出或要求结束（父进程句柄在其退出时立即变为就绪，不受进程号复用影响）"""
+        if self.stop_event is not None and self.stop_event.is_set():
+            return True
+        return self.parent is not None and not self.parent.is_alive()
+
+
+def _wait(state, timeout):
+    """等待 timeout 秒，主程序退出或要求结束时提前返回"""
+    deadline = time.monotonic() + timeout
+    while not state.should_exit():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, EXIT_POLL_INTERVAL))
+
+
+def _heartbeat_loop(worker_id, state):
+    """心跳线程：续约文件租约、上报进度，并响应任务取消与暂停（立即终止正在进行的传输）"""
+    while state.running:
+        if state.should_exit():
+            # 主程序已退出：终止正在进行的 curl，由主循环归还文件后结束
+            state.exiting = True
+            if state.current_file:
+                downloader.download_stop_signal = True
+                downloader.terminate_transfers()
+            return
+        try:
+            report = None
+            transfers = progress.snapshot()["total"]["transfers"]
+            if state.current_file and transfers:
+                transfer = transfers[0]
+                report = {
+                    "speed": transfer["speed"],
+                    "file_bytes": transfer["bytes"],
+                    "file_percent": f"{transfer['percent']:.2f}%",
+                    "file_eta": transfer["eta"],
+                }
+            status = job_queue.heartbeat(worker_id, state.job_id, state.current_file, report)
+            if status in ('cancelled', 'paused') and state.current_file:
+                state.paused = status == 'paused'
+                downloader.download_stop_signal = True
+                downloader.terminate_transfers()
+        except Exception as e:
+            log_message("WARNING", f"心跳上报失败: {e}")
+        _wait(state, config.HEARTBEAT_INTERVAL)
+
+
+def _get_plan(plans, row):
+    """获取（或构建并缓存）文件所属任务的下载计划"""
+    job_id = row['job_id']
+    plan = plans.get(job_id)
+    if plan is None or row['idx'] >= len(plan.files):
+        # 未缓存，或任务在缓存后合并了新文件
+        work_name = f"RJ{row['rj_id'].replace('RJ', '')}"
+        files = job_queue.get_job_files(job_id)
+        base = row['target_root']
+        if base is None:
+            # 首个处理该任务的工作进程分配存储池根目录，之后的进程沿用同一目录
+            base = storage_pool.resolve_base(row['save_path'], work_name, sum(f['size'] for f in files),
+                                             busy=job_queue.root_load())
+            base = job_queue.set_target_root(job_id, base)
+        target_dir = pathlib.Path(base) / work_name
+        plan = downloader.build_job_plan(files, target_dir)
+        downloader.create_plan_directories(plan)
+        if len(plans) >= PLAN_CACHE_SIZE:
+            plans.pop(next(iter(plans)))
+        plans[job_id] = plan
+    return plan
+
+
+def _finish_job(plan, job_id, rj_id):
+    """任务结束后由最后完成的工作进程生成重命名日志并更新作品库索引"""
+    done, _ = job_queue.get_job_outcome(job_id)
+    files = job_queue.get_job_files(job_id)
+    if len(files) != len(plan.files):
+        # 其他工作进程领取了合并进来的文件，本进程缓存的计划不完整
+        plan = downloader.build_job_plan(files, plan.target_dir)
+    rename_log = [item.rename_info for item in plan.files if item.rename_info and item.path in done]
+    if rename_log:
+        downloader.generate_rename_log(plan.target_dir, rj_id, rename_log)
+    if done:
+        downloader.index_job(rj_id, plan, set(done))
+
+
+def _file_tag(worker_id):
+    """将工作进程 ID 转换为可用于文件名的字符串"""
+    return worker_id.replace(":", "_")
+
+
+def _dump_diagnostics(worker_id, job_id, rj_id, profile):
+    """任务结束时导出本进程记录的追踪数据与性能分析结果"""
+    tag = _file_tag(worker_id)
+    if config.TRACE_ENABLED:
+        path = config.TRACE_DIR / f"job{job_id}_{rj_id}_{tag}.json"
+        if tracing.dump_chrome_trace(str(path), job_id):
+            log_message("SYSTEM", f"任务追踪数据已保存: {path}")
+    profile_path = tracing.dump_profile(profile, f"job{job_id}_{rj_id}_{tag}")
+    if profile_path:
+        log_message("SYSTEM", f"任务性能分析已保存: {profile_path}")
+
+
+def run_worker(worker_id=None, idle_interval=2.0, exit_when_idle=False, parent_pid=None, db_path=None,
+               stop_event=None):
+    """工作进程主循环
+
+    Args:
+        worker_id: 工作进程 ID，默认使用 主机名:进程号
+        idle_interval: 队列为空时的轮询间隔（秒）
+        exit_when_idle: 队列为空时是否退出
+        parent_pid: 父进程 ID（由主程序启动时传入），父进程退出后终止传输并结束
+        db_path: 队列数据库路径，默认使用 config.QUEUE_DB
+        stop_event: 主程序退出前设置的事件（multiprocessing.Event）
+    """
+    if db_path:
+        config.QUEUE_DB = pathlib.Path(db_path)
+    if shared.console_window_ref is None:
+        shared.set_console_window(StdoutConsole())
+
+    worker_id = worker_id or job_queue.make_worker_id()
+    job_queue.init_db()
+    job_queue.register_worker(worker_id)
+    log_message("SYSTEM", f"工作进程已启动: {worker_id}")
+
+    state = WorkerState()
+    if parent_pid:
+        state.parent = multiprocessing.parent_process()
+    state.stop_event = stop_event
+    threading.Thread(target=_heartbeat_loop, args=(worker_id, state), daemon=True).start()
+
+    plans = {}
+    profiles = {}  # 任务 ID -> cProfile.Profile（PROFILE_JOBS 打开时）
+    try:
+        while True:
+            if state.exiting or state.should_exit():
+                log_message("SYSTEM", "主程序已退出，工作进程结束")
+                break
+
+            row = job_queue.claim_file(worker_id)
+            if row is None:
+                if exit_when_idle:
+                    break
+                _wait(state, idle_interval)
+                continue
+
+            plan = _get_plan(plans, row)
+            item = plan.files[row['idx']]
+
+            downloader.download_stop_signal = False
+            downloader.delete_partial_signal = False
+            downloader.reset_progress()
+            progress.clear()
+            state.job_id = row['job_id']
+            state.current_file = item.path
+            state.paused = False
+
+            log_message("TASK", f"[{row['rj_id']} #{row['job_id']}] {item.path} (第 {row['attempts'] + 1} 次领取)")
+            if row['job_id'] not in profiles:
+                profiles[row['job_id']] = tracing.new_profile()
+            try:
+                with tracing.profiling(profiles[row['job_id']]), \
+                        tracing.span("file", "file", job_id=row['job_id'], path=item.path, worker=worker_id):
+                    success, reason = downloader.download_single_file(item, row['job_id'], plan=plan)
+            except Exception as e:
+                success, reason = False, f"下载异常: {e}"
+            state.current_file = None
+
+            if state.paused or state.exiting:
+                # 任务已暂停或主程序已退出：归还文件，已下载部分保留到继续后续传
+                job_queue.release_file(worker_id, row['job_id'], row['idx'])
+                continue
+            if job_queue.finish_file(worker_id, row['job_id'], row['idx'], success, reason):
+                log_message("TASK", f"任务完成: {row['rj_id']} #{row['job_id']}")
+                _finish_job(plan, row['job_id'], row['rj_id'])
+                _dump_diagnostics(worker_id, row['job_id'], row['rj_id'], profiles.pop(row['job_id'], None))
+    finally:
+        state.running = False
+        # 保存未结束任务的性能分析与本进程的全部追踪数据（其他进程处理的部分由各自导出）
+        for job_id, profile in profiles.items():
+            tracing.dump_profile(profile, f"job{job_id}_{_file_tag(worker_id)}")
+        if config.TRACE_ENABLED:
+            tracing.dump_chrome_trace(str(config.TRACE_DIR / f"worker_{_file_tag(worker_id)}.json"))
+        job_queue.unregister_worker(worker_id)
+        log_message("SYSTEM", f"工作进程已退出: {worker_id}")
+
+
+# ============================================================
+# 本机工作进程管理（pool 模式下由主程序调用）
+# ============================================================
+
+_local_lock = threading.Lock()
+_local_processes = []  # 主程序启动的工作进程
+_local_stop = None  # 通知本机工作进程结束的 multiprocessing.Event
+
+
+def start_local_workers(count, db_path):
+    """在本机启动 count 个工作进程"""
+    global _local_stop
+    with _local_lock:
+        if _local_stop is None or _local_stop.is_set():
+            _local_stop = multiprocessing.Event()
+        for _ in range(count):
+            process = multiprocessing.Process(
+                target=run_worker,
+                kwargs={"parent_pid": os.getpid(), "db_path": db_path, "stop_event": _local_stop},
+                daemon=True
+            )
+            process.start()
+            _local_processes.append(process)
+
+
+def stop_local_workers(timeout=None):
+    """通知本机工作进程结束并等待退出（终止进行中的传输、归还文件），超时仍未退出的强制终止
+
+    主程序通过 os._exit 退出时不会执行 multiprocessing 的清理，必须在此之前调用。
+    """
+    with _local_lock:
+        processes = list(_local_processes)
+        _local_processes.clear()
+        if _local_stop is not None:
+            _local_stop.set()
+    if timeout is None:
+        timeout = EXIT_POLL_INTERVAL + 10
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(max(deadline - time.monotonic(), 0))
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+            process.join(2)
+    return len(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ASMRip 下载工作进程")
+    parser.add_argument("--db", default=None, help="共享队列数据库路径（默认使用 config.QUEUE_DB）")
+    parser.add_argument("--id", default=None, help="工作进程 ID（默认 主机名:进程号）")
+    parser.add_argument("--exit-when-idle", action="store_true", help="队列为空时退出")
+    parser.add_argument("--trace", action="store_true", help="记录各阶段耗时，任务结束时导出 Chrome trace JSON")
+    parser.add_argument("--profile", action="store_true", help="以 cProfile 运行每个任务并保存统计结果")
+    args = parser.parse_args()
+    config.TRACE_ENABLED = config.TRACE_ENABLED or args.trace
+    config.PROFILE_JOBS = config.PROFILE_JOBS or args.profile
+    try:
+        run_worker(args.id, exit_when_idle=args.exit_when_idle, db_path=args.db)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
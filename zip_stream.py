@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# SPDX-FileCopyrightText: 2026 zimo <zimo@zmlll.top>
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+"""
+流式 ZIP 打包模块
+边读取磁盘文件边生成 ZIP 数据，不创建临时文件，内存占用与作品大小无关。
+音视频和图片等已压缩格式以存储（不压缩）方式写入，其余文件使用 deflate 压缩。
+"""
+
+import io
+import os
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024  # 每次从磁盘读取的字节数
+
+# 以存储方式写入的扩展名（本身已压缩，再压缩只会浪费 CPU）
+STORED_EXTENSIONS = {
+    ".mp3", ".flac", ".wav", ".m4a", ".aac", ".ogg", ".opus", ".wma",
+    ".mp4", ".mkv", ".webm", ".jpg", ".jpeg", ".png", ".gif", ".webp",
+    ".zip", ".rar", ".7z",
+}
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """只写、不可定位的缓冲区，zipfile 写入后由生成器取走数据"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        """取出并清空已写入的数据"""
+        if not self._chunks:
+            return b""
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def list_files(directory):
+    """按路径排序列出目录下的所有文件，返回 (绝对路径, 相对路径) 列表"""
+    result = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            full_path = os.path.join(root, name)
+            result.append((full_path, os.path.relpath(full_path, directory).replace(os.sep, "/")))
+    return result
+
+
+def iter_zip(directory, arc_root=""):
+    """生成目录的 ZIP 数据流
+
+    Args:
+        directory: 要打包的目录
+        arc_root: 压缩包内的顶层目录名（为空时文件直接位于根目录）
+
+    Yields:
+        ZIP 数据块（bytes）
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", allowZip64=True) as archive:
+        for full_path, relative in list_files(directory):
+            arcname = f"{arc_root}/{relative}" if arc_root else relative
+            info = zipfile.ZipInfo.from_file(full_path, arcname)
+            if os.path.splitext(relative)[1].lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(full_path, "rb") as src, archive.open(info, "w") as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+
+    # 写出中央目录
+    data = buffer.drain()
+    if data:
+        yield data